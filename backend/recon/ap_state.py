@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - ap_state.py
+Estado compacto por AP para la detección de tráfico: un único registro con
+__slots__ por BSSID (último contador, baseline en un anillo array('q') de 8
+muestras e historial de alertas) en lugar de tres dicts globales sin límite.
+
+APStateStore expulsa los APs no vistos en `ttl` segundos y, si se supera
+`max_entries`, los menos recientes (LRU). Como el OrderedDict se mantiene en
+orden de último acceso, expulsar cuesta O(expulsados), no O(total).
+
+save()/load() guardan y restauran el estado (JSON, escritura atómica) para
+que un reinicio no deje la detección ciega mientras se rehacen los baselines.
+"""
+
+import json
+import os
+import sys
+from array import array
+from collections import OrderedDict
+
+BASELINE_SIZE = 8
+STATE_VERSION = 1
+
+
+class APState:
+    __slots__ = ("last_data", "samples", "n_samples", "pos", "last_alert", "alert_count", "last_seen")
+
+    def __init__(self, now):
+        self.last_data = -1  # sin lectura previa: la primera no cuenta como delta
+        self.samples = array("q", bytes(8 * BASELINE_SIZE))
+        self.n_samples = 0
+        self.pos = 0
+        self.last_alert = 0
+        self.alert_count = 0
+        self.last_seen = now
+
+    def add_sample(self, value):
+        """Equivale a deque(maxlen=BASELINE_SIZE).append(value)."""
+        self.samples[self.pos] = value
+        self.pos = (self.pos + 1) % BASELINE_SIZE
+        if self.n_samples < BASELINE_SIZE:
+            self.n_samples += 1
+
+    def baseline(self):
+        """Media de las muestras (las posiciones sin usar valen 0)."""
+        return sum(self.samples) / self.n_samples if self.n_samples else 0
+
+    def to_row(self):
+        return [self.last_data, list(self.samples), self.n_samples, self.pos,
+                self.last_alert, self.alert_count, self.last_seen]
+
+    @classmethod
+    def from_row(cls, row):
+        last_data, samples, n_samples, pos, last_alert, alert_count, last_seen = row
+        if len(samples) != BASELINE_SIZE:
+            raise ValueError("tamaño de baseline distinto")
+        state = cls(last_seen)
+        state.last_data = last_data
+        state.samples = array("q", samples)
+        state.n_samples = n_samples
+        state.pos = pos
+        state.last_alert = last_alert
+        state.alert_count = alert_count
+        return state
+
+
+class APStateStore:
+    def __init__(self, ttl=3600.0, max_entries=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.states = OrderedDict()  # bssid -> APState, del menos al más reciente
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, bssid):
+        return bssid in self.states
+
+    def get(self, bssid):
+        return self.states.get(bssid)
+
+    def touch(self, bssid, now):
+        """Devuelve el estado del AP (creándolo si no existe) y lo marca como visto."""
+        state = self.states.get(bssid)
+        if state is None:
+            state = self.states[bssid] = APState(now)
+        else:
+            self.states.move_to_end(bssid)
+            state.last_seen = now
+        return state
+
+    def evict(self, now):
+        """Expulsa por TTL y por tamaño máximo. Devuelve cuántos APs se han expulsado."""
+        states = self.states
+        removed = 0
+        if self.ttl > 0:
+            limit = now - self.ttl
+            while states:
+                bssid, state = next(iter(states.items()))
+                if state.last_seen >= limit:
+                    break
+                del states[bssid]
+                removed += 1
+        if self.max_entries > 0:
+            while len(states) > self.max_entries:
+                states.popitem(last=False)
+                removed += 1
+        self.evicted += removed
+        return removed
+
+    def clear(self):
+        self.states.clear()
+
+    def reset_counters(self, bssids=None, value=0):
+        """
+        La captura se ha relanzado y cuenta desde 0. value=0: el próximo delta es
+        el contador completo; value=-1: la próxima lectura solo fija el contador
+        (otro sensor sigue contando). bssids=None: todos los APs.
+        """
+        states = self.states.values() if bssids is None else filter(None, map(self.states.get, bssids))
+        reset = 0
+        for state in states:
+            if state.last_data > value:
+                state.last_data = value
+                reset += 1
+        return reset
+
+    def save(self, path, now):
+        """Checkpoint atómico (tmp + rename) en orden LRU."""
+        path = str(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = {
+            "version": STATE_VERSION,
+            "saved_at": now,
+            "aps": [[bssid] + state.to_row() for bssid, state in self.states.items()],
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+        return len(data["aps"])
+
+    def load(self, path, now, max_age):
+        """Restaura un checkpoint descartando APs no vistos en max_age s. Devuelve (cargados, descartados)."""
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"versión de estado {data.get('version')} no soportada")
+        loaded = stale = 0
+        for row in data["aps"]:
+            state = APState.from_row(row[1:8])  # scoring.BatchScorer añade columnas EWMA
+            if max_age > 0 and now - state.last_seen > max_age:
+                stale += 1
+                continue
+            self.states[row[0]] = state
+            self.states.move_to_end(row[0])
+            loaded += 1
+        return loaded, stale
+
+    def memory_bytes(self):
+        """Estimación de la memoria usada (registros, anillos, claves y el propio dict)."""
+        total = sys.getsizeof(self.states)
+        for bssid, state in list(self.states.items()):  # copia: el productor puede estar en otro hilo
+            total += sys.getsizeof(bssid) + sys.getsizeof(state) + sys.getsizeof(state.samples)
+        return total
+
+    def stats(self):
+        return {
+            "entries": len(self.states),
+            "evicted": self.evicted,
+            "memory_bytes": self.memory_bytes(),
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Black Swan - bench.py
+Benchmark reproducible del pipeline parse → detect → emit sobre capturas
+sintéticas (synthetic.py). Mide por separado, durante N ticks:
+
+  parse      parse_airodump_csv
+  evil_twin  detect_evil_twin
+  traffic    analyze_traffic (todos los APs, por lotes con NumPy)
+  delta      compute_delta (también en CPU: delta_cpu, con process_time)
+  delta_json_cpu  referencia: comparar json.dumps(sort_keys) por AP (CPU)
+  serialize  JSON del snapshot completo (wifi_data) y del delta (wifi_delta)
+  binary     wifi_data en msgpack / msgpack-zlib (si msgpack está instalado)
+
+y el tamaño en bytes de cada payload tal como lo envía Socket.IO. En cada tick
+se comprueba además que la codificación binaria decodifica exactamente a lo
+mismo que el JSON (wifi_data y wifi_delta); si no, el benchmark aborta. La
+salida es JSON (una línea por escenario) para poder comparar entre commits.
+
+Uso:
+  python3 bench.py                                    # escenarios por defecto
+  python3 bench.py --aps 20000 --stations 100000 --ticks 5
+  python3 bench.py --out resultados.jsonl
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import main
+import wire
+from synthetic import SyntheticAirodump
+
+DEFAULT_SCENARIOS = [
+    (50, 200),
+    (500, 2000),
+    (2000, 10000),
+    (5000, 25000),
+    (20000, 100000),
+]
+
+def dumps(payload):
+    # Mismo formato compacto que usa python-socketio al codificar paquetes
+    return json.dumps(payload, separators=(",", ":"))
+
+def check_roundtrip(encoded_json, encoding, blob):
+    """La codificación binaria debe decodificar a lo mismo que el JSON."""
+    if wire.unpack(blob) != json.loads(encoded_json):
+        raise SystemExit(f"❌ {encoding}: el payload no hace round-trip igual que JSON")
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def json_changes(aps, previous):
+    """Referencia del delta antiguo: un json.dumps(sort_keys) por AP comparado con el del tick anterior."""
+    current = {ap["bssid"].lower(): json.dumps(ap, sort_keys=True) for ap in aps}
+    changed = [bssid for bssid, encoded in current.items() if previous.get(bssid) != encoded]
+    return changed, current
+
+def reset_state():
+    """Estado de detección limpio entre escenarios."""
+    main.ap_state.clear()
+    main.station_index.clear()
+    main.roaming_history.clear()
+    main.essid_groups.clear()
+    main.delta_state = {}
+    main.delta_changes = {}
+    main.delta_last_seq = 0
+    main.last_traffic_analysis = 0.0
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, timeout=2, cwd=Path(__file__).parent)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def run_scenario(n_aps, n_stations, ticks, dup_ratio, hidden_ratio, seed, interval=30):
+    reset_state()
+    scene = SyntheticAirodump(n_aps, n_stations, dup_essid_ratio=dup_ratio,
+                              hidden_ratio=hidden_ratio, seed=seed)
+    binary = [enc for enc in wire.ENCODINGS if enc != "json"]
+    timings = {k: [] for k in ("parse", "evil_twin", "traffic", "delta", "serialize_full", "serialize_delta", "total",
+                               "delta_cpu", "delta_json_cpu")}
+    sizes = {"csv_bytes": [], "wifi_data_bytes": [], "wifi_delta_bytes": []}
+    for enc in binary:
+        timings[f"serialize_full_{enc}"] = []
+        sizes[f"wifi_data_{enc}_bytes"] = []
+        sizes[f"wifi_delta_{enc}_bytes"] = []
+    alerts = 0
+    perf = time.perf_counter
+    cpu = time.process_time
+    json_state = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "airodump_capture-01.csv"
+        for tick in range(ticks):
+            scene.write(path, tick, interval)
+            sizes["csv_bytes"].append(path.stat().st_size)
+            main.virtual_time = 1700000000 + tick * interval
+
+            t0 = perf()
+            aps = main.parse_airodump_csv(path)
+            t1 = perf()
+            tick_alerts = main.detect_evil_twin(aps)
+            t2 = perf()
+            tick_alerts.extend(main.analyze_traffic(aps, main.virtual_time))
+            t3 = perf()
+            snap = main.publish_snapshot("success", aps, tick_alerts, path)
+            c0 = cpu()
+            delta = main.compute_delta(snap)
+            c1 = cpu()
+            t4 = perf()
+            full = dumps(main.snapshot_payload(snap))
+            t5 = perf()
+            delta_json = dumps(delta)
+            t6 = perf()
+
+            timings["parse"].append(t1 - t0)
+            timings["evil_twin"].append(t2 - t1)
+            timings["traffic"].append(t3 - t2)
+            timings["delta"].append(t4 - t3)
+            timings["serialize_full"].append(t5 - t4)
+            timings["serialize_delta"].append(t6 - t5)
+            timings["total"].append(t6 - t0)
+            sizes["wifi_data_bytes"].append(len(full.encode()))
+            sizes["wifi_delta_bytes"].append(len(delta_json.encode()))
+
+            timings["delta_cpu"].append(c1 - c0)
+
+            # Fuera del total: referencia para comparar la CPU del delta
+            c2 = cpu()
+            _, json_state = json_changes(aps, json_state)
+            timings["delta_json_cpu"].append(cpu() - c2)
+
+            # Fuera del total: es opcional y se negocia por cliente
+            for enc in binary:
+                t7 = perf()
+                full_bin = wire.encode(main.snapshot_payload(snap), enc)
+                timings[f"serialize_full_{enc}"].append(perf() - t7)
+                delta_bin = wire.encode(delta, enc)
+                sizes[f"wifi_data_{enc}_bytes"].append(len(full_bin))
+                sizes[f"wifi_delta_{enc}_bytes"].append(len(delta_bin))
+                check_roundtrip(full, enc, full_bin)
+                check_roundtrip(delta_json, enc, delta_bin)
+            alerts += len(tick_alerts)
+    main.virtual_time = None
+    state_bytes = main.ap_state.memory_bytes()
+
+    return {
+        "aps": n_aps,
+        "stations": n_stations,
+        "ticks": ticks,
+        "dup_essid_ratio": dup_ratio,
+        "hidden_ratio": hidden_ratio,
+        "seed": seed,
+        "alerts_total": alerts,
+        "wire_roundtrip_checked": binary,
+        "ap_state_bytes": state_bytes,
+        "stages": {k: summarize(v) for k, v in timings.items()},
+        "bytes": {k: {"mean": int(statistics.fmean(v)), "max": max(v)} for k, v in sizes.items()},
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark del pipeline Black Swan")
+    ap.add_argument("--aps", type=int, default=None)
+    ap.add_argument("--stations", type=int, default=None)
+    ap.add_argument("--ticks", type=int, default=10)
+    ap.add_argument("--dup-essid-ratio", type=float, default=0.1)
+    ap.add_argument("--hidden-ratio", type=float, default=0.05)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="fichero JSONL donde añadir los resultados")
+    args = ap.parse_args()
+
+    # Los detectores loguean por grupo/AP: silenciarlos para no medir el logging
+    main.logger.setLevel(logging.ERROR)
+
+    if args.aps is not None:
+        scenarios = [(args.aps, args.stations if args.stations is not None else args.aps * 5)]
+    else:
+        scenarios = DEFAULT_SCENARIOS
+
+    meta = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.time(),
+    }
+    out = open(args.out, "a") if args.out else None
+    try:
+        for n_aps, n_st in scenarios:
+            result = dict(meta, **run_scenario(n_aps, n_st, args.ticks, args.dup_essid_ratio,
+                                               args.hidden_ratio, args.seed))
+            line = json.dumps(result)
+            print(line)
+            sys.stdout.flush()
+            if out:
+                out.write(line + "\n")
+    finally:
+        if out:
+            out.close()
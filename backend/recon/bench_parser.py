@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Black Swan - bench_parser.py
+Compara parse_airodump_csv_legacy contra el parser streaming de una pasada
+sobre CSVs sintéticos grandes y verifica que ambos devuelven lo mismo.
+
+Uso: python3 bench_parser.py [--aps 5000] [--stations 20000] [--repeat 5]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import main
+from synthetic import SyntheticAirodump
+
+def write_csv(path, n_aps, n_stations, seed=0):
+    SyntheticAirodump(n_aps, n_stations, dup_essid_ratio=0.2, hidden_ratio=0.05, seed=seed).write(path, tick=3)
+
+def best_of(fn, path, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(path)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(n_aps, n_stations, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench-01.csv"
+        write_csv(path, n_aps, n_stations)
+        size_kb = path.stat().st_size / 1024
+        t_legacy, out_legacy = best_of(main.parse_airodump_csv_legacy, path, repeat)
+        t_stream, out_stream = best_of(main.parse_airodump_csv_stream, path, repeat)
+    if out_legacy != out_stream:
+        raise SystemExit(f"❌ Salidas distintas con {n_aps} APs / {n_stations} estaciones")
+    print(f"{n_aps:>6} APs {n_stations:>7} st {size_kb:>9.0f} KB | "
+          f"legacy {t_legacy * 1000:>8.1f} ms | stream {t_stream * 1000:>8.1f} ms | "
+          f"x{t_legacy / t_stream:.2f}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark del parser airodump CSV")
+    ap.add_argument("--aps", type=int, default=None)
+    ap.add_argument("--stations", type=int, default=None)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.aps is not None:
+        sizes = [(args.aps, args.stations if args.stations is not None else args.aps * 4)]
+    else:
+        sizes = [(50, 200), (500, 2000), (5000, 20000), (20000, 100000)]
+    for n_aps, n_st in sizes:
+        run(n_aps, n_st, args.repeat)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - capture.py
+Supervisor del proceso de captura (airodump-ng).
+
+CaptureSupervisor lanza el proceso, sabe exactamente qué fichero escribe
+(<prefijo>-NN.csv: airodump usa el primer NN libre, que se calcula antes de
+lanzarlo) y lo vigila con check(), llamado periódicamente desde el hub:
+
+  - si el proceso muere, se relanza con backoff exponencial (`backoff` ..
+    `backoff_max` s), que vuelve al mínimo tras `healthy_after` s sano;
+  - si el fichero no aparece en `grace` s o deja de actualizarse durante
+    `stale_after` s, el proceso se da por colgado, se mata y se relanza;
+  - restart(command) cambia la línea de comandos (plan de canales) con
+    solapamiento: el proceso anterior sigue escribiendo hasta que el nuevo
+    tiene fichero, y solo entonces se termina.
+
+Los ficheros de ejecuciones anteriores se borran en cuanto hay uno nuevo, así
+que el -NN no crece y active_path es una consulta O(1) sin glob. `generation`
+sube cada vez que cambia el fichero activo: los contadores de airodump
+empiezan de cero en cada ejecución y el productor lo usa para no calcular
+deltas entre dos procesos distintos.
+
+check() nunca bloquea (poll/terminate/kill); los procesos que se terminan se
+recogen en los check() siguientes.
+"""
+
+import logging
+import subprocess
+import time
+from pathlib import Path
+
+logger = logging.getLogger("blackswan")
+
+KILL_AFTER = 5.0  # s desde terminate() hasta kill()
+
+
+class CaptureSupervisor:
+    def __init__(self, name, command, prefix, ext=".csv", stale_after=20.0, grace=10.0,
+                 backoff=1.0, backoff_max=60.0, healthy_after=60.0):
+        self.name = name
+        self.command = list(command)
+        self.prefix = Path(prefix)
+        self.ext = ext
+        self.stale_after = stale_after
+        self.grace = grace
+        self.backoff_min = backoff
+        self.backoff_max = backoff_max
+        self.healthy_after = healthy_after
+
+        self.proc = None
+        self.started = 0.0
+        # (fichero activo, generación): se asignan juntos para que el productor los lea de una vez
+        self.current = (None, 0)
+        self.pending = None  # fichero que escribirá el proceso recién lanzado
+        self.retiring = []  # [(proc, instante del terminate o None)]
+        self.backoff = backoff
+        self.next_start = 0.0
+        self.restarts = 0
+        self.last_exit = None
+        self.last_error = None
+
+    # ---------------- ficheros ----------------
+    def capture_files(self):
+        return self.prefix.parent.glob(self.prefix.name + "-*")
+
+    def next_path(self):
+        """El fichero que usará airodump-ng: primer -NN sin fichero."""
+        n = 1
+        while Path(f"{self.prefix}-{n:02d}{self.ext}").exists():
+            n += 1
+        return Path(f"{self.prefix}-{n:02d}{self.ext}")
+
+    def rotate(self):
+        """Borra los ficheros de ejecuciones anteriores (todo salvo el activo y el pendiente)."""
+        keep = {p.name.split(".")[0] for p in (self.path, self.pending) if p is not None}
+        for p in self.capture_files():
+            if p.name.split(".")[0] not in keep:
+                p.unlink(missing_ok=True)
+
+    @property
+    def path(self):
+        return self.current[0]
+
+    @property
+    def generation(self):
+        return self.current[1]
+
+    @property
+    def active(self):
+        """(fichero activo o None si no existe, generación)."""
+        path, generation = self.current
+        return (path if path is not None and path.exists() else None), generation
+
+    @property
+    def active_path(self):
+        return self.active[0]
+
+    # ---------------- proceso ----------------
+    def start(self, now, overlap=False):
+        """Lanza el proceso. Sin overlap el fichero anterior deja de servirse ya (proceso muerto o colgado)."""
+        if not overlap:
+            self.current = (None, self.generation)
+        self.rotate()
+        self.pending = self.next_path()
+        try:
+            self.proc = subprocess.Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            self.proc, self.pending = None, None
+            self.last_error = str(e)
+            self.schedule(now)
+            logger.error(f"[capture] ❌ {self.name}: no se pudo lanzar {self.command[0]}: {e} "
+                         f"(reintento en {self.next_start - now:.0f}s)")
+            return False
+        self.started = now
+        self.last_error = None
+        logger.info(f"[capture] ▶️ {self.name}: PID {self.proc.pid} → {self.pending.name}")
+        return True
+
+    def schedule(self, now):
+        self.next_start = now + self.backoff
+        self.backoff = min(self.backoff * 2, self.backoff_max)
+
+    def retire(self, proc, now):
+        if proc is not None and proc.poll() is None:
+            self.retiring.append((proc, None))
+
+    def fail(self, now, reason):
+        """Proceso muerto o colgado: fuera y relanzamiento con backoff."""
+        self.last_error = reason
+        self.retire(self.proc, now)
+        self.proc = self.pending = None
+        self.current = (None, self.generation)  # un fichero que ya no crece no se sirve como actual
+        self.restarts += 1
+        self.schedule(now)
+        logger.warning(f"[capture] ⚠️ {self.name}: {reason}, relanzando en {self.next_start - now:.0f}s")
+
+    def restart(self, command, now):
+        """Nueva línea de comandos con solapamiento (el proceso actual sigue hasta que el nuevo escribe)."""
+        self.command = list(command)
+        old = self.proc
+        if self.start(now, overlap=True):
+            self.retire(old, now)
+            return True
+        self.proc = old  # no se pudo lanzar: se sigue con el proceso anterior
+        return False
+
+    def reap(self, now):
+        waiting = []
+        for proc, since in self.retiring:
+            if proc.poll() is not None:
+                continue
+            if since is None:
+                if self.pending is not None and now - self.started < self.grace:
+                    waiting.append((proc, None))  # solapamiento: el nuevo todavía no escribe
+                    continue
+                proc.terminate()
+                since = now
+            elif now - since > KILL_AFTER:
+                proc.kill()
+            waiting.append((proc, since))
+        self.retiring = waiting
+
+    def check(self, now=None):
+        now = time.time() if now is None else now
+        if self.pending is not None and self.pending.exists():
+            self.current = (self.pending, self.generation + 1)
+            self.pending = None
+            self.rotate()
+        self.reap(now)
+
+        proc = self.proc
+        if proc is None:
+            if now >= self.next_start:
+                self.start(now)
+            return
+        code = proc.poll()
+        if code is not None:
+            self.last_exit = code
+            self.proc = None
+            self.fail(now, f"el proceso terminó con código {code}")
+            return
+        if self.pending is not None:
+            if now - self.started > self.grace:
+                self.fail(now, f"sin {self.pending.name} tras {self.grace:.0f}s")
+            return
+        try:
+            age = now - self.path.stat().st_mtime
+        except (OSError, AttributeError):
+            self.fail(now, "el fichero de captura ha desaparecido")
+            return
+        if age > self.stale_after:
+            self.fail(now, f"{self.path.name} sin escrituras desde hace {age:.0f}s")
+        elif now - self.started > self.healthy_after:
+            self.backoff = self.backoff_min
+
+    def stop(self, timeout=5.0):
+        """Termina todos los procesos (bloqueante: solo en la limpieza final)."""
+        procs = [self.proc] + [p for p, _ in self.retiring]
+        self.proc, self.retiring = None, []
+        for proc in procs:
+            if proc is None or proc.poll() is not None:
+                continue
+            logger.info(f"🔪 Terminando {self.command[0]} (PID {proc.pid})...")
+            try:
+                proc.terminate()
+                proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            except Exception:
+                pass
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        path = self.active_path
+        try:
+            age = round(now - path.stat().st_mtime, 1) if path else None
+        except OSError:
+            age = None
+        if self.proc is not None:
+            state = "starting" if self.pending is not None and path is None else "running"
+        else:
+            state = "backoff"
+        return {
+            "name": self.name,
+            "state": state,
+            "pid": self.proc.pid if self.proc is not None else None,
+            "path": str(path) if path else None,
+            "age": age,
+            "generation": self.generation,
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+            "last_error": self.last_error,
+            "retry_in": round(max(0.0, self.next_start - now), 1) if self.proc is None else None,
+        }
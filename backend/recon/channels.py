@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - channels.py
+Planificador adaptativo de canales para airodump-ng.
+
+ChannelPolicy puntúa cada canal con la salida de la detección (APs y clientes
+por canal, y las alertas ponderadas por severidad) y la convierte en pesos
+enteros 1..max_weight. Ningún canal base baja de 1: los APs de los canales
+tranquilos no pueden desaparecer de la captura.
+
+airodump-ng no tiene dwell por canal; el peso se expresa repitiendo el canal
+en la lista de salto (`-c 6,1,6,11,6`), intercalado con round-robin ponderado
+suave, y `-f` fija el tiempo por salto. Cambiar la lista exige relanzar
+airodump, así que ChannelScheduler suaviza las puntuaciones (EWMA) y solo
+propone un plan nuevo si el reparto de tiempo cambia más de `threshold`, con un
+intervalo mínimo entre relanzamientos (más corto si hay una alerta alta o
+crítica en un canal infrarrepresentado) y un máximo por hora.
+
+Todo es lógica pura sobre APs/alertas con el formato del snapshot: se puede
+probar con fake_airodump.py, que simula la captura de un plan.
+"""
+
+import math
+from collections import deque, namedtuple
+
+ALERT_WEIGHT = {"low": 2.0, "medium": 5.0, "high": 10.0, "critical": 20.0}
+URGENT_SEVERITIES = ("high", "critical")
+
+ChannelPlan = namedtuple("ChannelPlan", ["weights", "hops", "scores"])
+
+
+def parse_channels(spec):
+    """'1-13,36,40' -> (1, 2, ..., 13, 36, 40)"""
+    channels = []
+    for token in spec.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        first, sep, last = token.partition("-")
+        channels.extend(range(int(first), int(last) + 1) if sep else [int(first)])
+    return tuple(dict.fromkeys(channels))
+
+
+def channel_of(ap):
+    try:
+        channel = int(str(ap.get("channel", "")).strip())
+    except ValueError:
+        return None
+    return channel if channel > 0 else None
+
+
+def weighted_hops(weights):
+    """Round-robin ponderado suave: cada canal aparece `peso` veces, lo más repartido posible."""
+    total = sum(weights.values())
+    current = dict.fromkeys(weights, 0)
+    hops = []
+    for _ in range(total):
+        for channel, weight in weights.items():
+            current[channel] += weight
+        best = max(current, key=current.get)
+        current[best] -= total
+        hops.append(best)
+    return tuple(hops)
+
+
+def time_shares(plan):
+    total = len(plan.hops)
+    return {channel: weight / total for channel, weight in plan.weights.items()}
+
+
+class ChannelPolicy:
+    def __init__(self, base_channels, max_weight=4, ap_weight=0.05, client_weight=0.02,
+                 alert_weight=None):
+        self.base = tuple(base_channels)
+        self.max_weight = max(1, max_weight)
+        self.ap_weight = ap_weight
+        self.client_weight = client_weight
+        self.alert_weight = alert_weight or ALERT_WEIGHT
+
+    def alert_channels(self, alert, ap_channels):
+        channels = set()
+        for bssid in [alert.get("bssid")] + list(alert.get("bssids") or ()):
+            if bssid and bssid.lower() in ap_channels:
+                channels.add(ap_channels[bssid.lower()])
+        for channel in alert.get("channels") or ():
+            channel = channel_of({"channel": channel})
+            if channel is not None:
+                channels.add(channel)
+        return channels
+
+    def score(self, aps, alerts):
+        """Puntuación de actividad por canal (sin el suelo de exploración)."""
+        scores = dict.fromkeys(self.base, 0.0)
+        ap_channels = {}
+        for ap in aps:
+            channel = channel_of(ap)
+            if channel is None:
+                continue
+            ap_channels[ap["bssid"].lower()] = channel
+            scores[channel] = (scores.get(channel, 0.0) + self.ap_weight
+                               + self.client_weight * ap.get("clients_count_ap", 0))
+        for alert in alerts:
+            weight = self.alert_weight.get(alert.get("severity"), 0.0)
+            for channel in self.alert_channels(alert, ap_channels):
+                scores[channel] = scores.get(channel, 0.0) + weight
+        return scores
+
+    def plan(self, scores):
+        """Pesos 1..max_weight proporcionales a la actividad; el canal más activo recibe el máximo."""
+        top = max(scores.values(), default=0.0)
+        weights = {}
+        for channel in sorted(scores):
+            share = scores[channel] / top if top > 0 else 0.0
+            weights[channel] = 1 + int(round((self.max_weight - 1) * share))
+        common = math.gcd(*weights.values()) if weights else 1
+        weights = {channel: weight // common for channel, weight in weights.items()}  # 4,4,4 -> 1,1,1
+        return ChannelPlan(weights, weighted_hops(weights), dict(scores))
+
+
+class ChannelScheduler:
+    def __init__(self, policy, min_interval=120.0, urgent_interval=30.0, max_per_hour=12,
+                 threshold=0.2, alpha=0.3):
+        self.policy = policy
+        self.min_interval = min_interval
+        self.urgent_interval = urgent_interval
+        self.max_per_hour = max_per_hour
+        self.threshold = threshold
+        self.alpha = alpha
+        self.smoothed = {}
+        self.current = None
+        self.last_change = -math.inf
+        self.changes = deque()  # instantes de los relanzamientos de la última hora
+        self.skipped = {"small": 0, "rate_limited": 0, "hourly_cap": 0}
+
+    def smooth(self, scores):
+        for channel, score in scores.items():
+            prev = self.smoothed.get(channel)
+            self.smoothed[channel] = score if prev is None else prev + self.alpha * (score - prev)
+        for channel in [c for c in self.smoothed if c not in scores]:
+            self.smoothed[channel] *= 1 - self.alpha
+        return self.smoothed
+
+    def urgent(self, plan, alerts, aps):
+        """¿Hay una alerta alta/crítica en un canal al que el plan actual da menos peso?"""
+        if self.current is None:
+            return False
+        ap_channels = {ap["bssid"].lower(): channel_of(ap) for ap in aps}
+        for alert in alerts:
+            if alert.get("severity") not in URGENT_SEVERITIES:
+                continue
+            for channel in self.policy.alert_channels(alert, ap_channels):
+                if plan.weights.get(channel, 0) > self.current.weights.get(channel, 0):
+                    return True
+        return False
+
+    def start(self, now):
+        """Plan inicial (todos los canales base con peso 1) con el que se lanza la captura."""
+        self.current = self.policy.plan(dict.fromkeys(self.policy.base, 0.0))
+        self.last_change = now
+        return self.current
+
+    def update(self, aps, alerts, now):
+        """Plan nuevo a aplicar (relanzando la captura) o None si el actual sigue valiendo."""
+        plan = self.policy.plan(self.smooth(self.policy.score(aps, alerts)))
+        if self.current is not None:
+            if plan.weights == self.current.weights:
+                return None
+            old, new = time_shares(self.current), time_shares(plan)
+            distance = sum(abs(new.get(c, 0.0) - old.get(c, 0.0)) for c in set(old) | set(new)) / 2
+            urgent = self.urgent(plan, alerts, aps)
+            if distance < self.threshold and not urgent:
+                self.skipped["small"] += 1
+                return None
+            interval = min(self.urgent_interval, self.min_interval) if urgent else self.min_interval
+            if now - self.last_change < interval:
+                self.skipped["rate_limited"] += 1
+                return None
+            while self.changes and now - self.changes[0] > 3600:
+                self.changes.popleft()
+            if len(self.changes) >= self.max_per_hour:
+                self.skipped["hourly_cap"] += 1
+                return None
+        self.current = plan
+        self.last_change = now
+        self.changes.append(now)
+        return plan
+
+    def stats(self):
+        plan = self.current
+        return {
+            "weights": {str(c): w for c, w in plan.weights.items()} if plan else None,
+            "hops": ",".join(map(str, plan.hops)) if plan else None,
+            "restarts_last_hour": len(self.changes),
+            "skipped": dict(self.skipped),
+        }
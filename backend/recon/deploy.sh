@@ -53,7 +53,7 @@ source venv/bin/activate
 echo ""
 echo "📥 Instalando dependencias Python..."
 pip install --upgrade pip setuptools wheel greenlet
-pip install flask flask-socketio flask-cors eventlet
+pip install flask flask-socketio flask-cors eventlet numpy msgpack
 
 echo "✅ Dependencias Python instaladas correctamente"
 
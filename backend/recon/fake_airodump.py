@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Black Swan - fake_airodump.py
+Sustituto de airodump-ng para probar el planificador de canales sin root ni
+interfaz: acepta los mismos argumentos que main.py le pasa a airodump-ng y
+escribe <prefijo>-NN.csv cada --write-interval segundos con una escena
+sintética (synthetic.py) o un CSV fijo.
+
+  AIRODUMP_BIN="python3 fake_airodump.py --synthetic 2000,5000" \\
+  CHANNEL_SCHEDULER=1 CHANNELS=1,6,11,36,40,44,48,149 python3 main.py
+
+Con -c solo se "oyen" los APs de los canales de la lista de salto, y sus
+contadores crecen según la fracción de saltos de cada canal: un canal con más
+peso en el plan ve más tráfico, igual que con un airodump real. Como
+airodump-ng, cada ejecución empieza sus contadores de cero y usa el primer
+-NN libre.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from synthetic import SyntheticAirodump
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="airodump-ng de mentira (CSV sintéticos)")
+    parser.add_argument("-w", "--write", dest="prefix", required=True)
+    parser.add_argument("-c", "--channel", default="")
+    parser.add_argument("-f", dest="hop_ms", type=int, default=250)
+    parser.add_argument("--write-interval", type=float, default=1.0)
+    parser.add_argument("--output-format", default="csv")
+    parser.add_argument("--band", default="")
+    parser.add_argument("--synthetic", default="500,1500", help="APS,ESTACIONES")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixture", help="CSV que se copia tal cual en cada escritura")
+    parser.add_argument("interface", nargs="?")
+    return parser.parse_args(argv)
+
+
+def dwell_from_hops(channel_arg, all_channels):
+    """-c 6,1,6,11 -> {6: 2.0, 1: 1.0, 11: 1.0} (factor relativo a saltar por todos los canales)."""
+    hops = [int(c) for c in channel_arg.split(",") if c.strip()]
+    if not hops:
+        return None
+    counts = Counter(hops)
+    return {channel: n * len(all_channels) / len(hops) for channel, n in counts.items()}
+
+
+def next_path(prefix):
+    n = 1
+    while Path(f"{prefix}-{n:02d}.csv").exists():
+        n += 1
+    return Path(f"{prefix}-{n:02d}.csv")
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    path = next_path(args.prefix)
+    if args.fixture:
+        fixture = Path(args.fixture).read_bytes()
+        scene = dwell = None
+    else:
+        n_aps, _, n_stations = args.synthetic.partition(",")
+        scene = SyntheticAirodump(int(n_aps), int(n_stations or 0), seed=args.seed)
+        channels = sorted({ap["channel"] for ap in scene.aps})
+        dwell = dwell_from_hops(args.channel, channels)
+
+    start = time.time()
+    while True:
+        elapsed = time.time() - start
+        tmp = path.with_suffix(".tmp")
+        if scene is None:
+            tmp.write_bytes(fixture)
+        else:
+            scene.write(tmp, tick=elapsed, interval=1, dwell=dwell)
+        os.replace(tmp, path)  # airodump reescribe el fichero; aquí sin lecturas a medias
+        time.sleep(args.write_interval)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - fanout.py
+Escáner y web workers en procesos separados, unidos por una cola de mensajes.
+
+El proceso escáner (ROLE=scanner) lee la captura, detecta y serializa cada
+payload una sola vez; sus emit() van a la cola (message_queue de
+Flask-SocketIO) y cada web worker (ROLE=web) los reenvía a sus clientes sin
+volver a serializarlos (el texto viaja tal cual, ver wire.WireJSON). Así el
+reparto a miles de sockets, que es lo que satura un único proceso eventlet,
+se hace en N procesos.
+
+Los workers no tienen estado: los eventos de sus clientes (connect,
+subscribe, set_encoding...) se reenvían al escáner por un canal de control
+aparte, y el escáner responde con emit(to=sid) y enter_room(), que
+python-socketio enruta por la cola hasta el worker que tiene el cliente.
+
+Colas soportadas:
+
+  redis://host:6379/0   Redis (requiere el paquete redis)
+  tcp://host:6390       Broker de este módulo, sin dependencias: para
+                        pruebas, carga o despliegues sin Redis
+
+  python3 fanout.py --listen 127.0.0.1:6390
+"""
+
+import argparse
+import json
+import logging
+import queue
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+
+import socketio
+
+logger = logging.getLogger("blackswan")
+
+CHANNEL = "flask-socketio"
+DEFAULT_PORT = 6390
+MAX_PENDING = 32 * 1024 * 1024  # bytes sin enviar a un suscriptor antes de desconectarlo
+
+# Trama del broker: longitud del cuerpo, operación; cuerpo = canal + "\n" + mensaje
+FRAME = struct.Struct("!IB")
+OP_SUBSCRIBE, OP_PUBLISH = 1, 2
+
+
+def encode_frame(op, channel, payload=b""):
+    body = channel.encode() + b"\n" + payload
+    return FRAME.pack(len(body), op) + body
+
+
+def read_frame(stream):
+    header = stream.read(FRAME.size)
+    if len(header) < FRAME.size:
+        raise EOFError("conexión cerrada")
+    size, op = FRAME.unpack(header)
+    body = stream.read(size)
+    if len(body) < size:
+        raise EOFError("trama incompleta")
+    channel, _, payload = body.partition(b"\n")
+    return op, channel.decode(), payload
+
+
+def parse_address(url, default_port=DEFAULT_PORT):
+    parsed = urlparse(url if "://" in url else "tcp://" + url)
+    return parsed.hostname or "127.0.0.1", parsed.port or default_port
+
+
+# ---------------- broker ----------------
+class Subscriber:
+    """Conexión suscrita: cola de salida con su propio hilo escritor y bytes pendientes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.peer = "%s:%d" % conn.getpeername()[:2]
+        self.outbox = queue.Queue()
+        self.pending = 0  # bytes encolados y aún no enviados
+        self.lock = threading.Lock()
+        self.closed = False
+        threading.Thread(target=self.send_loop, daemon=True).start()
+
+    def put(self, frame):
+        with self.lock:
+            self.pending += len(frame)
+        self.outbox.put(frame)
+
+    def send_loop(self):
+        try:
+            while True:
+                frame = self.outbox.get()
+                if frame is None:
+                    return
+                self.conn.sendall(frame)
+                with self.lock:
+                    self.pending -= len(frame)
+        except OSError:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.outbox.put(None)
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class Broker:
+    """
+    Broker pub/sub mínimo sobre TCP (sustituto local de Redis). Cada mensaje
+    publicado en un canal se copia a todos sus suscriptores, incluido el
+    emisor (PubSubManager descarta los suyos por host_id). Un suscriptor con
+    más de `max_pending` bytes sin enviar se desconecta, como el
+    client-output-buffer-limit pubsub de Redis: un worker lento no frena al
+    resto ni hace crecer la memoria del broker; al reconectar, sus clientes
+    ven el hueco de seq y piden resync.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, max_pending=MAX_PENDING):
+        self.address = (host, port)
+        self.max_pending = max_pending
+        self.subscribers = {}  # canal -> {conexión: Subscriber}
+        self.lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.server = None
+
+    def start(self):
+        """Escucha en un hilo aparte. Devuelve el puerto (útil con port=0)."""
+        self.server = socket.create_server(self.address)
+        self.address = self.server.getsockname()[:2]
+        threading.Thread(target=self.serve_forever, name="broker", daemon=True).start()
+        return self.address[1]
+
+    def serve_forever(self):
+        if self.server is None:
+            self.server = socket.create_server(self.address)
+        logger.info(f"[fanout] 📮 Broker escuchando en {self.address[0]}:{self.address[1]}")
+        while True:
+            conn, _ = self.server.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        stream = conn.makefile("rb")
+        subscribed = []
+        try:
+            while True:
+                op, channel, payload = read_frame(stream)
+                if op == OP_SUBSCRIBE:
+                    with self.lock:
+                        self.subscribers.setdefault(channel, {})[conn] = Subscriber(conn)
+                    subscribed.append(channel)
+                elif op == OP_PUBLISH:
+                    self.publish(channel, encode_frame(OP_PUBLISH, channel, payload))
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self.lock:
+                for channel in subscribed:
+                    sub = self.subscribers.get(channel, {}).pop(conn, None)
+                    if sub is not None:
+                        sub.close()
+            conn.close()
+
+    def publish(self, channel, frame):
+        self.published += 1
+        with self.lock:
+            targets = list(self.subscribers.get(channel, {}).items())
+        for conn, sub in targets:
+            if sub.pending + len(frame) <= self.max_pending:
+                sub.put(frame)
+                continue
+            with self.lock:
+                if self.subscribers.get(channel, {}).pop(conn, None) is None:
+                    continue  # ya lo desconectó otro publish
+            self.dropped += 1
+            logger.warning(f"[fanout] ⚠️ Suscriptor lento desconectado: {sub.peer} ({sub.pending // 1024} KB "
+                           f"pendientes en {channel})")
+            sub.close()
+
+
+# ---------------- managers de python-socketio ----------------
+class BrokerManager(socketio.PubSubManager):
+    """PubSubManager sobre el broker TCP de este módulo (tcp://host:puerto)."""
+
+    name = "blackswan-broker"
+
+    def __init__(self, url="tcp://127.0.0.1:%d" % DEFAULT_PORT, channel=CHANNEL, write_only=False,
+                 logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.address = parse_address(url)
+        self.pub = None
+        self.pub_lock = threading.Lock()
+
+    def _publish(self, data):
+        frame = encode_frame(OP_PUBLISH, self.channel, self.json.dumps(data).encode())
+        for retries_left in (1, 0):
+            try:
+                with self.pub_lock:
+                    if self.pub is None:
+                        self.pub = socket.create_connection(self.address)
+                    self.pub.sendall(frame)
+                return
+            except OSError as e:
+                if self.pub is not None:
+                    self.pub.close()
+                    self.pub = None
+                if not retries_left:
+                    self._get_logger().error(f"No se pudo publicar en el broker {self.address}: {e}")
+
+    def _listen(self):
+        retry = 1
+        while True:
+            sock = None
+            try:
+                sock = socket.create_connection(self.address)
+                sock.sendall(encode_frame(OP_SUBSCRIBE, self.channel))
+                retry = 1
+                stream = sock.makefile("rb")
+                while True:
+                    _, channel, payload = read_frame(stream)
+                    if channel == self.channel:
+                        yield payload
+            except (OSError, EOFError) as e:
+                if sock is not None:
+                    sock.close()
+                self._get_logger().error(f"Sin conexión con el broker {self.address} ({e}), "
+                                         f"reintento en {retry}s")
+                time.sleep(retry)
+                retry = min(retry * 2, 60)
+
+
+def manager_class(url):
+    if url.startswith(("redis://", "rediss://", "redis+sentinel://")):
+        return socketio.RedisManager
+    if url.startswith("tcp://"):
+        return BrokerManager
+    raise ValueError(f"cola no soportada: {url} (usa redis://... o tcp://host:puerto)")
+
+
+def client_manager(url, role, channel=CHANNEL):
+    """
+    Manager de Socket.IO para MESSAGE_QUEUE. El escáner es write_only: publica
+    los payloads pero no recibe de vuelta lo que él mismo publica (con miles de
+    clientes conectando serían cientos de MB que parsear y tirar).
+    """
+    return manager_class(url)(url, channel=channel, write_only=role == "scanner")
+
+
+class ControlChannel:
+    """
+    Eventos de cliente de los web workers al escáner, por un canal aparte
+    (<canal>.control) con el mismo backend que los datos.
+    """
+
+    def __init__(self, url, channel=CHANNEL):
+        self.manager = manager_class(url)(url, channel=channel + ".control", logger=logger)
+
+    def send(self, message):
+        self.manager._publish(message)
+
+    def listen(self, callback):
+        """Bucle de escucha (tarea de fondo del escáner): callback(mensaje) en orden de llegada."""
+        for raw in self.manager._listen():
+            try:
+                callback(json.loads(raw))
+            except Exception:
+                logger.exception("[fanout] Error atendiendo un evento de cliente reenviado")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Broker pub/sub local para MESSAGE_QUEUE=tcp://...")
+    parser.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_PORT}")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="bytes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    host, port = parse_address(args.listen)
+    try:
+        Broker(host, port, args.max_pending).serve_forever()
+    except KeyboardInterrupt:
+        pass
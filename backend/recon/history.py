@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - history.py
+Histórico en disco (SQLite) de potencia, delta_data y clientes por BSSID.
+
+Tres niveles con retención propia:
+  raw   una muestra por ventana de tráfico (TRAFFIC_WINDOW)
+  1m    medias por minuto
+  15m   medias por cuarto de hora
+
+record() solo acumula en memoria; las muestras se escriben por lotes en una
+transacción (cada `flush_interval` s o `flush_rows` filas), y en cada escritura
+se agregan los buckets ya cerrados al nivel siguiente y se aplica la retención.
+query() elige el nivel más barato que cubre el rango y limita la respuesta a
+`max_points` puntos reagrupando si hace falta.
+"""
+
+import logging
+import math
+import sqlite3
+import time
+from pathlib import Path
+
+logger = logging.getLogger("blackswan")
+
+# (tabla, resolución en segundos o None para raw)
+LEVELS = (("raw", None), ("m1", 60), ("m15", 900))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bssid TEXT NOT NULL,
+    ts REAL NOT NULL,
+    power REAL,
+    delta_data REAL,
+    delta_max REAL,
+    clients REAL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (bssid, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {table}_ts ON {table} (ts);
+"""
+
+
+class HistoryStore:
+    def __init__(self, path, retention=(6 * 3600, 7 * 86400, 90 * 86400),
+                 flush_interval=10.0, flush_rows=50000, max_points=500):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.retention = dict(zip((t for t, _ in LEVELS), retention))
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_points = max_points
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.latest_ts = 0.0
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        for table, _ in LEVELS:
+            self.db.executescript(SCHEMA.format(table=table))
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+        self.db.commit()
+        row = self.db.execute("SELECT max(ts) FROM raw").fetchone()
+        self.latest_ts = row[0] or 0.0
+
+    # ---------------- escritura ----------------
+    def record(self, ts, aps):
+        """Acumula una muestra por AP (los APs con el formato del snapshot)."""
+        for ap in aps:
+            delta = ap.get("delta_data", 0)
+            self.pending.append((ap["bssid"].lower(), ts, ap.get("power"), delta, delta,
+                                 ap.get("clients_count_ap", 0), 1))
+        self.latest_ts = max(self.latest_ts, ts)
+        if (len(self.pending) >= self.flush_rows
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return 0
+        rows, self.pending = self.pending, []
+        try:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO raw VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self.rollup(self.latest_ts)
+                self.expire(self.latest_ts)
+        except sqlite3.Error:
+            logger.exception("[history] Error escribiendo el histórico")
+        return len(rows)
+
+    def watermark(self, table):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (table,)).fetchone()
+        return row[0] if row else 0.0
+
+    def rollup(self, now):
+        """Agrega los buckets cerrados de cada nivel al siguiente."""
+        for (src, _), (dst, res) in zip(LEVELS, LEVELS[1:]):
+            start = self.watermark(dst)
+            end = math.floor(now / res) * res
+            if end <= start:
+                continue
+            self.db.execute(
+                f"""INSERT OR REPLACE INTO {dst}
+                    SELECT bssid, CAST(ts / ? AS INTEGER) * ? AS bucket,
+                           sum(power * n) / sum(n), sum(delta_data * n) / sum(n),
+                           max(delta_max), sum(clients * n) / sum(n), sum(n)
+                    FROM {src} WHERE ts >= ? AND ts < ?
+                    GROUP BY bssid, bucket""",
+                (res, res, start, end))
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (dst, end))
+
+    def expire(self, now):
+        for table, _ in LEVELS:
+            self.db.execute(f"DELETE FROM {table} WHERE ts < ?", (now - self.retention[table],))
+
+    # ---------------- lectura ----------------
+    def pick_level(self, start, step):
+        """Nivel más grueso con resolución <= step entre los que aún cubren `start`."""
+        covering = [(t, res) for t, res in LEVELS if start >= self.latest_ts - self.retention[t]]
+        if not covering:
+            return LEVELS[-1][0]
+        table = covering[0][0]
+        for t, res in covering:
+            if (res or 0) <= step:
+                table = t
+        return table
+
+    def query(self, bssid, start=None, end=None, step=None):
+        """Serie de `bssid` en [start, end] con como mucho max_points puntos."""
+        self.flush()
+        end = end if end is not None else self.latest_ts
+        start = start if start is not None else end - 3600
+        if end < start:
+            start, end = end, start
+        # paso entero y lo bastante grande para no pasar de max_points buckets
+        step = max(math.ceil(step or 0), math.ceil((end - start) / max(self.max_points - 1, 1)), 1)
+        table = self.pick_level(start, step)
+        rows = self.db.execute(
+            f"""SELECT CAST(ts / ? AS INTEGER) * ? AS bucket,
+                       sum(power * n) / sum(n), sum(delta_data * n) / sum(n),
+                       max(delta_max), sum(clients * n) / sum(n), sum(n)
+                FROM {table} WHERE bssid = ? AND ts >= ? AND ts <= ?
+                GROUP BY bucket ORDER BY bucket LIMIT ?""",
+            (step, step, bssid.lower(), start, end, self.max_points)).fetchall()
+        return {
+            "bssid": bssid,
+            "from": start,
+            "to": end,
+            "step": step,
+            "level": table,
+            "points": [
+                {
+                    "ts": ts,
+                    "power": round(power, 1) if power is not None else None,
+                    "delta_data": round(delta, 1) if delta is not None else None,
+                    "delta_max": delta_max,
+                    "clients": round(clients, 2) if clients is not None else None,
+                    "samples": n,
+                }
+                for ts, power, delta, delta_max, clients, n in rows
+            ],
+        }
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - hub.py
+Mantener libre el hub de eventlet mientras el productor trabaja.
+
+run_in_worker() ejecuta una función en un hilo nativo (eventlet.tpool) y bloquea
+solo al green thread que la llama: el hub sigue atendiendo pings, /health y
+conexiones. Se usa un único hilo, así que todo lo que se delega (ticks,
+consultas al histórico) queda serializado y no necesita más locks.
+
+HubLagMonitor duerme un intervalo corto en bucle y mide cuánto se retrasa el
+despertar: es el bloqueo real del hub. Cada retraso por encima de `budget` se
+cuenta y se loguea, de forma que el límite de bloqueo se puede comprobar en
+/health en lugar de suponerlo.
+"""
+
+import logging
+import time
+from collections import deque
+
+import eventlet
+from eventlet import patcher, tpool
+
+logger = logging.getLogger("blackswan")
+
+tpool.set_num_threads(1)
+tpool.QUIET = True  # las excepciones se propagan al llamador, que ya las loguea
+
+
+def run_in_worker(func, *args):
+    """func(*args) en el hilo del productor (o directamente si ya estamos en él)."""
+    return tpool.execute(func, *args)
+
+
+def native_rlock():
+    """RLock del SO: los locks verdes no se pueden compartir entre el hub y un hilo nativo."""
+    return patcher.original("threading").RLock()
+
+
+class HubLagMonitor:
+    def __init__(self, interval=0.05, budget=0.2, window=1200, observe=None):
+        self.interval = interval
+        self.observe = observe  # p.ej. Histogram.observe para /metrics
+        self.budget = budget
+        self.samples = deque(maxlen=window)  # últimos retrasos (s)
+        self.last = 0.0
+        self.max = 0.0
+        self.over_budget = 0
+        self.running = False
+
+    def run(self):
+        self.running = True
+        while self.running:
+            t0 = time.perf_counter()
+            eventlet.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - t0 - self.interval)
+            self.samples.append(lag)
+            if self.observe is not None:
+                self.observe(lag)
+            self.last = lag
+            if lag > self.max:
+                self.max = lag
+            if lag > self.budget:
+                self.over_budget += 1
+                logger.warning(f"[hub] ⏱️ Hub bloqueado {lag * 1000:.0f} ms "
+                               f"(límite {self.budget * 1000:.0f} ms)")
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        samples = sorted(self.samples)
+        p99 = samples[int(len(samples) * 0.99)] if samples else 0.0
+        return {
+            "lag_ms_last": round(self.last * 1000, 1),
+            "lag_ms_p99": round(p99 * 1000, 1),
+            "lag_ms_max": round(self.max * 1000, 1),
+            "budget_ms": round(self.budget * 1000, 1),
+            "over_budget": self.over_budget,
+        }
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - journal.py
+Diario de alertas en disco: append-only, en segmentos JSONL rotados por tamaño.
+
+Cada línea es un registro con un `seq` creciente (el cursor de lectura):
+
+  open    incidente nuevo; su `id` es el seq de este registro e incluye la alerta
+  update  nueva detección o escalada de severidad (count, last_seen, severity)
+  close   el incidente lleva `reopen_after` s sin verse
+  ack     reconocido por un operador
+  carry   estado de un incidente abierto, copiado al comienzo de cada segmento
+
+Las alertas se agrupan por clave de deduplicación (familia + BSSID, o + ESSID
+en evil twin): mientras un incidente siga abierto, las detecciones repetidas
+solo suben `count` y `last_seen`, y se escriben como mucho cada
+`update_interval` s (salvo escaladas, que se escriben al momento). Una alerta
+que se arrastra entre ventanas de tráfico es el mismo objeto y no cuenta como
+detección nueva.
+
+Junto a cada segmento hay un .idx binario con (seq, offset) cada `index_every`
+registros: read(since) busca en ese índice y hace seek, sin releer el diario.
+Gracias a los registros carry, cada segmento basta para reconstruir los
+incidentes abiertos: al arrancar solo se recorre el último.
+"""
+
+import json
+import logging
+import os
+import struct
+from bisect import bisect_right
+from pathlib import Path
+
+logger = logging.getLogger("blackswan")
+
+INDEX_ENTRY = struct.Struct("<QQ")  # seq, offset en el segmento
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+# Tipos de alerta que son el mismo incidente con distinta severidad
+ALERT_FAMILIES = {
+    "evil_twin_high": "evil_twin",
+    "evil_twin_suspicious": "evil_twin",
+    "critical_traffic": "traffic",
+    "traffic_spike": "traffic",
+    "high_traffic": "traffic",
+    "suspicious_traffic": "traffic",
+}
+
+
+def dedup_key(alert):
+    kind = alert.get("type", "")
+    family = ALERT_FAMILIES.get(kind, kind)
+    if family == "evil_twin" or not alert.get("bssid"):
+        subject = alert.get("essid") or ",".join(sorted(b.lower() for b in alert.get("bssids", ())))
+    else:
+        subject = alert["bssid"].lower()
+    return f"{family}:{subject}"
+
+
+class Incident:
+    __slots__ = ("id", "key", "type", "severity", "first_seen", "last_seen", "count",
+                 "acked", "alert", "dirty", "last_write")
+
+    def __init__(self, id, key, alert, now):
+        self.id = id
+        self.key = key
+        self.type = alert.get("type")
+        self.severity = alert.get("severity")
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 1
+        self.acked = None
+        self.alert = alert
+        self.dirty = False
+        self.last_write = now
+
+    def fields(self):
+        return {
+            "id": self.id,
+            "key": self.key,
+            "type": self.type,
+            "severity": self.severity,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "count": self.count,
+            "acked": self.acked,
+        }
+
+
+class AlertJournal:
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, max_segments=8,
+                 reopen_after=600.0, update_interval=60.0, index_every=64):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_segments)
+        self.reopen_after = reopen_after
+        self.update_interval = update_interval
+        self.index_every = index_every
+        self.seq = 0
+        self.incidents = {}  # clave -> Incident abierto
+        self.by_id = {}  # id -> Incident abierto
+        self.index_seqs = []  # índice disperso: seq ...
+        self.index_pos = []  # ... y su (segmento, offset)
+        self.segments = []  # números de segmento retenidos, en orden
+        self.file = None
+        self.index_file = None
+        self.size = 0
+        self.since_index = 0
+        self.opened = 0
+        self.load()
+
+    # ---------------- ficheros ----------------
+    def segment_path(self, n, suffix=".jsonl"):
+        return self.directory / f"alerts-{n:06d}{suffix}"
+
+    def load(self):
+        self.segments = sorted(int(p.stem.split("-")[1]) for p in self.directory.glob("alerts-*.jsonl"))
+        for n in self.segments:
+            try:
+                data = self.segment_path(n, ".idx").read_bytes()
+            except OSError:
+                data = b""
+            for seq, offset in INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]):
+                self.index_seqs.append(seq)
+                self.index_pos.append((n, offset))
+        if self.segments:
+            self.recover(self.segments[-1])
+        else:
+            self.segments.append(1)
+        self.open_segment(self.segments[-1])
+
+    def recover(self, n):
+        """Recorre el último segmento: seq actual e incidentes abiertos. Corta una línea a medias."""
+        path = self.segment_path(n)
+        good = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                self.seq = rec["seq"]
+                self.apply(rec)
+        if good < path.stat().st_size:
+            logger.warning(f"[journal] ⚠️ {path.name}: registro incompleto al final, se descarta")
+            os.truncate(path, good)
+        if not self.index_pos or self.index_pos[-1][0] != n:
+            # segmento sin índice (p.ej. .idx perdido): al menos su comienzo
+            self.index_seqs.append(self.first_seq(n))
+            self.index_pos.append((n, 0))
+        if self.incidents:
+            logger.info(f"[journal] 📒 {len(self.incidents)} incidentes abiertos recuperados (seq {self.seq})")
+
+    def first_seq(self, n):
+        with open(self.segment_path(n), "rb") as f:
+            line = f.readline()
+        try:
+            return json.loads(line)["seq"]
+        except ValueError:
+            return self.seq + 1
+
+    def apply(self, rec):
+        """Reconstruye el estado en memoria a partir de un registro del diario."""
+        op = rec["op"]
+        if op in ("open", "update", "carry") and rec["id"] not in self.by_id:
+            inc = Incident(rec["id"], rec["key"], rec["alert"], rec["first_seen"])
+            self.incidents[inc.key] = self.by_id[inc.id] = inc
+        inc = self.by_id.get(rec.get("id"))
+        if inc is None:
+            return
+        if op == "close":
+            self.incidents.pop(inc.key, None)
+            del self.by_id[inc.id]
+            return
+        for field in ("type", "severity", "last_seen", "count", "acked"):
+            if field in rec:
+                setattr(inc, field, rec[field])
+        inc.last_write = inc.last_seen
+
+    def open_segment(self, n):
+        self.file = open(self.segment_path(n), "ab")
+        self.index_file = open(self.segment_path(n, ".idx"), "ab")
+        self.size = self.file.tell()
+        self.since_index = self.index_every  # el primer registro del segmento siempre se indexa
+
+    def rotate(self):
+        self.file.close()
+        self.index_file.close()
+        n = self.segments[-1] + 1
+        self.segments.append(n)
+        self.open_segment(n)
+        for inc in self.incidents.values():
+            self.write("carry", alert=inc.alert, **inc.fields())
+        while len(self.segments) > self.max_segments:
+            old = self.segments.pop(0)
+            for suffix in (".jsonl", ".idx"):
+                try:
+                    self.segment_path(old, suffix).unlink()
+                except OSError:
+                    pass
+            keep = bisect_right([pos[0] for pos in self.index_pos], old)
+            del self.index_seqs[:keep], self.index_pos[:keep]
+        logger.info(f"[journal] 🔁 Nuevo segmento {self.segment_path(n).name}")
+
+    def append(self, op, **fields):
+        if self.size >= self.segment_bytes:
+            self.rotate()
+        return self.write(op, **fields)
+
+    def write(self, op, **fields):
+        self.seq += 1
+        rec = dict(seq=self.seq, op=op, **fields)
+        line = (json.dumps(rec, separators=(",", ":")) + "\n").encode()
+        if self.since_index >= self.index_every:
+            self.index_seqs.append(self.seq)
+            self.index_pos.append((self.segments[-1], self.size))
+            self.index_file.write(INDEX_ENTRY.pack(self.seq, self.size))
+            self.since_index = 0
+        self.file.write(line)
+        self.size += len(line)
+        self.since_index += 1
+        return rec
+
+    # ---------------- escritura ----------------
+    def observe(self, alerts, now):
+        """Registra las alertas de un tick. Devuelve los registros nuevos."""
+        out = []
+        for alert in alerts:
+            key = dedup_key(alert)
+            inc = self.incidents.get(key)
+            if inc is None:
+                # Rotar antes de fijar el id: los carry del segmento nuevo consumen seqs
+                if self.size >= self.segment_bytes:
+                    self.rotate()
+                inc = Incident(self.seq + 1, key, alert, now)
+                out.append(self.write("open", alert=alert, **inc.fields()))
+                self.incidents[key] = self.by_id[inc.id] = inc
+                self.opened += 1
+                continue
+            inc.last_seen = now
+            if alert is inc.alert:
+                continue  # la misma alerta arrastrada de un tick anterior
+            inc.count += 1
+            inc.alert = alert
+            inc.dirty = True
+            escalated = SEVERITY_RANK.get(alert.get("severity"), 0) > SEVERITY_RANK.get(inc.severity, 0)
+            inc.type = alert.get("type", inc.type)
+            inc.severity = alert.get("severity", inc.severity)
+            if escalated:
+                out.append(self.write_update(inc, now))
+
+        for inc in list(self.incidents.values()):
+            if now - inc.last_seen > self.reopen_after:
+                out.append(self.append("close", **inc.fields()))
+                del self.incidents[inc.key], self.by_id[inc.id]
+            elif inc.dirty and now - inc.last_write >= self.update_interval:
+                out.append(self.write_update(inc, now))
+        if out:
+            self.flush()
+        return out
+
+    def write_update(self, inc, now):
+        inc.dirty = False
+        inc.last_write = now
+        return self.append("update", alert=inc.alert, **inc.fields())
+
+    def ack(self, alert_id, now, by=None):
+        """Reconoce un incidente (abierto o del histórico retenido). None si no existe."""
+        inc = self.by_id.get(alert_id)
+        if inc is None:
+            found = self.read(alert_id - 1, limit=1)["records"]
+            if not found or found[0]["seq"] != alert_id or found[0]["op"] != "open":
+                return None
+        else:
+            inc.acked = now
+        rec = self.append("ack", id=alert_id, acked=now, by=by)
+        self.flush()
+        return rec
+
+    def flush(self):
+        self.file.flush()
+        self.index_file.flush()
+
+    # ---------------- lectura ----------------
+    def read(self, since=0, limit=500):
+        """Registros con seq > since (como mucho `limit`), buscando en el índice."""
+        self.flush()
+        records = []
+        if not self.index_seqs or since >= self.seq:
+            return {"records": records, "last_seq": self.seq, "truncated": False}
+        i = bisect_right(self.index_seqs, since + 1) - 1
+        truncated = i < 0 and since + 1 < self.index_seqs[0]
+        segment, offset = self.index_pos[max(i, 0)]
+        for n in self.segments[self.segments.index(segment):]:
+            with open(self.segment_path(n), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break
+                    if rec["seq"] > since:
+                        records.append(rec)
+                        if len(records) >= limit:
+                            return {"records": records, "last_seq": self.seq, "truncated": truncated}
+            offset = 0
+        return {"records": records, "last_seq": self.seq, "truncated": truncated}
+
+    def open_incidents(self):
+        return sorted((dict(inc.fields(), alert=inc.alert) for inc in self.incidents.values()),
+                      key=lambda inc: inc["id"])
+
+    def stats(self):
+        return {
+            "last_seq": self.seq,
+            "open_incidents": len(self.incidents),
+            "opened": self.opened,
+            "segments": len(self.segments),
+            "bytes": sum(self.segment_path(n).stat().st_size for n in self.segments
+                         if self.segment_path(n).exists()),
+        }
+
+    def close(self):
+        self.file.close()
+        self.index_file.close()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Black Swan - loadtest.py
+Prueba de carga del reparto escáner → cola → web workers (fanout.py).
+
+Por cada número de workers N de --workers levanta, sin root ni interfaz:
+
+  broker     fanout.Broker en este proceso (o --queue redis://... si hay Redis)
+  escáner    main.py en replay de una sesión sintética (synthetic.py), un tick
+             cada 1/--rate s, publicando en la cola
+  N workers  main.py con ROLE=web en puertos consecutivos
+  clientes   --clients-per-worker × N conexiones Socket.IO (Engine.IO v4 sobre
+             WebSocket, repartidas entre los workers) en --client-procs
+             procesos, que solo cuentan los wifi_delta recibidos
+
+y mide, durante --duration s desde que todos tienen su wifi_data inicial,
+los wifi_delta entregados por segundo y el ratio de entrega (recibidos /
+clientes × ticks publicados, leídos de blackswan_snapshot_seq del escáner).
+N=0 es la referencia sin cola: el escáner sirve él solo a
+--clients-per-worker clientes. Con reparto lineal los entregados/s crecen
+con N al mismo ratio de entrega; el límite real es la CPU de la máquina
+(workers y clientes comparten núcleos). Salida: una línea JSON por N.
+
+Uso:
+  python3 loadtest.py --workers 0,1,2,4 --clients-per-worker 200
+  python3 loadtest.py --aps 2000 --stations 5000 --rate 2 --out carga.jsonl
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import (AcceptConnection, BytesMessage, CloseConnection, Ping, RejectConnection, Request,
+                            TextMessage)
+
+import fanout
+from synthetic import SyntheticAirodump
+
+HERE = Path(__file__).resolve().parent
+SEQ_RE = re.compile(rb"^blackswan_snapshot_seq (\d+)", re.M)
+
+
+# ---------------- clientes ----------------
+class EngineIOClient:
+    """Cliente Socket.IO mínimo (websocket, sin polling): conecta y cuenta wifi_delta."""
+
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.ws = WSConnection(ConnectionType.CLIENT)
+        self.parts = []
+        self.synced = False
+        self.closed = False
+        self.deltas = 0
+        self.sock.sendall(self.ws.send(Request(host=f"{host}:{port}",
+                                               target="/socket.io/?EIO=4&transport=websocket")))
+        self.sock.setblocking(False)
+
+    def send_text(self, text):
+        self.sock.setblocking(True)
+        self.sock.sendall(self.ws.send(TextMessage(data=text)))
+        self.sock.setblocking(False)
+
+    def on_message(self, text, now, buckets):
+        if text.startswith("42"):
+            if text.startswith('42["wifi_delta"'):
+                self.deltas += 1
+                bucket = int(now * 10)
+                buckets[bucket] = buckets.get(bucket, 0) + 1
+            elif text.startswith('42["wifi_data"'):
+                self.synced = True  # el escáner ya atendió el connect: está en la room
+        elif text == "2":
+            self.send_text("3")  # ping del servidor → pong
+        elif text.startswith("0"):
+            self.send_text("40")  # open de Engine.IO → connect de Socket.IO
+
+    def readable(self, buckets):
+        try:
+            data = self.sock.recv(256 * 1024)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.closed = True
+            return
+        self.ws.receive_data(data)
+        now = time.time()
+        for event in self.ws.events():
+            if isinstance(event, TextMessage):
+                self.parts.append(event.data)
+                if event.message_finished:
+                    self.on_message("".join(self.parts), now, buckets)
+                    self.parts = []
+            elif isinstance(event, Ping):
+                self.sock.setblocking(True)
+                self.sock.sendall(self.ws.send(event.response()))
+                self.sock.setblocking(False)
+            elif isinstance(event, (CloseConnection, RejectConnection)):
+                self.closed = True
+            elif isinstance(event, (AcceptConnection, BytesMessage)):
+                pass
+
+
+def client_process(ports, count, offset, ready, results, stop_at):
+    """count clientes repartidos entre los puertos; devuelve {décima de segundo: wifi_delta}."""
+    selector = selectors.DefaultSelector()
+    clients = []
+    for i in range(count):
+        client = EngineIOClient("127.0.0.1", ports[(offset + i) % len(ports)])
+        selector.register(client.sock, selectors.EVENT_READ, client)
+        clients.append(client)
+    buckets = {}
+    announced = False
+    while time.time() < stop_at.value or not stop_at.value:
+        for key, _ in selector.select(timeout=0.5):
+            key.data.readable(buckets)
+            if key.data.closed:
+                selector.unregister(key.fileobj)
+        if not announced and all(c.synced for c in clients):
+            ready.put(count)
+            announced = True
+    results.put({"buckets": buckets, "closed": sum(c.closed for c in clients),
+                 "synced": sum(c.synced for c in clients)})
+
+
+# ---------------- procesos del servidor ----------------
+def spawn(env, log):
+    return subprocess.Popen([sys.executable, str(HERE / "main.py")], cwd=HERE, env=dict(os.environ, **env),
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_http(port, path="/health", timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            return urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=2).read()
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"❌ El puerto {port} no responde (ver el log en --logs)")
+
+
+def snapshot_seq(port):
+    m = SEQ_RE.search(wait_http(port, "/metrics"))
+    return int(m.group(1)) if m else 0
+
+
+def stop(procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def run_round(n_workers, args, session, queue_url, logs):
+    """n_workers=0: referencia sin cola, el escáner sirve a --clients-per-worker clientes él solo."""
+    base = args.port
+    env = {"MESSAGE_QUEUE": queue_url if n_workers else "", "QUIET": "1", "OFFLOAD": "1"}
+    procs = []
+    try:
+        with open(logs / f"scanner-{n_workers}.log", "w") as log:
+            procs.append(spawn(dict(env, ROLE="scanner", PORT=str(base), REPLAY=str(session),
+                                    REPLAY_SPEED=str(args.rate)), log))
+        ports = [base + 1 + i for i in range(n_workers)]
+        for port in ports:
+            with open(logs / f"web-{n_workers}-{port}.log", "w") as log:
+                procs.append(spawn(dict(env, ROLE="web", PORT=str(port)), log))
+        wait_http(base)
+        for port in ports:
+            wait_http(port)
+
+        n_clients = args.clients_per_worker * max(1, n_workers)
+        client_ports = ports or [base]
+        ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+        stop_at = multiprocessing.Value("d", 0.0)
+        per_proc = [n_clients // args.client_procs + (i < n_clients % args.client_procs)
+                    for i in range(args.client_procs)]
+        offsets = [sum(per_proc[:i]) for i in range(len(per_proc))]
+        workers = [multiprocessing.Process(target=client_process,
+                                           args=(client_ports, count, offset, ready, results, stop_at))
+                   for count, offset in zip(per_proc, offsets) if count]
+        for w in workers:
+            w.start()
+        synced = 0
+        deadline = time.time() + args.connect_timeout
+        while synced < n_clients and time.time() < deadline:
+            try:
+                synced += ready.get(timeout=1)
+            except Exception:
+                pass
+        time.sleep(args.warmup)
+
+        t0, seq0 = time.time(), snapshot_seq(base)
+        time.sleep(args.duration)
+        t1, seq1 = time.time(), snapshot_seq(base)
+        stop_at.value = time.time() + 1
+        outcome = [results.get(timeout=60) for _ in workers]
+        for w in workers:
+            w.join()
+    finally:
+        stop(procs)
+
+    received = sum(n for r in outcome for bucket, n in r["buckets"].items() if t0 * 10 <= bucket < t1 * 10)
+    ticks = seq1 - seq0
+    expected = ticks * n_clients
+    return {
+        "workers": n_workers,
+        "clients": n_clients,
+        "synced": sum(r["synced"] for r in outcome),
+        "closed": sum(r["closed"] for r in outcome),
+        "ticks": ticks,
+        "delivered": received,
+        "delivered_per_s": round(received / (t1 - t0), 1),
+        "delivery_ratio": round(received / expected, 3) if expected else None,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Prueba de carga escáner → cola → web workers")
+    ap.add_argument("--workers", default="0,1,2,4", help="números de web workers a probar (0 = sin cola)")
+    ap.add_argument("--clients-per-worker", type=int, default=200)
+    ap.add_argument("--client-procs", type=int, default=2)
+    ap.add_argument("--aps", type=int, default=500)
+    ap.add_argument("--stations", type=int, default=1500)
+    ap.add_argument("--rate", type=float, default=2.0, help="ticks por segundo del escáner")
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--warmup", type=float, default=3.0)
+    ap.add_argument("--connect-timeout", type=float, default=60.0)
+    ap.add_argument("--port", type=int, default=8100, help="escáner; los workers usan los siguientes")
+    ap.add_argument("--queue", default="", help="redis://... (por defecto, broker TCP en este proceso)")
+    ap.add_argument("--logs", default=None, help="directorio de logs de los procesos")
+    ap.add_argument("--out", default=None, help="fichero JSONL donde añadir los resultados")
+    args = ap.parse_args()
+
+    queue_url = args.queue
+    if not queue_url:
+        queue_url = f"tcp://127.0.0.1:{fanout.Broker(port=0).start()}"
+
+    tmp = Path(tempfile.mkdtemp(prefix="blackswan-load-"))
+    logs = Path(args.logs) if args.logs else tmp
+    logs.mkdir(parents=True, exist_ok=True)
+    rounds = [int(n) for n in args.workers.split(",")]
+    # Sesión de 1 s virtual por tick, reproducida a --rate: suficiente para la ronda más larga
+    ticks = int((args.warmup + args.duration + args.connect_timeout + 30) * args.rate)
+    session = tmp / "session"
+    SyntheticAirodump(args.aps, args.stations).write_session(session, ticks, interval=1)
+
+    out = open(args.out, "a") if args.out else None
+    baseline = None
+    try:
+        for n in rounds:
+            result = dict(run_round(n, args, session, queue_url, logs), queue=queue_url.split(":")[0],
+                          aps=args.aps, rate=args.rate, cpus=os.cpu_count())
+            if n:
+                # Escalado respecto al primer N > 0: con reparto lineal vale N
+                baseline = baseline or result["delivered_per_s"] / n
+                result["scaling"] = round(result["delivered_per_s"] / baseline, 2) if baseline else None
+            line = json.dumps(result)
+            print(line)
+            sys.stdout.flush()
+            if out:
+                out.write(line + "\n")
+    finally:
+        if out:
+            out.close()
@@ -17,24 +17,115 @@ except Exception as e:
     print("💡 Instálalo: pip install eventlet")
     sys.exit(1)
 
+import gc
 import time
+import shutil
 import signal
 import traceback
 import subprocess
 from pathlib import Path
 import json
+import itertools
 import logging
-from collections import deque
+import shlex
+from collections import deque, namedtuple
+from operator import itemgetter
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO
+
+from watcher import CaptureWatcher
+from pcap_stream import PcapCaptureEngine
+from replay import ReplaySource, parse_speed, run_replay
+from ap_state import APStateStore
+try:
+    from scoring import BatchScorer, DETECTORS
+except ImportError:  # sin NumPy: scoring escalar por AP
+    BatchScorer = None
+    DETECTORS = ("mean",)
+from history import HistoryStore
+from journal import AlertJournal
+from sensors import SensorReading, merge_readings, parse_sensors
+from hub import HubLagMonitor, native_rlock, run_in_worker
+from wire import ENCODINGS as WIRE_ENCODINGS, WireJSON, dumps as wire_dumps, encode as wire_encode
+from subscriptions import ALL_ROOM, SubscriptionManager
+from query import ScanQuery
+from channels import ChannelPolicy, ChannelScheduler, parse_channels
+from capture import CaptureSupervisor
+from probes import ProbeIndex
+from rules import GROUP_FEATURES, RuleEngine
+import fanout
+from metrics import Counter, Gauge, Histogram, Registry, COUNT_BUCKETS, SIZE_BUCKETS
 
 # ---------------- Config ----------------
 INTERFACE = os.environ.get("INTERFACE", "wlan0")
 PORT = int(os.environ.get("PORT", "8000"))
 CSV_PREFIX = "/tmp/airodump_capture"
 QUIET = os.environ.get("QUIET", "0") == "1"
+WATCH_MODE = os.environ.get("WATCH_MODE", "auto")  # auto | inotify | poll
+WATCH_DEBOUNCE = float(os.environ.get("WATCH_DEBOUNCE", "0.25"))
+SCAN_MIN_INTERVAL = float(os.environ.get("SCAN_MIN_INTERVAL", "1.0"))
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", "1.0"))
+TRAFFIC_WINDOW = float(os.environ.get("TRAFFIC_WINDOW", "30"))  # ventana de deltas de tráfico (s)
+INGEST_MODE = os.environ.get("INGEST_MODE", "csv")  # csv | pcap
+PCAP_SOURCE = os.environ.get("PCAP_SOURCE", "")  # fichero/FIFO pcap externo (vacío = .cap de airodump)
+PCAP_TTL = float(os.environ.get("PCAP_TTL", "600"))  # olvidar APs/estaciones del pcap sin tramas (s, 0 = nunca)
+REPLAY = os.environ.get("REPLAY", "")  # directorio o .tar/.zip de snapshots CSV grabados
+REPLAY_SPEED = os.environ.get("REPLAY_SPEED", "1")  # 1, 10, 10x, max
+REPLAY_EXIT = os.environ.get("REPLAY_EXIT", "0") == "1"  # salir al terminar (medir throughput)
+RECORD_DIR = os.environ.get("RECORD_DIR", "")  # copia cada CSV ingerido con su timestamp
+STATION_TTL = float(os.environ.get("STATION_TTL", "3600"))  # olvidar estaciones no vistas (s)
+PROBE_INDEX_MAX = int(os.environ.get("PROBE_INDEX_MAX", "50000"))  # estaciones con probes en el índice
+KARMA_MIN_PROBERS = int(os.environ.get("KARMA_MIN_PROBERS", "3"))  # estaciones buscando el ESSID del señuelo
+KARMA_NEW_WINDOW = float(os.environ.get("KARMA_NEW_WINDOW", "600"))  # un BSSID es "nuevo" durante N s
+KARMA_WARMUP = float(os.environ.get("KARMA_WARMUP", str(KARMA_NEW_WINDOW)))  # BSSIDs de los primeros N s = línea base
+AP_STATE_TTL = float(os.environ.get("AP_STATE_TTL", "3600"))  # olvidar baselines de APs no vistos (s)
+AP_STATE_MAX = int(os.environ.get("AP_STATE_MAX", "0"))  # máximo de APs con estado (0 = sin límite)
+DATA_DIR = os.environ.get("DATA_DIR", str(Path(__file__).resolve().parent / "data"))  # estado persistente
+HISTORY = os.environ.get("HISTORY", "0" if REPLAY else "1") == "1"  # histórico en disco por BSSID
+HISTORY_DB = os.environ.get("HISTORY_DB", os.path.join(DATA_DIR, "history.db"))
+HISTORY_RETENTION = tuple(float(h) * 3600 for h in os.environ.get("HISTORY_RETENTION", "6,168,2160").split(","))  # raw,1m,15m (horas)
+HISTORY_MAX_POINTS = int(os.environ.get("HISTORY_MAX_POINTS", "500"))
+ALERT_JOURNAL = os.environ.get("ALERT_JOURNAL", "0" if REPLAY else "1") == "1"  # diario de alertas en disco
+ALERT_JOURNAL_DIR = os.environ.get("ALERT_JOURNAL_DIR", os.path.join(DATA_DIR, "alerts"))
+ALERT_JOURNAL_SEGMENT_MB = float(os.environ.get("ALERT_JOURNAL_SEGMENT_MB", "4"))  # tamaño de cada segmento
+ALERT_JOURNAL_SEGMENTS = int(os.environ.get("ALERT_JOURNAL_SEGMENTS", "8"))  # segmentos retenidos
+ALERT_REOPEN = float(os.environ.get("ALERT_REOPEN", "600"))  # sin verse tanto tiempo, el incidente se cierra (s)
+ALERT_UPDATE_INTERVAL = float(os.environ.get("ALERT_UPDATE_INTERVAL", "60"))  # updates de un incidente (s)
+PERSIST_STATE = os.environ.get("PERSIST_STATE", "0" if REPLAY else "1") == "1"  # checkpoint de baselines/cooldowns
+STATE_FILE = os.environ.get("STATE_FILE", os.path.join(DATA_DIR, "state.json"))
+STATE_CHECKPOINT_INTERVAL = float(os.environ.get("STATE_CHECKPOINT_INTERVAL", "300"))  # s
+STATE_MAX_AGE = float(os.environ.get("STATE_MAX_AGE", "1800"))  # descartar APs no vistos hace más (s)
+TRAFFIC_DETECTOR = os.environ.get("TRAFFIC_DETECTOR", "mean")  # mean | ewma | mad (ewma/mad requieren NumPy)
+TRAFFIC_EWMA_ALPHA = float(os.environ.get("TRAFFIC_EWMA_ALPHA", "0.3"))
+TRAFFIC_SPIKE_Z = float(os.environ.get("TRAFFIC_SPIKE_Z", "10"))
+TRAFFIC_SUSPICIOUS_Z = float(os.environ.get("TRAFFIC_SUSPICIOUS_Z", "5"))
+RULES_FILE = os.environ.get("RULES_FILE", "")  # reglas de detección JSON/YAML, recarga en caliente (vacío = integradas)
+SENSORS = os.environ.get("SENSORS", "")  # varios sensores: wlan1,techo=iface:wlan2,norte=dir:/srv/norte
+SENSOR_MAX_AGE = float(os.environ.get("SENSOR_MAX_AGE", "120"))  # ignorar sensores sin CSV nuevo (s)
+OFFLOAD = os.environ.get("OFFLOAD", "1") == "1"  # parse/detección/serialización en un hilo nativo
+HUB_LAG_INTERVAL = float(os.environ.get("HUB_LAG_INTERVAL", "0.05"))  # muestreo del bloqueo del hub (s)
+HUB_STALL_BUDGET = float(os.environ.get("HUB_STALL_BUDGET", "200"))  # bloqueo máximo tolerado (ms)
+GC_THRESHOLD = int(os.environ.get("GC_THRESHOLD", "20000"))  # umbral gen0 del GC (Python: 700)
+DEBUG_CSV_RANGE = int(os.environ.get("DEBUG_CSV_RANGE", "65536"))  # bytes por defecto en /debug_csv?offset=
+DEBUG_CSV_RANGE_MAX = int(os.environ.get("DEBUG_CSV_RANGE_MAX", str(8 * 1024 * 1024)))  # tope por petición
+AIRODUMP_BIN = shlex.split(os.environ.get("AIRODUMP_BIN", "airodump-ng"))  # p.ej. "python3 fake_airodump.py"
+CAPTURE_CHECK_INTERVAL = float(os.environ.get("CAPTURE_CHECK_INTERVAL", "2"))  # vigilancia de airodump (s)
+CAPTURE_STALE = float(os.environ.get("CAPTURE_STALE", "20"))  # fichero sin escrituras: airodump colgado (s)
+CAPTURE_GRACE = float(os.environ.get("CAPTURE_GRACE", "10"))  # espera al primer fichero tras lanzar (s)
+CAPTURE_BACKOFF = float(os.environ.get("CAPTURE_BACKOFF", "1"))  # primer reintento; se duplica en cada fallo (s)
+CAPTURE_BACKOFF_MAX = float(os.environ.get("CAPTURE_BACKOFF_MAX", "60"))
+CHANNEL_SCHEDULER = os.environ.get("CHANNEL_SCHEDULER", "0") == "1"  # salto de canal adaptativo
+CHANNELS = os.environ.get("CHANNELS", "1-13")  # canales base (nunca bajan de peso 1)
+CHANNEL_HOP_MS = int(os.environ.get("CHANNEL_HOP_MS", "250"))  # tiempo por salto (-f de airodump)
+CHANNEL_MAX_WEIGHT = int(os.environ.get("CHANNEL_MAX_WEIGHT", "4"))  # repeticiones máximas de un canal
+CHANNEL_MIN_INTERVAL = float(os.environ.get("CHANNEL_MIN_INTERVAL", "120"))  # entre relanzamientos (s)
+CHANNEL_URGENT_INTERVAL = float(os.environ.get("CHANNEL_URGENT_INTERVAL", "30"))  # ídem con alerta alta (s)
+CHANNEL_MAX_PER_HOUR = int(os.environ.get("CHANNEL_MAX_PER_HOUR", "12"))
+CHANNEL_THRESHOLD = float(os.environ.get("CHANNEL_THRESHOLD", "0.2"))  # cambio mínimo del reparto de tiempo
+ROLE = os.environ.get("ROLE", "scanner")  # scanner | web (worker sin captura detrás de MESSAGE_QUEUE)
+MESSAGE_QUEUE = os.environ.get("MESSAGE_QUEUE", "")  # redis://host:6379/0 | tcp://host:6390 (fanout.py)
 
 # ---------------- Logging ----------------
 logger = logging.getLogger("blackswan")
@@ -42,12 +133,42 @@ logger.setLevel(logging.WARNING if QUIET else logging.INFO)
 handler = logging.StreamHandler(sys.stdout)
 formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%H:%M:%S")
 handler.setFormatter(formatter)
+# El productor loguea desde un hilo nativo (OFFLOAD): un lock verde compartido con el hub se bloquearía
+handler.lock = native_rlock()
 logger.handlers = []
 logger.addHandler(handler)
 
 for lib in ("engineio", "socketio", "werkzeug"):
     logging.getLogger(lib).setLevel(logging.WARNING)
 
+if TRAFFIC_DETECTOR not in DETECTORS:
+    logger.warning(f"⚠️ TRAFFIC_DETECTOR={TRAFFIC_DETECTOR} no disponible (¿NumPy instalado?), usando 'mean'")
+    TRAFFIC_DETECTOR = "mean"
+
+try:
+    sensors = parse_sensors(SENSORS, CSV_PREFIX)
+except ValueError as e:
+    logger.error(f"❌ SENSORS no válido: {e}")
+    sys.exit(1)
+if sensors and INGEST_MODE != "csv":
+    logger.warning("⚠️ SENSORS solo funciona con INGEST_MODE=csv, se usa un único sensor")
+    sensors = []
+if CHANNEL_SCHEDULER and (sensors or INGEST_MODE != "csv" or REPLAY):
+    logger.warning("⚠️ CHANNEL_SCHEDULER solo funciona con un airodump-ng local en INGEST_MODE=csv")
+    CHANNEL_SCHEDULER = False
+if ROLE not in ("scanner", "web"):
+    logger.error(f"❌ ROLE no válido: {ROLE} (scanner | web)")
+    sys.exit(1)
+if ROLE == "web" and not MESSAGE_QUEUE:
+    logger.error("❌ ROLE=web necesita MESSAGE_QUEUE (la cola por la que publica el escáner)")
+    sys.exit(1)
+try:
+    queue_manager = fanout.client_manager(MESSAGE_QUEUE, ROLE) if MESSAGE_QUEUE else None
+    control_channel = fanout.ControlChannel(MESSAGE_QUEUE) if MESSAGE_QUEUE else None
+except ValueError as e:
+    logger.error(f"❌ MESSAGE_QUEUE no válido: {e}")
+    sys.exit(1)
+
 # ---------------- App ----------------
 app = Flask(__name__)
 CORS(app)
@@ -59,27 +180,234 @@ socketio = SocketIO(
     ping_interval=25,
     async_mode="eventlet",
     logger=False,
-    engineio_logger=False
+    engineio_logger=False,
+    json=WireJSON,
+    client_manager=queue_manager
 )
 
 # ---------------- Globals ----------------
-proc = None
+capture_supervisor = None  # Supervisor del airodump-ng local (capture.CaptureSupervisor)
 clients_count = 0
+client_encodings = {}  # sid -> codificación negociada, solo si no es JSON
 scanner_running = True
-last_ap_data = {}  # Último valor de paquetes por AP
-ap_baselines = {}  # Baseline de tráfico normal por AP (media móvil)
-ap_alert_history = {}  # Historial de alertas para evitar spam
+# Último contador, baseline e historial de alertas por AP (columnar si hay NumPy)
+if BatchScorer is not None:
+    ap_state = BatchScorer(AP_STATE_TTL, AP_STATE_MAX, TRAFFIC_DETECTOR, TRAFFIC_EWMA_ALPHA)
+else:
+    ap_state = APStateStore(AP_STATE_TTL, AP_STATE_MAX)
+last_traffic_analysis = 0.0  # Último análisis de tráfico (cada TRAFFIC_WINDOW s)
+pcap_engine = None  # Motor pcap (solo INGEST_MODE=pcap)
+history = None  # Histórico en disco (HISTORY=1)
+journal = None  # Diario de alertas (ALERT_JOURNAL=1)
+last_checkpoint = 0.0  # Último checkpoint de ap_state (PERSIST_STATE=1)
+virtual_time = None  # Reloj virtual del replay (None = tiempo real)
+counter_generation = None  # capture_generation() con la que se calcularon los últimos deltas
+counter_sources = {}  # bssid -> sensor que dio el contador fusionado (el máximo) en la última ventana
+channel_scheduler = None  # Salto de canal adaptativo (CHANNEL_SCHEDULER=1)
+
+# ---------------- Métricas (/metrics) ----------------
+# Los histogramas se alimentan en el propio pipeline (unos perf_counter por
+# tick); los gauges se calculan al hacer el scrape.
+metrics = Registry()
+STAGE_SECONDS = metrics.add(Histogram(
+    "blackswan_stage_seconds", "Duración de cada etapa del tick", ("stage",)))
+CSV_BYTES = metrics.add(Histogram(
+    "blackswan_csv_bytes", "Tamaño de cada CSV ingerido", buckets=SIZE_BUCKETS))
+CSV_ROWS = metrics.add(Histogram(
+    "blackswan_csv_rows", "Filas de cada CSV ingerido", ("section",), COUNT_BUCKETS))
+PAYLOAD_BYTES = metrics.add(Histogram(
+    "blackswan_payload_bytes", "Tamaño del payload serializado", ("event", "encoding"), SIZE_BUCKETS))
+HUB_LAG = metrics.add(Histogram(
+    "blackswan_hub_lag_seconds", "Retraso del hub de eventlet al despertar un sleep corto"))
+TICKS = metrics.add(Counter("blackswan_ticks_total", "Ticks procesados por estado", ("status",)))
+CHANNEL_RETUNES = metrics.add(Counter(
+    "blackswan_channel_retunes_total", "Relanzamientos de airodump-ng con un plan de canales nuevo"))
+RULE_SECONDS = metrics.add(Counter(
+    "blackswan_rule_seconds_total", "Tiempo evaluando cada regla de detección", ("rule",)))
+RULE_MATCHES = metrics.add(Counter(
+    "blackswan_rule_matches_total", "Filas (APs o grupos) que cumplen cada regla", ("rule",)))
+hub_monitor = HubLagMonitor(HUB_LAG_INTERVAL, HUB_STALL_BUDGET / 1000.0, observe=HUB_LAG.observe)
+
+# ---------------- Reglas de detección ----------------
+def observe_rule(name, seconds, matches):
+    RULE_SECONDS.inc(seconds, name)
+    RULE_MATCHES.inc(matches, name)
+
+# Umbrales de tráfico y pesos de evil twin (rules.py); TRAFFIC_*_Z quedan como parámetros
+rule_engine = RuleEngine(RULES_FILE, TRAFFIC_DETECTOR,
+                         {"spike_z": TRAFFIC_SPIKE_Z, "suspicious_z": TRAFFIC_SUSPICIOUS_Z}, observe=observe_rule)
+
+def clock():
+    """Hora usada por la detección; en replay avanza con los snapshots grabados."""
+    return virtual_time if virtual_time is not None else time.time()
+
+def offload(func, *args):
+    """Trabajo de CPU en el hilo del productor (OFFLOAD=1) o en el propio hub (OFFLOAD=0)."""
+    return run_in_worker(func, *args) if OFFLOAD else func(*args)
+
+# Resultado de leer la fuente: APs (formato parser), ruta y filas de estaciones
+# (mac, power, bssid|None, probes) incluyendo las no asociadas; probes es la
+# columna "Probed ESSIDs" en crudo ("" si no hay).
+Capture = namedtuple("Capture", ["aps", "source", "stations"])
+
+# ---------------- Índice global de estaciones ----------------
+# MAC (minúsculas) -> registro. Cubre estaciones asociadas y no asociadas; la
+# asociación y el roaming se resuelven en O(1) por estación.
+station_index = {}
+roaming_history = deque(maxlen=500)  # últimos eventos de roaming
+# ESSID <-> estaciones que lo buscan y BSSIDs nuevos (señal de karma, ver probes.py)
+probe_index = ProbeIndex(PROBE_INDEX_MAX, ttl=STATION_TTL, max_bssids=AP_STATE_MAX or 100000,
+                         new_window=KARMA_NEW_WINDOW, warmup=KARMA_WARMUP)
+
+def update_station_index(rows, now):
+    """Actualiza el índice con las filas del tick. Devuelve los eventos de roaming."""
+    roams = []
+    for mac, power, bssid, _probes in rows:
+        key = mac.lower()
+        bssid = bssid.lower() if bssid else None
+        rec = station_index.get(key)
+        if rec is None:
+            station_index[key] = {
+                "mac": mac,
+                "bssid": bssid,
+                "power": power,
+                "first_seen": now,
+                "last_seen": now,
+                "roams": 0,
+            }
+            continue
+        if bssid and rec["bssid"] and bssid != rec["bssid"]:
+            event = {"mac": rec["mac"], "from": rec["bssid"], "to": bssid, "timestamp": now}
+            roams.append(event)
+            roaming_history.append(event)
+            rec["roams"] += 1
+            logger.info(f"[stations] 🔀 Roaming {rec['mac']}: {rec['bssid']} → {bssid}")
+        # sin BSSID = "(not associated)": la estación ya no está asociada
+        rec["bssid"] = bssid
+        rec["power"] = power
+        rec["last_seen"] = now
+
+    if STATION_TTL > 0:
+        expired = [k for k, rec in station_index.items() if now - rec["last_seen"] > STATION_TTL]
+        for k in expired:
+            del station_index[k]
+    return roams
+
+# ---------------- Snapshot store ----------------
+# Un único productor (scanner_loop) parsea y analiza una vez por tick y publica
+# un snapshot inmutable. Sockets y /scan solo leen el último publicado (O(1)),
+# así que nunca vuelven a parsear el CSV ni avanzan ap_state.
+ScanSnapshot = namedtuple(
+    "ScanSnapshot",
+    ["seq", "timestamp", "status", "aps", "alerts", "total_clients", "csv_path", "roams", "journal"]
+)
+
+current_snapshot = ScanSnapshot(
+    seq=0, timestamp=clock(), status="no_csv",
+    aps=(), alerts=(), total_clients=0, csv_path=None, roams=(), journal=()
+)
+
+def publish_snapshot(status, aps, alerts, csv_path=None, roams=(), journal_records=()):
+    """Publica un nuevo snapshot. Solo debe llamarlo el productor."""
+    global current_snapshot
+    snap = ScanSnapshot(
+        seq=current_snapshot.seq + 1,
+        timestamp=clock(),
+        status=status,
+        aps=tuple(aps),
+        alerts=tuple(alerts),
+        total_clients=sum(len(ap["clients"]) for ap in aps),
+        csv_path=str(csv_path) if csv_path else None,
+        roams=tuple(roams),
+        journal=tuple(journal_records)
+    )
+    current_snapshot = snap
+    return snap
+
+def get_snapshot():
+    return current_snapshot
+
+def snapshot_payload(snap, **extra):
+    """Payload wifi_data a partir de un snapshot (no copia la lista de APs)."""
+    payload = {
+        "aps": snap.aps,
+        "timestamp": snap.timestamp,
+        "total_networks": len(snap.aps),
+        "total_clients": snap.total_clients,
+        "ws_clients_connected": clients_count,
+        "seq": snap.seq,
+        "status": snap.status,
+        "alerts": snap.alerts,
+    }
+    payload.update(extra)
+    return payload
 
 # ---------------- util: encontrar CSV ----------------
+# El supervisor sabe qué fichero escribe airodump: sin glob ni stat por candidato
 def find_csv():
-    try:
-        candidates = sorted(Path("/tmp").glob("airodump_capture-*.csv"),
-                          key=lambda p: p.stat().st_mtime if p.exists() else 0,
-                          reverse=True)
-        return candidates[0] if candidates else None
-    except Exception as e:
-        logger.debug(f"[find_csv] Error: {e}")
+    return capture_supervisor.active_path if capture_supervisor is not None else None
+
+def find_pcap():
+    if PCAP_SOURCE:
+        return Path(PCAP_SOURCE) if Path(PCAP_SOURCE).exists() else None
+    return capture_supervisor.active_path if capture_supervisor is not None else None
+
+def get_pcap_engine():
+    """Crea el motor pcap en cuanto aparece la fuente (y otro si airodump empieza un .cap nuevo)."""
+    global pcap_engine
+    path = find_pcap()
+    if path is None:
         return None
+    if pcap_engine is None or pcap_engine.path != str(path):
+        if pcap_engine is not None:
+            logger.info(f"[pcap] 🔁 Nueva captura {path}")
+            pcap_engine.close()
+        pcap_engine = PcapCaptureEngine(path, ttl=PCAP_TTL)
+    return pcap_engine
+
+def get_history():
+    global history
+    if history is None and HISTORY:
+        try:
+            history = HistoryStore(HISTORY_DB, HISTORY_RETENTION, max_points=HISTORY_MAX_POINTS)
+        except Exception:
+            logger.exception(f"[history] No se pudo abrir {HISTORY_DB}, histórico desactivado")
+            return None
+    return history
+
+def get_journal():
+    global journal
+    if journal is None and ALERT_JOURNAL:
+        try:
+            journal = AlertJournal(ALERT_JOURNAL_DIR, int(ALERT_JOURNAL_SEGMENT_MB * 1024 * 1024),
+                                   ALERT_JOURNAL_SEGMENTS, ALERT_REOPEN, ALERT_UPDATE_INTERVAL)
+        except Exception:
+            logger.exception(f"[journal] No se pudo abrir {ALERT_JOURNAL_DIR}, diario desactivado")
+            return None
+    return journal
+
+# ---------------- Persistencia del estado de detección ----------------
+def save_state():
+    """Checkpoint de baselines, contadores y cooldowns (arranque en caliente)."""
+    global last_checkpoint
+    last_checkpoint = clock()
+    try:
+        t0 = time.perf_counter()
+        n = ap_state.save(STATE_FILE, last_checkpoint)
+        logger.info(f"[state] 💾 Checkpoint de {n} APs en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    except Exception:
+        logger.exception(f"[state] No se pudo guardar {STATE_FILE}")
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return
+    try:
+        t0 = time.perf_counter()
+        loaded, stale = ap_state.load(STATE_FILE, clock(), STATE_MAX_AGE)
+        logger.info(f"[state] ♻️ Estado restaurado: {loaded} APs ({stale} obsoletos descartados) "
+                    f"en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    except Exception:
+        logger.exception(f"[state] Checkpoint no válido en {STATE_FILE}, se empieza en frío")
 
 # ---------------- helpers estadísticos ----------------
 def median(values):
@@ -93,8 +421,8 @@ def median(values):
     else:
         return s[mid]
 
-# ---------------- CSV parser ----------------
-def parse_airodump_csv(csv_path: Path):
+# ---------------- CSV parser (legacy, referencia para benchmark) ----------------
+def parse_airodump_csv_legacy(csv_path: Path):
     import csv
     aps_map = {}
     try:
@@ -221,478 +549,1410 @@ def parse_airodump_csv(csv_path: Path):
                         if not any(c.get("mac", "").lower() == st_mac.lower() for c in ap["clients"]):
                             ap["clients"].append({"mac": st_mac, "power": st_power})
 
-        aps = list(aps_map.values())
-        aps.sort(key=lambda x: x.get("power", -100), reverse=True)
+        return finalize_aps(aps_map)
 
-        # Detectar ESSIDs duplicados (possible evil twin)
-        essid_counts = {}
-        for ap in aps:
-            ess = (ap.get("essid") or "").strip()
-            if ess and ess.lower() != "oculto":
-                essid_counts[ess.lower()] = essid_counts.get(ess.lower(), 0) + 1
+    except Exception:
+        logger.exception("[parser] Error parsing CSV")
+        return []
 
-        # Asignar flags basadas en heurística
-        data_vals = [max(0, ap.get("data", 0)) for ap in aps]
-        med = median(data_vals)
-        if med <= 0:
-            med = 1
+def finalize_aps(aps_map):
+    """Ordena APs/clientes y asigna data_flag (possible_evil_twin lo pone detect_evil_twin)."""
+    aps = list(aps_map.values())
+    aps.sort(key=lambda x: x.get("power", -100), reverse=True)
 
-        for ap in aps:
-            val = max(0, ap.get("data", 0))
-            if val > med * 10 and val > 1000:
-                ap["data_flag"] = "high"
-            elif val > med * 2 and val > 100:
-                ap["data_flag"] = "suspicious"
-            else:
-                ap["data_flag"] = "normal"
+    # Asignar flags basadas en heurística
+    data_vals = [max(0, ap.get("data", 0)) for ap in aps]
+    med = median(data_vals)
+    if med <= 0:
+        med = 1
 
-            # marcar possible evil twin si el ESSID aparece >1
-            ess = (ap.get("essid") or "").strip()
-            if ess and ess.lower() != "oculto" and essid_counts.get(ess.lower(), 0) > 1:
-                ap["possible_evil_twin"] = True
+    for ap in aps:
+        val = max(0, ap.get("data", 0))
+        if val > med * 10 and val > 1000:
+            ap["data_flag"] = "high"
+        elif val > med * 2 and val > 100:
+            ap["data_flag"] = "suspicious"
+        else:
+            ap["data_flag"] = "normal"
+
+        ap["clients"].sort(key=lambda c: c.get("power", -100), reverse=True)
+        ap["clients_count_ap"] = len(ap["clients"])
+
+    return aps
+
+# ---------------- CSV parser streaming (una pasada) ----------------
+# Columnas de "datos" en orden de preferencia (mismo orden que el parser legacy)
+DATA_COLUMNS = ("data", "# data", "packets", "# packets", "# beacons", "beacons")
+
+def fast_int(value, default):
+    """int() directo; si falla, filtra dígitos como el parser legacy."""
+    try:
+        return int(value)
+    except ValueError:
+        digits = ''.join(ch for ch in value if (ch.isdigit() or ch == '-'))
+        try:
+            return int(digits) if digits else default
+        except ValueError:
+            return default
+
+def split_csv_line(line):
+    """Divide una línea; solo usa csv.reader si hay comillas (airodump no las usa)."""
+    if '"' in line:
+        import csv
+        return next(csv.reader([line]), [])
+    return line.split(",")
+
+def cell(row, idx):
+    if idx is None or idx >= len(row):
+        return ""
+    return row[idx].strip()
+
+def ap_columns(header):
+    """Resuelve una sola vez las posiciones de las columnas AP usadas."""
+    hmap = {h.strip().lower(): i for i, h in enumerate(header)}
+    data_idxs = tuple(hmap[name] for name in DATA_COLUMNS if name in hmap)
+    return (
+        hmap.get("bssid", 0),
+        hmap.get("essid", hmap.get("ssid", 13)),
+        hmap.get("channel", 3),
+        hmap.get("privacy", 5),
+        hmap.get("power", 8),
+        data_idxs,
+    )
+
+def parse_ap_row(row, cols, aps_map):
+    if len(row) < 2:
+        return
+    i_bssid, i_essid, i_channel, i_privacy, i_power, data_idxs = cols
+    bssid = cell(row, i_bssid)
+    if not bssid or bssid.lower() == "station mac":
+        return
+
+    data_val = None
+    for idx in data_idxs:
+        val = cell(row, idx)
+        if val:
+            try:
+                data_val = int(val)
+                break
+            except ValueError:
+                digits = ''.join(ch for ch in val if (ch.isdigit() or ch == '-'))
+                try:
+                    data_val = int(digits) if digits else 0
+                    break
+                except ValueError:
+                    continue
+    if data_val is None:
+        # Fallback posicional idéntico al legacy
+        data_val = 0
+        for idx_try in (9, 8, 6, 5):
+            if idx_try < len(row):
+                digits = ''.join(ch for ch in row[idx_try] if (ch.isdigit() or ch == '-'))
+                try:
+                    data_val = int(digits) if digits else 0
+                    break
+                except ValueError:
+                    continue
+
+    essid = cell(row, i_essid)
+    aps_map[bssid.lower()] = {
+        "bssid": bssid,
+        "essid": essid if essid else "Oculto",
+        "channel": cell(row, i_channel),
+        "privacy": cell(row, i_privacy),
+        "power": fast_int(cell(row, i_power), -100),
+        "data": data_val,
+        "clients": [],
+        "clients_count_ap": 0,
+        "data_flag": "normal",
+        "possible_evil_twin": False
+    }
+
+def parse_airodump_csv_stream(csv_path: Path, stations=None):
+    """
+    Parser de una sola pasada: lee línea a línea, resuelve las cabeceras una vez
+    por sección y solo decodifica las columnas usadas. Devuelve exactamente lo
+    mismo que parse_airodump_csv_legacy para la salida de airodump-ng.
+
+    Si se pasa `stations` (lista), se le añaden todas las estaciones como
+    (mac, power, bssid|None, probes), también las no asociadas.
+    """
+    aps_map = {}
+    try:
+        if not csv_path.exists():
+            return []
+
+        ap_cols = None
+        ap_pending = []  # filas antes de la cabecera (solo si no hay cabecera BSSID)
+        in_stations = False
+        clients_seen = {}  # bssid -> set(macs) para dedupe O(1)
+
+        with open(csv_path, "r", encoding="utf-8", errors="ignore", newline=None) as fh:
+            for line in fh:
+                if not in_stations:
+                    stripped = line.strip()
+                    if not stripped:
+                        continue
+                    if stripped.lower().startswith("station mac"):
+                        in_stations = True
+                        if ap_cols is None:
+                            cols = ap_columns([])
+                            for row in ap_pending:
+                                parse_ap_row(row, cols, aps_map)
+                            ap_pending = None
+                        header = [c.strip() for c in split_csv_line(line.rstrip("\r\n"))]
+                        st_map = {h.lower(): i for i, h in enumerate(header)}
+                        i_mac, i_power, i_bssid = st_map.get("station mac", 0), st_map.get("power", 3), st_map.get("bssid", 5)
+                        i_probes = st_map.get("probed essids", 6)  # última columna: lista con comas
+                        st_split = max(i_mac, i_power, i_bssid + 1, i_probes)
+                        continue
+                    row = split_csv_line(line.rstrip("\r\n"))
+                    if ap_cols is None:
+                        if row and row[0].strip().lower().startswith("bssid"):
+                            ap_cols = ap_columns(row)
+                            ap_pending = None
+                        else:
+                            ap_pending.append(row)
+                        continue
+                    parse_ap_row(row, ap_cols, aps_map)
+                else:
+                    # Ruta caliente: solo se parten las columnas hasta la última usada; lo
+                    # que queda (row[st_split]) son los Probed ESSIDs sin partir
+                    if '"' in line:
+                        row = split_csv_line(line.rstrip("\r\n"))
+                        probes = ",".join(row[i_probes:])
+                    else:
+                        row = line.split(",", st_split)
+                        probes = row[st_split] if len(row) > st_split else ""
+                    if stations is not None:
+                        collect_station(row, i_mac, i_power, i_bssid, probes, stations)
+                    if len(row) <= i_bssid:
+                        continue
+                    st_bssid = row[i_bssid].strip().lower()
+                    ap = aps_map.get(st_bssid) if st_bssid else None
+                    if ap is None:
+                        continue
+                    st_mac = cell(row, i_mac)
+                    if not st_mac:
+                        continue
+                    seen = clients_seen.setdefault(st_bssid, set())
+                    mac_l = st_mac.lower()
+                    if mac_l not in seen:
+                        seen.add(mac_l)
+                        ap["clients"].append({"mac": st_mac, "power": fast_int(cell(row, i_power), -100)})
 
-            ap["clients"].sort(key=lambda c: c.get("power", -100), reverse=True)
-            ap["clients_count_ap"] = len(ap["clients"])
+        if ap_cols is None and ap_pending:
+            cols = ap_columns([])
+            for row in ap_pending:
+                parse_ap_row(row, cols, aps_map)
 
-        return aps
+        return finalize_aps(aps_map)
 
     except Exception:
-        logger.exception("[parser] Error parsing CSV")
+        logger.exception("[parser] Error parsing CSV (stream)")
         return []
 
+def collect_station(row, i_mac, i_power, i_bssid, probes, stations):
+    st_mac = cell(row, i_mac)
+    if not st_mac:
+        return
+    st_bssid = cell(row, i_bssid)
+    # "(not associated)" y similares no son un BSSID
+    if len(st_bssid) != 17 or st_bssid[2] != ":":
+        st_bssid = None
+    stations.append((st_mac, fast_int(cell(row, i_power), -100), st_bssid, probes.strip()))
+
+def parse_airodump_csv(csv_path: Path, stations=None):
+    return parse_airodump_csv_stream(csv_path, stations)
+
 # ---------------- airodump launcher ----------------
-def start_airodump_csv():
+def clear_capture_files():
     for p in Path("/tmp").glob("airodump_capture*"):
         try:
             p.unlink()
         except Exception:
             pass
 
-    cmd = [
-        "airodump-ng",
+def airodump_command(interface=INTERFACE, prefix=CSV_PREFIX, plan=None):
+    cmd = AIRODUMP_BIN + [
         "--write-interval", "1",
-        "--output-format", "csv",
-        "-w", CSV_PREFIX,
-        INTERFACE
+        "--output-format", "pcap" if INGEST_MODE == "pcap" else "csv",
+        "-w", prefix,
     ]
-    try:
-        proc_local = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        logger.info(f"[scanner] airodump-ng lanzado como PID {proc_local.pid} en interfaz {INTERFACE}")
-        return proc_local
-    except FileNotFoundError:
-        logger.error("[ERROR] airodump-ng no encontrado")
-        sys.exit(1)
-    except Exception:
-        logger.exception("[ERROR] al lanzar airodump-ng")
-        sys.exit(1)
+    if plan is not None:
+        # airodump no tiene dwell por canal: el peso es el número de apariciones en la lista de salto
+        cmd += ["-c", ",".join(map(str, plan.hops)), "-f", str(CHANNEL_HOP_MS)]
+    cmd.append(interface)
+    return cmd
+
+def start_capture(name, interface=INTERFACE, prefix=CSV_PREFIX, plan=None):
+    """Lanza airodump-ng bajo un supervisor (relanzamiento con backoff, fichero activo exacto)."""
+    supervisor = CaptureSupervisor(
+        name, airodump_command(interface, prefix, plan), prefix,
+        ext=".cap" if INGEST_MODE == "pcap" else ".csv",
+        stale_after=CAPTURE_STALE, grace=CAPTURE_GRACE,
+        backoff=CAPTURE_BACKOFF, backoff_max=CAPTURE_BACKOFF_MAX)
+    supervisor.start(time.time())
+    return supervisor
+
+def supervisors():
+    local = [capture_supervisor] if capture_supervisor is not None else []
+    return local + [s.capture for s in sensors if s.capture is not None]
+
+def supervise_loop():
+    """Vigila los airodump-ng: proceso muerto, fichero que no crece, relanzamientos pendientes."""
+    while scanner_running:
+        for supervisor in supervisors():
+            try:
+                supervisor.check()
+            except Exception:
+                logger.exception(f"[capture] Error supervisando {supervisor.name}")
+        eventlet.sleep(CAPTURE_CHECK_INTERVAL)
+
+def capture_generation():
+    """Por supervisor: cambia cada vez que su airodump empieza un fichero nuevo (contadores desde cero)."""
+    return {supervisor.name: supervisor.generation for supervisor in supervisors()}
+
+def reset_restarted_counters(generation):
+    """
+    Contadores tras relanzar airodump. Con una sola captura todos empiezan de
+    cero. Con varios sensores el contador de un AP es el máximo entre ellos:
+    solo se tocan los APs cuyo máximo venía de un sensor relanzado, y se
+    rebasan sin delta porque los demás sensores siguen contando.
+    """
+    if not sensors or counter_generation is None:
+        return ap_state.reset_counters()
+    restarted = {name for name, gen in generation.items() if counter_generation.get(name) != gen}
+    return ap_state.reset_counters([b for b, name in counter_sources.items() if name in restarted], -1)
+
+def data_source(ap):
+    seen = ap.get("sensors")
+    return max(seen, key=lambda name: seen[name]["data"]) if seen else None
+
+def reset_moved_counters(aps):
+    """
+    El contador fusionado es el máximo entre sensores: si pasa a salir de otro
+    sensor (el anterior quedó obsoleto, vuelve o lo adelanta otro) salta sin
+    que haya más tráfico. Esos APs se rebasan sin delta, como tras relanzar.
+    """
+    moved = []
+    for ap in aps:
+        bssid = ap["bssid"].lower()
+        previous = counter_sources.get(bssid)
+        if previous is not None and previous != data_source(ap):
+            moved.append(bssid)
+    return ap_state.reset_counters(moved, -1) if moved else 0
+
+# ---------------- Salto de canal adaptativo ----------------
+# Cambiar la lista de salto exige relanzar airodump-ng. El supervisor lanza el
+# nuevo proceso antes de parar el viejo, que sigue escribiendo su CSV hasta
+# que el nuevo tiene el suyo: el hueco de captura es el arranque de airodump,
+# no arranque + parada.
+def retune_capture(plan):
+    if not capture_supervisor.restart(airodump_command(plan=plan), time.time()):
+        logger.error("[channels] ❌ No se pudo relanzar airodump-ng, se mantiene la captura actual")
+        return
+    CHANNEL_RETUNES.inc()
+    logger.info(f"[channels] 📻 Nuevo plan de canales: -c {','.join(map(str, plan.hops))}")
+
+def schedule_channels(snap):
+    """Tras cada tick: el planificador decide (en el productor) y el relanzamiento se hace en el hub."""
+    plan = offload(channel_scheduler.update, snap.aps, snap.alerts, clock())
+    if plan is not None:
+        retune_capture(plan)
 
 # ---------------- Sistema Inteligente de Detección Evil Twin ----------------
-def detect_evil_twin(aps):
-    """Detección mejorada de Evil Twin que evita falsos positivos por bandas duales"""
-    alerts = []
-    
-    # Agrupar APs por ESSID
-    essid_groups = {}
+# Un único índice ESSID -> APs por tick del que salen tanto possible_evil_twin
+# como las alertas. Agrupar es una pasada barata; lo caro (puntuar y loguear)
+# solo se hace para los grupos duplicados cuya huella (BSSIDs, canal,
+# seguridad, potencia, clientes) cambió. El resto reutiliza su alerta.
+# No hay un índice BSSID -> ESSID persistente: el parser crea dicts nuevos en
+# cada tick, así que saber qué APs cambiaron exige visitar y comparar todos;
+# medido con 20k APs, mantenerlo (mover, expulsar ausentes) cuesta ~94 ms por
+# tick frente a ~23 ms de reagrupar y sacar las huellas de los duplicados.
+# Solo se guardan huellas y alertas por ESSID duplicado, que se olvidan en
+# cuanto el grupo deja de estarlo: no hay nada que sincronizar con
+# ap_state.evict.
+essid_member_fingerprint = itemgetter("bssid", "channel", "privacy", "power", "clients_count_ap")
+essid_groups = {}  # essid -> (huella del grupo, alerta o None)
+
+def group_features(essid, aps_list, suspicious_names):
+    """Variables de un grupo de APs con el mismo ESSID para los indicadores de evil twin."""
+    clients_counts = [len(ap.get("clients", [])) for ap in aps_list]
+    powers = [ap.get("power", -100) for ap in aps_list]
+    essid_lower = essid.lower()
+    return {
+        "aps": len(aps_list),
+        "channels": len({ap.get("channel", "") for ap in aps_list}),
+        "securities": len({ap.get("privacy", "").lower() for ap in aps_list}),
+        "power_range": max(powers) - min(powers) if powers else 0,
+        "clients": sum(clients_counts),
+        "aps_with_clients": sum(1 for count in clients_counts if count > 0),
+        "suspicious_name": any(name in essid_lower for name in suspicious_names),
+    }
+
+def score_essid_groups(groups):
+    """
+    Puntúa en lote los grupos [(essid, aps)] con las reglas de evil twin (ver
+    rules.py): cada indicador se evalúa sobre todos los grupos a la vez.
+    Devuelve la alerta (o None) de cada grupo.
+    """
+    rules = rule_engine.rules
+    features = [group_features(essid, aps_list, rules.suspicious_names) for essid, aps_list in groups]
+    columns = {name: rules.column([f[name] for f in features]) for name in GROUP_FEATURES}
+    scores, hits = rules.score_groups(columns, len(groups))
+
+    results = []
+    for i, (essid, aps_list) in enumerate(groups):
+        score = scores[i]
+        unique_channels = list(dict.fromkeys(ap.get("channel", "") for ap in aps_list))
+        level = rules.level(score)
+        if level is None:
+            # Bandas duales normales (baja probabilidad) - solo log, no alerta
+            logger.info(f"📡 Bandas duales normales: '{essid}' en {len(aps_list)} BSSIDs (canales: {unique_channels})")
+            results.append(None)
+            continue
+        feats = features[i]
+        indicators = [ind.label.format(**feats) for ind, hit in zip(rules.indicators, hits) if hit[i]]
+        message = level.message.format(essid=essid, indicators=", ".join(indicators), score=score, **feats)
+        results.append({
+            "type": level.alert,
+            "message": message,
+            "essid": essid,
+            "bssids": [ap["bssid"] for ap in aps_list],
+            "channels": unique_channels,
+            "power_range": feats["power_range"],
+            "severity": level.severity,
+            "confidence": level.confidence,
+            "indicators": indicators
+        })
+        logger.warning(f"{message} - Score: {score:g}")
+    return results
+
+def build_essid_index(aps):
+    """Agrupa los APs del tick por ESSID visible y marca possible_evil_twin."""
+    index = {}
     for ap in aps:
         essid = (ap.get("essid") or "").strip()
         if essid and essid.lower() != "oculto":
-            if essid not in essid_groups:
-                essid_groups[essid] = []
-            essid_groups[essid].append(ap)
-    
-    # Analizar cada grupo de ESSID duplicado
-    for essid, aps_list in essid_groups.items():
+            group = index.get(essid)
+            if group is None:
+                index[essid] = [ap]
+            else:
+                group.append(ap)
+    for aps_list in index.values():
+        if len(aps_list) > 1:
+            for ap in aps_list:
+                ap["possible_evil_twin"] = True
+    return index
+
+def karma_alert(ap, essid, probers):
+    """BSSID nuevo que anuncia un ESSID buscado por `probers` estaciones (señuelo tipo karma)."""
+    indicators = ["BSSID nuevo", f"{probers} estaciones buscan '{essid}'"]
+    open_network = "opn" in (ap.get("privacy") or "").lower()
+    if open_network:
+        indicators.append("Red abierta")
+    return {
+        "type": "karma",
+        "message": f"🎣 POSIBLE KARMA: {ap['bssid']} anuncia '{essid}' ({probers} estaciones lo buscan)",
+        "essid": essid,
+        "bssid": ap["bssid"],
+        "channels": [ap.get("channel", "")],
+        "probers": probers,
+        "severity": "high" if open_network or probers >= 2 * KARMA_MIN_PROBERS else "medium",
+        "confidence": "medium",
+        "indicators": indicators
+    }
+
+karma_bssids = set()  # BSSIDs con alerta de karma en el tick anterior (para loguear solo las nuevas)
+
+def detect_karma(essid_index, now):
+    """Señuelos de karma: por AP, una consulta O(1) al índice de probes."""
+    global karma_bssids
+    alerts = []
+    current = set()
+    for essid, aps_list in essid_index.items():
+        if not probe_index.probers(essid):
+            continue
+        for ap in aps_list:
+            probers = probe_index.lure(essid, ap["bssid"], now)
+            if probers >= KARMA_MIN_PROBERS:
+                alert = karma_alert(ap, essid, probers)
+                alerts.append(alert)
+                current.add(ap["bssid"])
+                if ap["bssid"] not in karma_bssids:
+                    logger.warning(f"🎣 POSIBLE KARMA: {ap['bssid']} anuncia '{essid}' - {probers} estaciones lo buscan")
+    karma_bssids = current
+    return alerts
+
+def detect_evil_twin(aps, now=None):
+    """Detección mejorada de Evil Twin que evita falsos positivos por bandas duales"""
+    essid_index = build_essid_index(aps)
+
+    alerts = []
+    duplicated = 0
+    previous = essid_groups
+    pending = []  # (posición en alerts, essid, aps, huella) de los grupos que cambiaron
+    for essid, aps_list in essid_index.items():
         if len(aps_list) <= 1:
             continue
-            
-        # CRITERIOS PARA EVITAR FALSOS POSITIVOS:
-        
-        # 1. Mismo canal = muy sospechoso (raro en bandas duales)
-        channels = [ap.get("channel", "") for ap in aps_list]
-        unique_channels = set(channels)
-        
-        # 2. Diferencia de potencia muy grande (inusual para mismo AP)
-        powers = [ap.get("power", -100) for ap in aps_list]
-        power_range = max(powers) - min(powers) if powers else 0
-        
-        # 3. Presencia de clientes conectados (más sospechoso si hay clientes en ambos)
-        clients_counts = [len(ap.get("clients", [])) for ap in aps_list]
-        total_clients = sum(clients_counts)
-        
-        # 4. Seguridad diferente (muy sospechoso)
-        securities = [ap.get("privacy", "").lower() for ap in aps_list]
-        unique_securities = set(securities)
-        
-        # INDICADORES DE EVIL TWIN (múltiples criterios)
-        evil_twin_score = 0
-        evil_twin_indicators = []
-        
-        # A. Mismo canal (+3 puntos)
-        if len(unique_channels) < len(aps_list):
-            evil_twin_score += 3
-            evil_twin_indicators.append("Mismo canal")
-        
-        # B. Diferencia de seguridad (+2 puntos)
-        if len(unique_securities) > 1:
-            evil_twin_score += 2
-            evil_twin_indicators.append("Seguridad diferente")
-        
-        # C. Diferencia de potencia extrema (+2 puntos)
-        if power_range > 30:  # Más de 30 dBm de diferencia
-            evil_twin_score += 2
-            evil_twin_indicators.append(f"Potencia muy diferente ({power_range} dBm)")
-        
-        # D. Múltiples clientes conectados (+1 punto por cada AP con clientes)
-        aps_with_clients = sum(1 for count in clients_counts if count > 0)
-        if aps_with_clients > 1:
-            evil_twin_score += aps_with_clients
-            evil_twin_indicators.append(f"Múltiples APs con clientes ({aps_with_clients})")
-        
-        # E. Nombre genérico/sospechoso (+1 punto)
-        suspicious_names = ["free wifi", "wifi gratis", "public wifi", "hotspot", "staff", "guest"]
-        if any(name in essid.lower() for name in suspicious_names):
-            evil_twin_score += 1
-            evil_twin_indicators.append("Nombre sospechoso")
-        
-        # DECISIÓN BASADA EN PUNTUACIÓN
-        bssids = [ap["bssid"] for ap in aps_list]
-        
-        # Evil Twin confirmado (alta probabilidad)
-        if evil_twin_score >= 5:
-            alert = {
-                "type": "evil_twin_high",
-                "message": f"🚨 EVIL TWIN CONFIRMADO: '{essid}' - {', '.join(evil_twin_indicators)}",
-                "essid": essid,
-                "bssids": bssids,
-                "channels": list(unique_channels),
-                "power_range": power_range,
-                "severity": "critical",
-                "confidence": "high",
-                "indicators": evil_twin_indicators
-            }
-            alerts.append(alert)
-            logger.warning(f"🚨 EVIL TWIN CONFIRMADO: {essid} - Score: {evil_twin_score}")
-        
-        # Evil Twin sospechoso (media probabilidad)
-        elif evil_twin_score >= 3:
-            alert = {
-                "type": "evil_twin_suspicious", 
-                "message": f"⚠️ POSIBLE EVIL TWIN: '{essid}' - {', '.join(evil_twin_indicators)}",
-                "essid": essid,
-                "bssids": bssids,
-                "channels": list(unique_channels),
-                "power_range": power_range,
-                "severity": "medium",
-                "confidence": "medium",
-                "indicators": evil_twin_indicators
-            }
-            alerts.append(alert)
-            logger.warning(f"⚠️ POSIBLE EVIL TWIN: {essid} - Score: {evil_twin_score}")
-        
-        # Bandas duales normales (baja probabilidad) - solo log, no alerta
+        duplicated += 1
+        fingerprint = tuple(map(essid_member_fingerprint, aps_list))
+        cached = previous.get(essid)
+        if cached is not None and cached[0] == fingerprint:
+            alerts.append(cached[1])
         else:
-            logger.info(f"📡 Bandas duales normales: '{essid}' en {len(aps_list)} BSSIDs (canales: {list(unique_channels)})")
-    
+            pending.append((len(alerts), essid, aps_list, fingerprint))
+            alerts.append(None)
+    if pending:
+        scored = score_essid_groups([(essid, aps_list) for _, essid, aps_list, _ in pending])
+        for (pos, essid, _, fingerprint), alert in zip(pending, scored):
+            previous[essid] = (fingerprint, alert)
+            alerts[pos] = alert
+    alerts = [alert for alert in alerts if alert]
+
+    # Olvidar grupos que ya no están duplicados
+    if len(previous) > duplicated:
+        for essid in [e for e in previous if len(essid_index.get(e, ())) <= 1]:
+            del previous[essid]
+
+    # Karma: también con un único AP por ESSID (el señuelo suele estar solo)
+    alerts.extend(detect_karma(essid_index, clock() if now is None else now))
     return alerts
 
 # ---------------- Sistema Inteligente de Alertas (ACTUALIZADO) ----------------
-def analyze_traffic_anomalies(ap, bssid):
-    """Analiza el tráfico del AP y genera alertas inteligentes"""
-    current_data = ap.get("data", 0)
-    previous_data = last_ap_data.get(bssid, 0)
-    delta = current_data - previous_data
-    last_ap_data[bssid] = current_data
-    ap["delta_data"] = max(0, delta)
-    
-    # Inicializar baseline si no existe
-    if bssid not in ap_baselines:
-        ap_baselines[bssid] = deque(maxlen=8)
-    
-    # Inicializar historial de alertas
-    if bssid not in ap_alert_history:
-        ap_alert_history[bssid] = {"last_alert": 0, "alert_count": 0}
-    
+def traffic_alert(ap, rule, baseline_avg, z=0.0):
+    """Construye (y loguea) la alerta de tráfico de un AP a partir de la regla que se cumplió."""
+    message = rule.message.format(essid=ap['essid'], bssid=ap['bssid'], delta=ap['delta_data'],
+                                  baseline=baseline_avg, z=z, power=ap.get("power", -100),
+                                  clients=ap.get("clients_count_ap", 0))
+    log = logger.warning if rule.severity in ("critical", "high") else logger.info
+    log(f"{message} [{ap['bssid']}, regla {rule.name}]")
+    alert = {
+        "type": rule.alert,
+        "message": message,
+        "bssid": ap['bssid'],
+        "essid": ap['essid'],
+        "data": ap['delta_data'],
+        "severity": rule.severity
+    }
+    if "baseline" in ap:
+        alert["baseline"] = ap["baseline"]
+    return alert
+
+def measure_traffic(aps, now):
+    """Ruta escalar (sin NumPy): actualiza el estado de cada AP y devuelve (estados, columnas)."""
+    states = []
+    deltas, baselines, has_base, samples = [], [], [], []
+    for ap in aps:
+        state = ap_state.touch(ap['bssid'].lower(), now)
+        current_data = ap.get("data", 0)
+        # Primera lectura del AP: solo fija el contador (no es un delta desde 0)
+        delta = current_data - state.last_data if state.last_data >= 0 else 0
+        state.last_data = current_data
+        delta = ap["delta_data"] = max(0, delta)
+
+        # Solo calcular baseline si tenemos suficiente historial
+        baseline_avg = 0.0
+        if state.n_samples >= 3:
+            baseline_avg = state.baseline()
+            ap["baseline"] = round(baseline_avg, 1)
+        states.append(state)
+        deltas.append(delta)
+        baselines.append(baseline_avg)
+        has_base.append(state.n_samples >= 3)
+        samples.append(state.n_samples)
+
+        # Agregar delta actual al baseline (excepto si es cero)
+        if delta > 0:
+            state.add_sample(delta)
+    return states, {"delta": deltas, "baseline": baselines, "has_baseline": has_base, "samples": samples,
+                    "z": [0.0] * len(aps)}
+
+def analyze_traffic(aps, now):
+    """Puntúa el tráfico de todos los APs del tick con las reglas activas. Rellena delta_data/baseline/alerts."""
+    rules = rule_engine.rules
+    if BatchScorer is None:
+        states, columns = measure_traffic(aps, now)
+    else:
+        idx, columns = ap_state.measure([ap['bssid'].lower() for ap in aps], [ap.get("data", 0) for ap in aps], now)
+        for ap, d, b, hb in zip(aps, columns["delta"].tolist(), columns["baseline"].tolist(),
+                                columns["has_baseline"].tolist()):
+            ap["delta_data"] = d
+            if hb:
+                ap["baseline"] = round(b, 1)
+    if "power" in rules.needs:
+        columns["power"] = rules.column([ap.get("power", -100) for ap in aps])
+    if "clients" in rules.needs:
+        columns["clients"] = rules.column([ap.get("clients_count_ap", 0) for ap in aps])
+
+    codes = rules.classify(columns, len(aps))
+    if BatchScorer is None:
+        # Prevenir spam de alertas: como mucho una por AP cada `cooldown` s de su regla
+        for i, code in enumerate(codes):
+            if code:
+                state = states[i]
+                if now - state.last_alert < rules.cooldowns[code]:
+                    codes[i] = 0
+                else:
+                    state.last_alert = now
+                    state.alert_count += 1
+        fired = [i for i, code in enumerate(codes) if code]
+    else:
+        codes = ap_state.fire(idx, codes, rules.cooldowns, now)
+        fired = codes.nonzero()[0].tolist()
+
+    for ap in aps:
+        ap["alerts"] = []
     alerts = []
-    baseline_avg = 0
-    
-    # Solo calcular baseline si tenemos suficiente historial
-    if len(ap_baselines[bssid]) >= 3:
-        baseline_avg = sum(ap_baselines[bssid]) / len(ap_baselines[bssid])
-        ap["baseline"] = round(baseline_avg, 1)
-    
-    # Agregar delta actual al baseline (excepto si es cero)
-    if ap["delta_data"] > 0:
-        ap_baselines[bssid].append(ap["delta_data"])
-    
-    # LÓGICA DE DETECCIÓN DE TRÁFICO
-    # 1. DETECCIÓN CRÍTICA
-    if ap["delta_data"] > 8000:
-        alert = {
-            "type": "critical_traffic",
-            "message": f"🚨 CRÍTICO: {ap['essid']} - Tráfico EXTREMO: {ap['delta_data']} pkt/30s",
-            "bssid": ap['bssid'],
-            "essid": ap['essid'],
-            "data": ap['delta_data'],
-            "severity": "critical"
-        }
-        alerts.append(alert)
-        logger.warning(f"🚨 ALERTA CRÍTICA: {ap['bssid']} - {ap['delta_data']} paquetes")
-    
-    # 2. DETECCIÓN DE SPIKE
-    elif (baseline_avg > 20 and 
-          ap["delta_data"] > baseline_avg * 15 and 
-          ap["delta_data"] > 500):
-        alert = {
-            "type": "traffic_spike", 
-            "message": f"⚠️ SPIKE: {ap['essid']} - {ap['delta_data']} pkt (15x sobre normal: {baseline_avg:.0f})",
-            "bssid": ap['bssid'],
-            "essid": ap['essid'], 
-            "data": ap['delta_data'],
-            "baseline": round(baseline_avg, 1),
-            "severity": "high"
-        }
-        alerts.append(alert)
-        logger.warning(f"⚠️ ALERTA SPIKE: {ap['bssid']} - {ap['delta_data']} paquetes (baseline: {baseline_avg:.0f})")
-    
-    # 3. DETECCIÓN DE TRÁFICO ALTO
-    elif ap["delta_data"] > 2000:
-        alert = {
-            "type": "high_traffic",
-            "message": f"🔶 ALTO: {ap['essid']} - Tráfico elevado: {ap['delta_data']} pkt/30s",
-            "bssid": ap['bssid'],
-            "essid": ap['essid'],
-            "data": ap['delta_data'],
-            "severity": "medium"
-        }
-        alerts.append(alert)
-        logger.info(f"🔶 ALERTA ALTA: {ap['bssid']} - {ap['delta_data']} paquetes")
-    
-    # 4. DETECCIÓN SOSPECHOSA
-    elif (baseline_avg > 50 and 
-          ap["delta_data"] > baseline_avg * 5 and 
-          ap["delta_data"] > 300):
-        alert = {
-            "type": "suspicious_traffic",
-            "message": f"🔸 SOSPECHOSO: {ap['essid']} - {ap['delta_data']} pkt (5x sobre normal)",
-            "bssid": ap['bssid'],
-            "essid": ap['essid'],
-            "data": ap['delta_data'],
-            "baseline": round(baseline_avg, 1),
-            "severity": "low"
-        }
+    baselines, zs = columns["baseline"], columns["z"]
+    for i in fired:
+        ap = aps[i]
+        alert = traffic_alert(ap, rules.traffic[int(codes[i]) - 1], float(baselines[i]), float(zs[i]))
+        ap["alerts"] = [alert]
         alerts.append(alert)
-        logger.info(f"🔸 ALERTA SOSPECHOSA: {ap['bssid']} - {ap['delta_data']} paquetes")
-    
-    # Prevenir spam de alertas - máximo 1 alerta por minuto por AP
-    current_time = time.time()
-    if alerts and current_time - ap_alert_history[bssid]["last_alert"] < 60:
-        # Solo mantener alertas críticas si hay spam
-        alerts = [a for a in alerts if a["severity"] == "critical"]
-    
-    if alerts:
-        ap_alert_history[bssid]["last_alert"] = current_time
-        ap_alert_history[bssid]["alert_count"] += 1
-    
     return alerts
 
+# ---------------- Productor de snapshots ----------------
+NO_CAPTURE = Capture(None, None, ())
+
+def read_csv_capture(csv_path):
+    stations = []
+    t0 = time.perf_counter()
+    aps = parse_airodump_csv(csv_path, stations=stations)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, "parse")
+    try:
+        CSV_BYTES.observe(os.path.getsize(csv_path))
+    except OSError:
+        pass
+    CSV_ROWS.observe(len(aps), "ap")
+    CSV_ROWS.observe(len(stations), "station")
+    return Capture(aps, csv_path, stations)
+
+def read_sensor(sensor):
+    """Parsea el último CSV de un sensor. None si no tiene o está obsoleto."""
+    t0 = time.perf_counter()
+    csv_path = sensor.find_csv(SENSOR_MAX_AGE)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, "find_csv")
+    if csv_path is None:
+        return None
+    aps, _, stations = read_csv_capture(csv_path)
+    sensor.aps, sensor.stations = len(aps), len(stations)
+    return SensorReading(sensor.name, aps, stations, csv_path)
+
+def find_sensor_csv():
+    """CSV del primer sensor que ya tenga datos (espera inicial)."""
+    for sensor in sensors:
+        csv_path = sensor.find_csv(SENSOR_MAX_AGE)
+        if csv_path is not None:
+            return csv_path
+    return None
+
+def read_sensors():
+    """
+    Lee todos los sensores y fusiona sus observaciones por BSSID. Se parsean uno
+    tras otro en el hilo del productor: el parseo es CPU pura (el GIL impide
+    solaparlo en hilos) y un pool de procesos hecho con fork bajo eventlet
+    hereda los hilos verdes del hub y sus workers no terminan.
+    """
+    readings = [r for r in map(read_sensor, sensors) if r is not None]
+    if not readings:
+        return NO_CAPTURE
+    aps_map, stations = merge_readings(readings)
+    return Capture(finalize_aps(aps_map), "sensors:" + ",".join(r.sensor for r in readings), stations)
+
+def read_capture():
+    """Lee la fuente activa (CSV, pcap o varios sensores). Devuelve un Capture (aps=None si no hay)."""
+    if sensors:
+        return read_sensors()
+    if INGEST_MODE == "pcap":
+        engine = get_pcap_engine()
+        if engine is None:
+            return NO_CAPTURE
+        t0 = time.perf_counter()
+        try:
+            engine.poll()
+        except ValueError:
+            logger.exception("[pcap] Fuente no válida")
+            return NO_CAPTURE
+        capture = Capture(finalize_aps(engine.build_aps_map()), engine.path, engine.station_rows())
+        STAGE_SECONDS.observe(time.perf_counter() - t0, "parse")
+        return capture
+
+    t0 = time.perf_counter()
+    csv_path = find_csv()
+    STAGE_SECONDS.observe(time.perf_counter() - t0, "find_csv")
+    if not csv_path:
+        return NO_CAPTURE
+    if RECORD_DIR:
+        record_capture(csv_path)
+    return read_csv_capture(csv_path)
+
+def record_capture(csv_path):
+    """Guarda una copia con timestamp para reproducirla luego con REPLAY."""
+    try:
+        Path(RECORD_DIR).mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(csv_path, Path(RECORD_DIR) / f"{time.time():.3f}.csv")
+    except Exception:
+        logger.exception("[record] No se pudo guardar el snapshot")
+
+def build_snapshot(capture=None):
+    """Lee la captura y ejecuta la detección una sola vez, publicando el resultado."""
+    generation = capture_generation()  # antes de leer: un fichero nuevo nunca se lee con la generación vieja
+    aps, source, stations = capture if capture is not None else read_capture()
+    if aps is None:
+        return publish_snapshot("no_csv", [], [])
+
+    t0 = time.perf_counter()
+    now = clock()
+    if rule_engine.maybe_reload():
+        essid_groups.clear()  # las alertas cacheadas se calcularon con las reglas anteriores
+    roams = update_station_index(stations, now)
+    probe_index.update(stations, now)
+    probe_index.advertise(aps, now)
+
+    alerts_total = []
+
+    # ---------- ANÁLISIS INTELIGENTE ----------
+
+    # 1. Detección de Evil Twin y karma (global, no por AP)
+    evil_twin_alerts = detect_evil_twin(aps, now)
+    alerts_total.extend(evil_twin_alerts)
+
+    # 2. Detección de anomalías de tráfico (por AP). El CSV se ingiere en cuanto
+    # cambia, pero los deltas/baselines siguen midiéndose en ventanas de
+    # TRAFFIC_WINDOW segundos; entre ventanas se arrastra el último resultado.
+    global last_traffic_analysis, counter_generation, counter_sources
+    now = clock()
+    if now - last_traffic_analysis >= TRAFFIC_WINDOW:
+        last_traffic_analysis = now
+        if generation != counter_generation:
+            # airodump relanzado: sus contadores empiezan de cero, el delta es el contador entero
+            reset = reset_restarted_counters(generation)
+            if reset and counter_generation is not None:
+                logger.info(f"[state] 🔁 Captura nueva: contadores de {reset} APs desde cero")
+            counter_generation = generation
+        if sensors:
+            moved = reset_moved_counters(aps)
+            if moved:
+                logger.info(f"[sensors] 🔀 {moved} APs cambian de sensor de referencia: contador rebasado")
+        alerts_total.extend(analyze_traffic(aps, now))
+        if sensors:
+            counter_sources = {ap["bssid"].lower(): data_source(ap) for ap in aps}
+        STAGE_SECONDS.observe(time.perf_counter() - t0, "detect")
+        t0 = time.perf_counter()
+        store = get_history()
+        if store is not None:
+            store.record(now, aps)
+        evicted = ap_state.evict(now)
+        if evicted:
+            logger.info(f"[state] 🧹 {evicted} APs expulsados ({len(ap_state)} con estado)")
+        if PERSIST_STATE and now - last_checkpoint >= STATE_CHECKPOINT_INTERVAL:
+            save_state()
+        STAGE_SECONDS.observe(time.perf_counter() - t0, "persist")
+    else:
+        previous = {ap["bssid"].lower(): ap for ap in current_snapshot.aps}
+        for ap in aps:
+            prev = previous.get(ap["bssid"].lower())
+            if prev is None:
+                ap["delta_data"] = 0
+                ap["alerts"] = []
+                continue
+            for key in ("delta_data", "baseline"):
+                if key in prev:
+                    ap[key] = prev[key]
+            ap["alerts"] = prev.get("alerts", [])
+            alerts_total.extend(ap["alerts"])
+        STAGE_SECONDS.observe(time.perf_counter() - t0, "detect")
+
+    # 3. Diario de alertas: incidentes deduplicados con ID estable
+    journal_records = ()
+    store = get_journal()
+    if store is not None:
+        try:
+            journal_records = store.observe(alerts_total, clock())
+        except OSError:
+            logger.exception("[journal] Error escribiendo el diario de alertas")
+
+    return publish_snapshot("success" if len(aps) else "no_data", aps, alerts_total, source, roams,
+                            journal_records)
+
+# ---------------- Protocolo delta (wifi_delta) ----------------
+# Por BSSID se guarda el dict del AP tal como se emitió (los snapshots no se
+# mutan tras publicarse) y se compara con == en C: solo los APs distintos pasan
+# a la comparación campo a campo. Cada tick se emite un único wifi_delta con
+# ap_added / ap_updated (solo campos cambiados) / ap_removed. 'prev_seq' permite
+# al cliente detectar huecos y pedir resync.
+delta_state = {}  # bssid -> dict del AP emitido
+delta_changes = {}  # bssid -> (AP anterior, cambios o None) del último tick del stream completo
+delta_last_seq = 0
+
+def ap_changes(prev, ap):
+    """Campos de `ap` que difieren de `prev` (los que desaparecen van a None), o None si son iguales."""
+    if prev is ap or prev == ap:
+        return None
+    changes = {k: v for k, v in ap.items() if k not in prev or prev[k] != v}
+    for k in prev:
+        if k not in ap:
+            changes[k] = None
+    changes["bssid"] = ap["bssid"]
+    return changes
+
+def diff_snapshot(snap, state, prev_seq, cache=None, record=None):
+    """
+    wifi_delta de `snap` contra `state` (bssid -> AP emitido). Devuelve (delta,
+    nuevo estado). `cache` son los cambios ya calculados en este tick por el
+    stream completo: si el AP anterior es el mismo objeto se reutilizan sin
+    comparar (las suscripciones solo recalculan lo que su filtro cambia).
+    `record`, si se pasa, recibe esos cambios para las suscripciones.
+    """
+    added, updated = [], []
+    new_state = {}
+
+    for ap in snap.aps:
+        bssid = ap["bssid"].lower()
+        new_state[bssid] = ap
+        prev = state.get(bssid)
+        if prev is None:
+            added.append(ap)
+            continue
+        hit = cache.get(bssid) if cache is not None else None
+        changes = hit[1] if hit is not None and hit[0] is prev else ap_changes(prev, ap)
+        if record is not None:
+            record[bssid] = (prev, changes)
+        if changes is not None:
+            updated.append(changes)
+
+    removed = [bssid for bssid in state if bssid not in new_state]
+
+    delta = {
+        "seq": snap.seq,
+        "prev_seq": prev_seq,
+        "timestamp": snap.timestamp,
+        "status": snap.status,
+        "total_networks": len(snap.aps),
+        "total_clients": snap.total_clients,
+        "ws_clients_connected": clients_count,
+        "ap_added": added,
+        "ap_updated": updated,
+        "ap_removed": removed,
+        "alerts": snap.alerts,
+    }
+    return delta, new_state
+
+def compute_delta(snap):
+    """Calcula el delta del snapshot contra el último emitido y avanza el estado."""
+    global delta_state, delta_changes, delta_last_seq
+    changes = {}
+    delta, delta_state = diff_snapshot(snap, delta_state, delta_last_seq, record=changes)
+    delta_changes = changes
+    delta_last_seq = snap.seq
+    return delta
+
+# Filtros por cliente (rooms de Socket.IO). Solo se toca desde el hilo del productor.
+subscriptions = SubscriptionManager(diff_snapshot)
+
 # ---------------- Scanner loop (ACTUALIZADO) ----------------
-def scanner_loop():
-    global clients_count
+def make_watcher():
+    if sensors:
+        targets = [(s.directory, s.pattern) for s in sensors]
+        return CaptureWatcher(
+            *targets[0],
+            debounce=WATCH_DEBOUNCE,
+            min_interval=SCAN_MIN_INTERVAL,
+            poll_interval=POLL_INTERVAL,
+            mode=WATCH_MODE,
+            extra=targets[1:],
+        )
+    if INGEST_MODE == "pcap" and PCAP_SOURCE:
+        directory, pattern = Path(PCAP_SOURCE).parent, Path(PCAP_SOURCE).name
+    else:
+        ext = ".cap" if INGEST_MODE == "pcap" else ".csv"
+        directory, pattern = Path(CSV_PREFIX).parent, Path(CSV_PREFIX).name + "-*" + ext
+    return CaptureWatcher(
+        directory,
+        pattern,
+        debounce=WATCH_DEBOUNCE,
+        min_interval=SCAN_MIN_INTERVAL,
+        poll_interval=POLL_INTERVAL,
+        mode=WATCH_MODE,
+    )
+
+def encoding_room(room, encoding):
+    """Room de un stream (completo o filtro) en una codificación: se codifica una vez por room."""
+    return room if encoding == "json" else f"{room}|{encoding}"
+
+def encode_payload(payload, event, encoding="json"):
+    encoded = wire_encode(payload, encoding)
+    PAYLOAD_BYTES.observe(len(encoded), event, encoding)
+    return encoded
+
+def produce(capture=None, csv_path=None, encodings=()):
+    """
+    Parte de CPU de un tick: lectura, detección, delta y su serialización (en el
+    hilo del productor). Devuelve (snap, delta, [(room, payload codificado)]):
+    JSON siempre y además cada codificación binaria que tenga algún cliente.
+    """
+    if csv_path is not None:
+        capture = read_csv_capture(csv_path)
+    snap = build_snapshot(capture)
+    t0 = time.perf_counter()
+    delta = compute_delta(snap)
+    t1 = time.perf_counter()
+    encodings = ("json",) + tuple(encodings)
+    frames = [(encoding_room(ALL_ROOM, enc), encode_payload(delta, "wifi_delta", enc)) for enc in encodings]
+    t2 = time.perf_counter()
+    STAGE_SECONDS.observe(t1 - t0, "delta")
+    STAGE_SECONDS.observe(t2 - t1, "serialize")
+
+    # Un delta por filtro distinto (no por cliente), reutilizando los cambios del stream completo
+    if subscriptions:
+        for room, sub_delta in subscriptions.tick(snap, delta_changes):
+            frames.extend((encoding_room(room, enc), encode_payload(sub_delta, "wifi_delta_filtered", enc))
+                          for enc in encodings)
+        STAGE_SECONDS.observe(time.perf_counter() - t2, "subscriptions")
+    return snap, delta, frames
+
+def run_tick(capture=None, csv_path=None):
+    """Un tick completo del pipeline: snapshot → delta → emit. Solo el emit corre en el hub."""
+    encodings = sorted(set(client_encodings.values()))
+    snap, delta, frames = offload(produce, capture, csv_path, encodings)
+    # Siempre se emite (aunque vaya vacío) para que la cadena de seq no tenga huecos
+    t0 = time.perf_counter()
+    for room, encoded in frames:
+        socketio.emit('wifi_delta', encoded, to=room)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, "emit")
+    TICKS.inc(1, snap.status)
+    if snap.roams:
+        socketio.emit('station_roaming', {"seq": snap.seq, "events": snap.roams})
+    if snap.journal:
+        # Solo lo nuevo; quien llegue tarde pide /alerts?since= o request_alerts
+        socketio.emit('alert_journal', {"records": snap.journal, "last_seq": snap.journal[-1]["seq"]})
+    return snap, delta
+
+def log_tick(message_count, snap, delta):
+    changes = f"(+{len(delta['ap_added'])} ~{len(delta['ap_updated'])} -{len(delta['ap_removed'])})"
+    if snap.status == "no_csv":
+        if message_count % 12 == 1:
+            logger.info("[scanner] No CSV encontrado, delta vacio")
+    elif snap.alerts:
+        alerts_total = snap.alerts
+        evil_twin_count = sum(1 for a in alerts_total if "evil_twin" in a["type"])
+        critical_count = sum(1 for a in alerts_total if a.get("severity") == "critical")
+        logger.info(f"[scanner] Delta #{message_count} | Seq={snap.seq} | APs={len(snap.aps)} {changes} | "
+                    f"Alerts={len(alerts_total)} (EvilTwin:{evil_twin_count}, Critical:{critical_count})")
+    else:
+        logger.info(f"[scanner] Delta #{message_count} | Seq={snap.seq} | APs={len(snap.aps)} {changes} | "
+                    f"Clients={snap.total_clients} | Sin alertas")
+
+def scanner_loop(watcher=None):
     message_count = 0
-    last_snapshot = None
-    logger.info("[scanner] loop iniciado (intervalo 30s)")
+    watcher = watcher or make_watcher()
+    logger.info(f"[scanner] loop iniciado ({watcher.mode}, intervalo mínimo {SCAN_MIN_INTERVAL}s)")
+    first = True
 
     while scanner_running:
         try:
-            csv_path = find_csv()
-            alerts_total = []
-            
-            if csv_path:
-                aps = parse_airodump_csv(csv_path)
-                total_clients = sum(len(ap["clients"]) for ap in aps)
-
-                # ---------- ANÁLISIS INTELIGENTE ----------
-                
-                # 1. Detección de Evil Twin (global, no por AP)
-                evil_twin_alerts = detect_evil_twin(aps)
-                alerts_total.extend(evil_twin_alerts)
-                
-                # 2. Detección de anomalías de tráfico (por AP)
-                for ap in aps:
-                    bssid = ap['bssid'].lower()
-                    ap_alerts = analyze_traffic_anomalies(ap, bssid)
-                    alerts_total.extend(ap_alerts)
-                    ap["alerts"] = ap_alerts
-
-                snapshot = json.dumps(aps, sort_keys=True)
-                if snapshot != last_snapshot or message_count % 6 == 0:
-                    payload = {
-                        "aps": aps,
-                        "timestamp": time.time(),
-                        "total_networks": len(aps),
-                        "total_clients": total_clients,
-                        "ws_clients_connected": clients_count,
-                        "message_id": message_count,
-                        "status": "success" if len(aps) else "no_data",
-                        "alerts": alerts_total,
-                    }
-                    socketio.emit('wifi_data', payload)
-                    message_count += 1
-                    last_snapshot = snapshot
-                    
-                    # Log resumen mejorado
-                    if alerts_total:
-                        evil_twin_count = sum(1 for a in alerts_total if "evil_twin" in a["type"])
-                        critical_count = sum(1 for a in alerts_total if a.get("severity") == "critical")
-                        logger.info(f"[scanner] Emit #{message_count} | APs={len(aps)} | Alerts={len(alerts_total)} (EvilTwin:{evil_twin_count}, Critical:{critical_count})")
-                    else:
-                        logger.info(f"[scanner] Emit #{message_count} | APs={len(aps)} | Clients={total_clients} | Sin alertas")
-            else:
-                # No CSV encontrado
-                if message_count % 12 == 0:
-                    payload = {
-                        "aps": [],
-                        "timestamp": time.time(),
-                        "total_networks": 0,
-                        "total_clients": 0,
-                        "ws_clients_connected": clients_count,
-                        "message_id": message_count,
-                        "status": "no_csv",
-                        "alerts": []
-                    }
-                    socketio.emit('wifi_data', payload)
-                    logger.info("[scanner] No CSV encontrado, emit vacio")
-                message_count += 1
-
-            eventlet.sleep(30)
+            # Sin escrituras en la captura no se hace ningún trabajo
+            if not first:
+                if pcap_engine is not None and pcap_engine.is_fifo:
+                    # Una FIFO no genera eventos de inotify: se consulta con select
+                    eventlet.sleep(SCAN_MIN_INTERVAL)
+                    if not pcap_engine.read_available():
+                        continue
+                elif not watcher.wait():
+                    continue
+            first = False
+            snap, delta = run_tick()
+            message_count += 1
+            log_tick(message_count, snap, delta)
+            if channel_scheduler is not None:
+                schedule_channels(snap)
 
         except Exception:
             logger.exception("[scanner] Error inesperado en loop")
             eventlet.sleep(10)
 
+# ---------------- Replay offline ----------------
+def replay_loop(source, speed):
+    """Pasa una sesión grabada por el pipeline completo con reloj virtual."""
+    global virtual_time
+    message_count = 0
+
+    def step(ts, path):
+        nonlocal message_count
+        global virtual_time
+        virtual_time = ts
+        snap, delta = run_tick(csv_path=path)
+        message_count += 1
+        log_tick(message_count, snap, delta)
+
+    logger.info(f"[replay] ▶️ {len(source)} snapshots, {source.duration():.0f}s de sesión, "
+                f"velocidad {'max' if not speed else f'{speed}x'}")
+    try:
+        stats = run_replay(source, speed, step, should_continue=lambda: scanner_running)
+        logger.info(f"[replay] ⏹️ Fin: {json.dumps(stats)}")
+    except Exception:
+        logger.exception("[replay] Error durante el replay")
+    finally:
+        virtual_time = None
+        source.close()
+    if REPLAY_EXIT:
+        socketio.stop()
+
 # ---------------- SocketIO events ----------------
-@socketio.on('connect')
-def handle_connect():
+# codificación -> (seq, wifi_data completo ya serializado). Con cientos de clientes
+# conectando a la vez (un web worker que reinicia) se serializa una vez por tick,
+# no una por cliente; ws_clients_connected se queda en el del primero y el
+# siguiente wifi_delta lo actualiza. Solo lo toca el hilo del productor.
+snapshot_cache = {}
+
+def client_snapshot(sid, encoding):
+    """wifi_data de un cliente: el mundo completo o lo que ve su filtro (hilo del productor)."""
+    snap = get_snapshot()
+    sub = subscriptions.get(sid)
+    if sub is not None:
+        return encode_payload(snapshot_payload(sub.filter.narrow(snap), filter=sub.filter.spec),
+                              "wifi_data", encoding)
+    cached = snapshot_cache.get(encoding)
+    if cached is None or cached[0] != snap.seq:
+        cached = snapshot_cache[encoding] = (snap.seq, encode_payload(snapshot_payload(snap), "wifi_data", encoding))
+    return cached[1]
+
+def encode_snapshot(sid):
+    """wifi_data serializado fuera del hub (con miles de APs pesa cientos de KB)."""
+    return offload(client_snapshot, sid, client_encodings.get(sid, "json"))
+
+def subscribe_client(sid, spec, encoding):
+    sub, previous, base = subscriptions.subscribe(sid, spec, get_snapshot(), delta_changes)
+    return sub, previous, encode_payload(snapshot_payload(base, filter=sub.filter.spec), "wifi_data", encoding)
+
+def encoding_counts():
+    counts = {"json": max(0, clients_count - len(client_encodings))}
+    for encoding in list(client_encodings.values()):
+        counts[encoding] = counts.get(encoding, 0) + 1
+    return counts
+
+def stream_room(sid):
+    """Room (sin codificación) de la que recibe wifi_delta un cliente."""
+    sub = offload(subscriptions.get, sid)
+    return sub.filter.room if sub is not None else ALL_ROOM
+
+
+def join(sid, room):
+    socketio.server.enter_room(sid, room, namespace="/")
+
+def leave(sid, room):
+    socketio.server.leave_room(sid, room, namespace="/")
+
+def send(sid, event, data):
+    socketio.emit(event, data, to=sid)
+
+# Lógica de los eventos de cliente por sid. Con ROLE=web el worker solo reenvía
+# el evento por la cola (fanout.py) y lo ejecuta el escáner: contadores,
+# codificaciones y filtros están en un único sitio, y join/leave/send sobre un
+# sid de otro proceso los enruta python-socketio por la misma cola.
+CLIENT_EVENTS = {}
+
+def client_event(name):
+    def register(func):
+        CLIENT_EVENTS[name] = func
+
+        def handler(data=None):
+            if name == "connect":
+                # Codificación negociada en la conexión (?encoding=msgpack); JSON por defecto
+                data = {"encoding": request.args.get("encoding", "json")}
+            if ROLE == "web":
+                control_channel.send({"event": name, "sid": request.sid, "data": data})
+            else:
+                func(request.sid, data)
+
+        socketio.on_event(name, handler)
+        return func
+    return register
+
+def dispatch_client_event(message):
+    """Evento reenviado por un web worker (en el hilo de escucha de la cola, en orden)."""
+    func = CLIENT_EVENTS.get(message.get("event"))
+    if func is not None and message.get("sid"):
+        func(message["sid"], message.get("data"))
+
+
+@client_event('connect')
+def handle_connect(sid, data):
     global clients_count
     clients_count += 1
     logger.info(f"[ws] ✅ Cliente conectado. Total: {clients_count}")
-    emit('status', {'message': 'Conectado al escáner WiFi', 'clients': clients_count})
-
-    csv_path = find_csv()
-    if csv_path:
-        aps = parse_airodump_csv(csv_path)
-        alerts_total = []
-        
-        #  USAR DETECCIÓN INTELIGENTE EN LUGAR DE DETECCIÓN BÁSICA
-        evil_twin_alerts = detect_evil_twin(aps)
-        alerts_total.extend(evil_twin_alerts)
-        
-        # DETECCIÓN DE TRÁFICO TAMBIÉN
-        for ap in aps:
-            bssid = ap['bssid'].lower()
-            ap_alerts = analyze_traffic_anomalies(ap, bssid)
-            alerts_total.extend(ap_alerts)
-
-        payload = {
-            "aps": aps,
-            "timestamp": time.time(),
-            "total_networks": len(aps),
-            "total_clients": sum(len(ap["clients"]) for ap in aps),
-            "ws_clients_connected": clients_count,
-            "status": "success" if len(aps) else "no_data",
-            "alerts": alerts_total,
-        }
-        emit('wifi_data', payload)
-
-@socketio.on('disconnect')
-def handle_disconnect():
+    send(sid, 'status', {'message': 'Conectado al escáner WiFi', 'clients': clients_count})
+
+    encoding = (data or {}).get("encoding", "json")
+    if encoding not in WIRE_ENCODINGS:
+        send(sid, 'encoding', {"ok": False, "error": f"codificación no disponible: {encoding}",
+                               "available": list(WIRE_ENCODINGS)})
+        encoding = "json"
+    if encoding != "json":
+        client_encodings[sid] = encoding
+    join(sid, encoding_room(ALL_ROOM, encoding))
+
+    # Servir el último snapshot publicado: sin re-parsear ni tocar baselines.
+    # Es la base (seq) sobre la que el cliente aplicará los wifi_delta.
+    send(sid, 'wifi_data', encode_snapshot(sid))
+
+@client_event('disconnect')
+def handle_disconnect(sid, data=None):
     global clients_count
     clients_count = max(0, clients_count - 1)
+    offload(subscriptions.unsubscribe, sid)
+    client_encodings.pop(sid, None)
     logger.info(f"[ws] 🔌 Cliente desconectado. Total: {clients_count}")
 
-@socketio.on('request_data')
-def handle_request_data():
-    csv_path = find_csv()
-    if csv_path:
-        aps = parse_airodump_csv(csv_path)
-        alerts_total = []
-        
-        # USAR DETECCIÓN INTELIGENTE COMPLETA
-        evil_twin_alerts = detect_evil_twin(aps)
-        alerts_total.extend(evil_twin_alerts)
-        
-        for ap in aps:
-            bssid = ap['bssid'].lower()
-            ap_alerts = analyze_traffic_anomalies(ap, bssid)
-            alerts_total.extend(ap_alerts)
-
-        payload = {
-            "aps": aps,
-            "timestamp": time.time(),
-            "total_networks": len(aps),
-            "total_clients": sum(len(ap["clients"]) for ap in aps),
-            "ws_clients_connected": clients_count,
-            "status": "success" if len(aps) else "no_data",
-            "alerts": alerts_total,
-        }
-        emit('wifi_data', payload)
+@client_event('request_data')
+def handle_request_data(sid, data=None):
+    send(sid, 'wifi_data', encode_snapshot(sid))
+
+@client_event('request_resync')
+def handle_request_resync(sid, data=None):
+    """El cliente detectó un hueco en wifi_delta: se le envía el snapshot completo."""
+    snap = get_snapshot()
+    logger.info(f"[ws] 🔄 Resync solicitado (cliente seq={(data or {}).get('seq')}, actual={snap.seq})")
+    send(sid, 'wifi_data', encode_snapshot(sid))
+
+@client_event('subscribe')
+def handle_subscribe(sid, data=None):
+    """Filtro de servidor: channels, bssids, essid (glob), min_power, min_severity, alerts_only."""
+    encoding = client_encodings.get(sid, "json")
+    try:
+        sub, previous, base = offload(subscribe_client, sid, data or {}, encoding)
+    except ValueError as e:
+        send(sid, 'subscription', {"ok": False, "error": str(e)})
+        return
+    leave(sid, encoding_room(previous, encoding))
+    join(sid, encoding_room(sub.filter.room, encoding))
+    logger.info(f"[ws] 🎛️ Suscripción {sub.filter.room} ({len(sub.members)} clientes, "
+                f"{len(subscriptions)} filtros): {sub.filter.key}")
+    send(sid, 'subscription', {"ok": True, "filter": sub.filter.spec, "members": len(sub.members)})
+    # Base de la nueva cadena de wifi_delta filtrados
+    send(sid, 'wifi_data', base)
+
+@client_event('unsubscribe')
+def handle_unsubscribe(sid, data=None):
+    """Vuelta al stream completo."""
+    encoding = client_encodings.get(sid, "json")
+    previous = offload(subscriptions.unsubscribe, sid)
+    leave(sid, encoding_room(previous, encoding))
+    join(sid, encoding_room(ALL_ROOM, encoding))
+    send(sid, 'subscription', {"ok": True, "filter": None})
+    send(sid, 'wifi_data', encode_snapshot(sid))
+
+@client_event('set_encoding')
+def handle_set_encoding(sid, data=None):
+    """Cambia la codificación de wifi_data/wifi_delta: json, msgpack o msgpack-zlib."""
+    encoding = (data or {}).get("encoding", "json")
+    if encoding not in WIRE_ENCODINGS:
+        send(sid, 'encoding', {"ok": False, "error": f"codificación no disponible: {encoding}",
+                               "available": list(WIRE_ENCODINGS)})
+        return
+    room = stream_room(sid)
+    leave(sid, encoding_room(room, client_encodings.get(sid, "json")))
+    if encoding == "json":
+        client_encodings.pop(sid, None)
     else:
-        emit('wifi_data', {
-            "aps": [],
-            "timestamp": time.time(),
-            "total_networks": 0,
-            "total_clients": 0,
-            "status": "no_csv",
-            "alerts": []
-        })
+        client_encodings[sid] = encoding
+    join(sid, encoding_room(room, encoding))
+    send(sid, 'encoding', {"ok": True, "encoding": encoding})
+    # Nueva base ya en la codificación pedida
+    send(sid, 'wifi_data', encode_snapshot(sid))
+
+@client_event('request_alerts')
+def handle_request_alerts(sid, data=None):
+    """Registros del diario de alertas desde un seq: {since, limit}."""
+    store = get_journal()
+    if store is None:
+        send(sid, 'alert_journal', {"error": "Alert journal disabled"})
+        return
+    try:
+        since, limit = journal_cursor(data or {})
+    except ValueError as e:
+        send(sid, 'alert_journal', {"error": str(e)})
+        return
+    send(sid, 'alert_journal', offload(store.read, since, limit))
+
+@client_event('ack_alert')
+def handle_ack_alert(sid, data=None):
+    """Reconocer un incidente: {id, by}. El ack se difunde a todos como alert_journal."""
+    result, status = ack_alert((data or {}).get("id"), (data or {}).get("by"))
+    send(sid, 'alert_ack', dict(result, ok=status == 200))
 
 # ---------------- HTTP routes ----------------
+def json_response(payload):
+    """Como jsonify, pero serializando en el hilo del productor (listas grandes)."""
+    return app.response_class(offload(wire_dumps, payload, True) + "\n", mimetype=app.json.mimetype)
+
+WEB_ROUTES = ("index", "health", "prometheus_metrics")  # lo que sirve un worker ROLE=web
+
+@app.before_request
+def web_worker_guard():
+    """Un web worker no tiene snapshot ni estado: las consultas HTTP van al escáner."""
+    if ROLE == "web" and request.endpoint not in WEB_ROUTES:
+        response = jsonify({"error": "web worker sin datos: consulta al proceso escáner", "role": ROLE})
+        response.status_code = 503
+        return response
+
+def local_clients():
+    """Sockets conectados a este proceso (con ROLE=web, clients_count lo lleva el escáner)."""
+    return len(socketio.server.eio.sockets)
+
 @app.route('/')
 def index():
     return jsonify({
         "status": "Black Swan WiFi Recon API",
         "websocket": True,
-        "clients_connected": clients_count,
+        "role": ROLE,
+        "clients_connected": clients_count if ROLE == "scanner" else local_clients(),
         "timestamp": time.time()
     })
 
 @app.route('/health')
 def health():
-    return jsonify({"status": "healthy", "timestamp": time.time()})
+    queue = {"url": MESSAGE_QUEUE, "host_id": queue_manager.host_id} if queue_manager is not None else None
+    if ROLE == "web":
+        return jsonify({
+            "status": "healthy",
+            "role": ROLE,
+            "timestamp": time.time(),
+            "clients": local_clients(),
+            "hub": hub_monitor.stats(),
+            "message_queue": queue,
+        })
+    return jsonify({
+        "status": "healthy",
+        "role": ROLE,
+        "timestamp": time.time(),
+        "message_queue": queue,
+        "local_clients": local_clients(),
+        "ap_state": ap_state.stats(),
+        "stations": len(station_index),
+        "probes": offload(probe_index.stats),  # recorre el índice que muta el productor
+        "sensors": [s.stats() for s in sensors],
+        "hub": dict(hub_monitor.stats(), offload=OFFLOAD),
+        "encodings": {
+            "available": list(WIRE_ENCODINGS),
+            "clients": encoding_counts(),
+        },
+        "subscriptions": subscriptions.stats(),
+        "alert_journal": journal.stats() if journal is not None else None,
+        "rules": rule_engine.stats(),
+        "channels": channel_scheduler.stats() if channel_scheduler is not None else None,
+        "capture": [supervisor.stats() for supervisor in supervisors()]
+    })
+
+def alert_counts():
+    counts = {}
+    for alert in get_snapshot().alerts:
+        key = (alert.get("type", ""), alert.get("severity", ""))
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+metrics.add(Gauge("blackswan_ws_clients", "Clientes Socket.IO conectados", lambda: clients_count))
+metrics.add(Gauge("blackswan_ws_clients_by_encoding", "Clientes Socket.IO por codificación",
+                  lambda: {(enc,): n for enc, n in encoding_counts().items()}, ("encoding",)))
+metrics.add(Gauge("blackswan_alert_incidents_open", "Incidentes abiertos en el diario de alertas",
+                  lambda: len(journal.incidents) if journal is not None else 0))
+metrics.add(Gauge("blackswan_subscription_filters", "Filtros de suscripción distintos activos", lambda: len(subscriptions)))
+metrics.add(Gauge("blackswan_networks", "APs en el último snapshot", lambda: len(get_snapshot().aps)))
+metrics.add(Gauge("blackswan_snapshot_seq", "Seq del último snapshot publicado", lambda: get_snapshot().seq))
+metrics.add(Gauge("blackswan_alerts", "Alertas activas en el último snapshot", alert_counts, ("type", "severity")))
+metrics.add(Gauge("blackswan_tracked_bssids", "BSSIDs con estado de detección", lambda: len(ap_state)))
+metrics.add(Gauge("blackswan_ap_state_bytes", "Memoria estimada del estado por AP", lambda: ap_state.memory_bytes()))
+metrics.add(Gauge("blackswan_stations", "Estaciones en el índice global", lambda: len(station_index)))
+metrics.add(Gauge("blackswan_probe_stations", "Estaciones con probes en el índice de karma", lambda: len(probe_index)))
+metrics.add(Gauge("blackswan_probe_essids", "ESSIDs buscados distintos", lambda: len(probe_index.by_essid)))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/scan')
 def immediate_scan():
-    csv_path = find_csv()
-    if csv_path:
-        aps = parse_airodump_csv(csv_path)
-        alerts_total = []
-        
-        # USAR DETECCIÓN INTELIGENTE COMPLETA
-        evil_twin_alerts = detect_evil_twin(aps)
-        alerts_total.extend(evil_twin_alerts)
-        
-        for ap in aps:
-            bssid = ap['bssid'].lower()
-            ap_alerts = analyze_traffic_anomalies(ap, bssid)
-            alerts_total.extend(ap_alerts)
+    """Último snapshot con filtro/orden/paginación/proyección (ver query.py) y ETag por seq."""
+    snap = get_snapshot()
+    if snap.status == "no_csv":
+        return jsonify({"error": "No CSV file found", "seq": snap.seq})
+    try:
+        query = ScanQuery(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Sondeos sin cambios: 304 sin cuerpo y sin tocar el snapshot
+    etag = query.etag(snap)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = json_response(offload(query.run, snap))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/stations')
+def list_stations():
+    """Índice global de estaciones. Filtros: ?bssid=, ?associated=0|1"""
+    bssid = (request.args.get("bssid") or "").lower()
+    associated = request.args.get("associated")
+    stations = list(station_index.values())
+    if bssid:
+        stations = [st for st in stations if st["bssid"] == bssid]
+    if associated in ("0", "1"):
+        want = associated == "1"
+        stations = [st for st in stations if (st["bssid"] is not None) == want]
+    return json_response({
+        "stations": stations,
+        "total": len(stations),
+        "seq": current_snapshot.seq,
+        "timestamp": time.time()
+    })
 
-        return jsonify({
-            "aps": aps,
-            "timestamp": time.time(),
-            "total_networks": len(aps),
-            "total_clients": sum(len(ap["clients"]) for ap in aps),
-            "alerts": alerts_total
-        })
-    return jsonify({"error": "No CSV file found"})
+@app.route('/stations/<mac>')
+def get_station(mac):
+    st = station_index.get(mac.lower())
+    if st is None:
+        return jsonify({"error": "Station not found", "mac": mac}), 404
+    # list() copia de una vez: el productor puede estar añadiendo eventos
+    return jsonify(dict(st, roaming=[ev for ev in list(roaming_history) if ev["mac"].lower() == mac.lower()],
+                        probed_essids=offload(probe_index.essids_of, mac)))
+
+@app.route('/probes')
+def list_probes():
+    """ESSIDs más buscados (?limit=, 20 por defecto) o estaciones que buscan uno (?essid=)."""
+    # El productor muta los sets del índice: se recorren en su hilo, como /history
+    essid = request.args.get("essid")
+    if essid is not None:
+        stations = offload(probe_index.stations_probing, essid)
+        return jsonify({"essid": essid, "stations": stations, "total": len(stations), "timestamp": time.time()})
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 1000))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({
+        "top": [{"essid": e, "stations": n} for e, n in offload(probe_index.top, limit)],
+        "essids": len(probe_index.by_essid),
+        "stations": len(probe_index),
+        "timestamp": time.time()
+    })
+
+@app.route('/history/<bssid>')
+def get_ap_history(bssid):
+    """Serie temporal de un AP: ?from=&to= (epoch) y ?step= (s). Máx. HISTORY_MAX_POINTS puntos."""
+    store = get_history()
+    if store is None:
+        return jsonify({"error": "History disabled"}), 503
+    try:
+        args = {k: float(request.args[k]) for k in ("from", "to", "step") if request.args.get(k)}
+    except ValueError:
+        return jsonify({"error": "from/to/step must be numbers"}), 400
+    # en el hilo del productor: no se cruza con las escrituras del tick
+    return jsonify(offload(store.query, bssid, args.get("from"), args.get("to"), args.get("step")))
+
+def journal_cursor(args):
+    try:
+        since = int(args.get("since", 0) or 0)
+        limit = int(args.get("limit", 200) or 200)
+    except (TypeError, ValueError):
+        raise ValueError("since/limit must be integers")
+    return max(0, since), min(max(1, limit), 1000)
+
+def ack_alert(alert_id, by=None):
+    """(respuesta, status HTTP) del ack de un incidente."""
+    store = get_journal()
+    if store is None:
+        return {"error": "Alert journal disabled"}, 503
+    try:
+        alert_id = int(alert_id)
+    except (TypeError, ValueError):
+        return {"error": "id must be an integer"}, 400
+    record = offload(store.ack, alert_id, clock(), str(by)[:64] if by else None)
+    if record is None:
+        return {"error": "Unknown alert id", "id": alert_id}, 404
+    logger.info(f"[journal] ✔️ Alerta {alert_id} reconocida" + (f" por {record['by']}" if record["by"] else ""))
+    socketio.emit('alert_journal', {"records": [record], "last_seq": record["seq"]})
+    return {"ack": record}, 200
+
+@app.route('/alerts')
+def list_alerts():
+    """
+    Sin ?since: incidentes abiertos. Con ?since=<seq>&limit=: registros del
+    diario posteriores a ese seq (open/update/close/ack), paginando con last_seq.
+    """
+    store = get_journal()
+    if store is None:
+        return jsonify({"error": "Alert journal disabled"}), 503
+    if "since" not in request.args:
+        return json_response({"open": offload(store.open_incidents), "last_seq": store.seq})
+    try:
+        since, limit = journal_cursor(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = offload(store.read, since, limit)
+    result["next_since"] = result["records"][-1]["seq"] if result["records"] else since
+    return json_response(result)
+
+@app.route('/alerts/<alert_id>/ack', methods=['POST'])
+def ack_alert_route(alert_id):
+    body = request.get_json(silent=True) or {}
+    result, status = ack_alert(alert_id, body.get("by"))
+    return jsonify(result), status
+
+def csv_byte_range(csv_path):
+    """Rango pedido (cabecera Range o ?offset=&length=; offset negativo = desde el final)."""
+    size = csv_path.stat().st_size
+    if request.range is not None:
+        bounds = request.range.range_for_length(size)
+        if bounds is None:
+            return None, size
+        start, stop = bounds
+        return (start, min(stop, start + DEBUG_CSV_RANGE_MAX)), size
+    try:
+        offset = int(request.args.get("offset", 0))
+        length = int(request.args.get("length", DEBUG_CSV_RANGE))
+    except ValueError:
+        return None, size
+    start = max(0, size + offset) if offset < 0 else offset
+    if length <= 0 or (start >= size and size > 0):
+        return None, size
+    return (start, min(size, start + min(length, DEBUG_CSV_RANGE_MAX))), size
+
+def stream_file(path, start, stop, chunk=64 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            data = f.read(min(chunk, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
 
 @app.route('/debug_csv')
 def debug_csv():
+    """
+    Sin parámetros: primeras 200 líneas (sin leer el resto del fichero).
+    Con Range / ?offset=&length=: el rango de bytes en streaming (206).
+    """
     csv_path = find_csv()
     if not csv_path:
         return jsonify({"error": "No CSV file found", "path": None}), 404
     try:
-        text = csv_path.read_text(encoding="utf-8", errors="ignore")
-        preview = text.splitlines()[:200]
+        if request.range is not None or "offset" in request.args or "length" in request.args:
+            bounds, size = csv_byte_range(csv_path)
+            if bounds is None:
+                return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+            start, stop = bounds
+            return Response(stream_file(csv_path, start, stop), status=206, mimetype="text/csv",
+                            headers={"Content-Range": f"bytes {start}-{max(start, stop - 1)}/{size}",
+                                     "Content-Length": str(stop - start),
+                                     "Accept-Ranges": "bytes"})
+
+        with open(csv_path, encoding="utf-8", errors="ignore") as f:
+            preview = [line.rstrip("\r\n") for line in itertools.islice(f, 200)]
         return jsonify({
             "path": str(csv_path),
             "size": csv_path.stat().st_size,
@@ -707,23 +1967,22 @@ def cleanup():
     logger.info("🛑 Limpieza iniciada...")
     global scanner_running
     scanner_running = False
+    hub_monitor.stop()
 
-    global proc
-    if proc and proc.poll() is None:
-        logger.info("🔪 Terminando airodump-ng...")
-        try:
-            proc.terminate()
-            proc.communicate(timeout=5)
-        except subprocess.TimeoutExpired:
-            proc.kill()
-        except Exception:
-            pass
+    for supervisor in supervisors():
+        supervisor.stop()
 
-    for p in Path("/tmp").glob("airodump_capture*"):
-        try:
-            p.unlink()
-        except Exception:
-            pass
+    if history is not None:
+        history.close()
+
+    if journal is not None:
+        journal.close()
+
+    if PERSIST_STATE and len(ap_state):
+        save_state()
+
+    if not REPLAY:
+        clear_capture_files()
 
 def signal_handler(sig, frame):
     logger.info(f"📡 Señal recibida {sig}, limpiando...")
@@ -731,42 +1990,165 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 # ---------------- main ----------------
-if __name__ == "__main__":
-    if os.geteuid() != 0:
-        logger.error("❌ Ejecuta con: sudo python3 main.py")
+def tune_gc():
+    """
+    Las pasadas del GC se ejecutan con el GIL tomado y, con el productor en otro
+    hilo, son el mayor bloqueo que ve el hub (100-200 ms con 20k APs). Lo cargado
+    al arrancar se congela y el umbral gen0 sube para que un tick no dispare
+    cientos de pasadas jóvenes que acaban en pasadas completas.
+    """
+    gc.freeze()
+    gc.set_threshold(GC_THRESHOLD, 10, 10)
+
+def start_queue():
+    """
+    Escáner: escucha los eventos reenviados por los web workers. Worker:
+    python-socketio no se suscribe a la cola hasta la primera conexión, y tiene
+    que estarlo antes de reenviar el primer connect o perdería la respuesta.
+    """
+    if queue_manager is None:
+        return
+    if ROLE == "scanner":
+        socketio.start_background_task(control_channel.listen, dispatch_client_event)
+    elif not socketio.server.manager_initialized:
+        socketio.server.manager_initialized = True
+        queue_manager.initialize()
+
+def run_replay_mode():
+    """Modo offline: sin root, sin interfaz y sin airodump-ng."""
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    try:
+        source = ReplaySource(REPLAY)
+        speed = parse_speed(REPLAY_SPEED)
+    except Exception as e:
+        logger.error(f"❌ Replay no válido: {e}")
         sys.exit(1)
 
+    logger.info("🚀 Iniciando Black Swan - Replay offline")
+    logger.info(f"📼 Sesión: {REPLAY}")
+    logger.info(f"🌐 Puerto: {PORT}")
+    if MESSAGE_QUEUE:
+        logger.info(f"📮 Publicando en {MESSAGE_QUEUE} para los web workers")
+    logger.info("=" * 50)
+    tune_gc()
+    start_queue()
+    socketio.start_background_task(replay_loop, source, speed)
+    socketio.start_background_task(hub_monitor.run)
     try:
-        subprocess.run(["airodump-ng", "--help"], capture_output=True, timeout=2)
-        logger.info("✅ airodump-ng encontrado")
-    except Exception:
-        logger.error("❌ airodump-ng no encontrado")
+        socketio.run(app, host='0.0.0.0', port=PORT, debug=False, use_reloader=False)
+    except KeyboardInterrupt:
+        logger.info("\n🛑 Interrupción por teclado")
+    finally:
+        cleanup()
+        logger.info("👋 Replay terminado")
+
+def run_web_worker():
+    """ROLE=web: solo sockets; los payloads llegan ya serializados por MESSAGE_QUEUE."""
+    logger.info("🚀 Iniciando Black Swan - web worker")
+    logger.info(f"📮 Cola: {MESSAGE_QUEUE}")
+    logger.info(f"🌐 Puerto: {PORT}")
+    logger.info("=" * 50)
+    tune_gc()
+    start_queue()
+    socketio.start_background_task(hub_monitor.run)
+    try:
+        socketio.run(app, host='0.0.0.0', port=PORT, debug=False, use_reloader=False)
+    except KeyboardInterrupt:
+        logger.info("\n🛑 Interrupción por teclado")
+    finally:
+        hub_monitor.stop()
+        logger.info("👋 Web worker terminado")
+
+if __name__ == "__main__":
+    if ROLE == "web":
+        run_web_worker()
+        sys.exit(0)
+
+    if REPLAY:
+        run_replay_mode()
+        sys.exit(0)
+
+    # Con una fuente pcap externa o solo sensores de directorio la captura la hace otra herramienta
+    local_sensors = [s for s in sensors if s.interface]
+    external_capture = (INGEST_MODE == "pcap" and PCAP_SOURCE) or (sensors and not local_sensors)
+
+    if not external_capture and os.geteuid() != 0:
+        logger.error("❌ Ejecuta con: sudo python3 main.py")
         sys.exit(1)
 
+    if not external_capture:
+        try:
+            subprocess.run(AIRODUMP_BIN + ["--help"], capture_output=True, timeout=2)
+            logger.info("✅ airodump-ng encontrado")
+        except Exception:
+            logger.error("❌ airodump-ng no encontrado")
+            sys.exit(1)
+
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
+    if PERSIST_STATE:
+        load_state()
+
     logger.info("🚀 Iniciando Black Swan - Sistema Inteligente de Detección WiFi")
-    logger.info(f"📡 Interface: {INTERFACE}")
+    if sensors:
+        logger.info(f"📡 Sensores: {', '.join(f'{s.name} ({s.interface or s.directory})' for s in sensors)}")
+    else:
+        logger.info(f"📡 Interface: {INTERFACE}")
     logger.info(f"🌐 Puerto: {PORT}")
+    if MESSAGE_QUEUE:
+        logger.info(f"📮 Publicando en {MESSAGE_QUEUE} para los web workers")
+    logger.info(f"📥 Ingesta: {INGEST_MODE}" + (f" ({PCAP_SOURCE})" if external_capture else ""))
     logger.info("=" * 50)
 
     try:
-        logger.info("🎯 Iniciando airodump-ng...")
-        proc = start_airodump_csv()
-
-        # Esperar por CSV
-        eventlet.sleep(3)
-
-        csv_file = find_csv()
-        if csv_file:
-            logger.info(f"📄 Archivo CSV detectado: {csv_file}")
-            test_aps = parse_airodump_csv(csv_file)
-            logger.info(f"🔍 Test parsing: {len(test_aps)} APs encontrados (primer parseo)")
+        if sensors:
+            if local_sensors:
+                logger.info(f"🎯 Iniciando airodump-ng en {len(local_sensors)} interfaces...")
+                clear_capture_files()
+            for s in local_sensors:
+                s.capture = start_capture(s.name, s.interface, s.prefix)
+        elif not external_capture:
+            logger.info("🎯 Iniciando airodump-ng...")
+            plan = None
+            if CHANNEL_SCHEDULER:
+                channel_scheduler = ChannelScheduler(
+                    ChannelPolicy(parse_channels(CHANNELS), CHANNEL_MAX_WEIGHT),
+                    CHANNEL_MIN_INTERVAL, CHANNEL_URGENT_INTERVAL, CHANNEL_MAX_PER_HOUR, CHANNEL_THRESHOLD)
+                plan = channel_scheduler.start(clock())
+                logger.info(f"📻 Salto de canal adaptativo: canales {CHANNELS}, {CHANNEL_HOP_MS} ms por salto")
+            clear_capture_files()
+            capture_supervisor = start_capture(INTERFACE, plan=plan)
+        socketio.start_background_task(supervise_loop)
+
+        # Esperar por la primera captura (inotify/polling en vez de un sleep fijo)
+        watcher = make_watcher()
+        if sensors:
+            first = watcher.wait_for_file(find_sensor_csv, timeout=10)
+            if first:
+                logger.info(f"📄 Primer CSV de sensor detectado: {first}")
+            else:
+                logger.warning("⚠️ Ningún sensor tiene CSV todavía")
+        elif INGEST_MODE == "pcap":
+            pcap_file = watcher.wait_for_file(find_pcap, timeout=10)
+            if pcap_file:
+                logger.info(f"📄 Fuente pcap detectada: {pcap_file}")
+            else:
+                logger.warning("⚠️ No se detectó fuente pcap inicial")
         else:
-            logger.warning("⚠️ No se detectó archivo CSV inicial")
+            csv_file = watcher.wait_for_file(find_csv, timeout=10)
+            if csv_file:
+                logger.info(f"📄 Archivo CSV detectado: {csv_file}")
+                test_aps = parse_airodump_csv(csv_file)
+                logger.info(f"🔍 Test parsing: {len(test_aps)} APs encontrados (primer parseo)")
+            else:
+                logger.warning("⚠️ No se detectó archivo CSV inicial")
 
-        socketio.start_background_task(scanner_loop)
+        tune_gc()
+        start_queue()
+        socketio.start_background_task(scanner_loop, watcher)
+        socketio.start_background_task(hub_monitor.run)
 
         logger.info("✅ Sistema iniciado correctamente!")
         logger.info("🎯 Sistema de alertas inteligente ACTIVADO")
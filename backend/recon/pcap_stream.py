@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - pcap_stream.py
+Motor de captura alternativo al scraping del CSV: lee tramas 802.11 de forma
+incremental desde un pcap clásico (el .cap de airodump-ng, un fichero que crece
+o una FIFO escrita por tcpdump / dumpcap -P / ...) y mantiene el mismo modelo AP/estación
+que construye parse_airodump_csv.
+
+Las tramas se decodifican con struct.unpack_from sobre un memoryview del
+buffer de lectura, sin copiar cada registro. Solo se materializan las
+direcciones MAC (6 bytes) y los ESSID.
+
+Con `ttl` > 0 se olvidan los APs y estaciones sin tramas en ese tiempo
+(medido con el reloj de la captura, así que vale igual en replay): una FIFO
+de tcpdump puede correr semanas y el modelo no crece sin límite.
+
+Uso standalone (replay de un pcap grabado, sin radio):
+    python3 pcap_stream.py captura.pcap
+"""
+
+import json
+import logging
+import os
+import select
+import stat
+import struct
+import sys
+import time
+
+from probes import MAX_PER_STATION, SWEEP_INTERVAL
+
+logger = logging.getLogger("blackswan")
+
+# Linktypes soportados
+LINKTYPE_IEEE802_11 = 105
+LINKTYPE_IEEE802_11_RADIOTAP = 127
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+
+# Tipos/subtipos 802.11 (campo frame control)
+TYPE_MGMT = 0
+TYPE_DATA = 2
+SUBTYPE_PROBE_REQ = 4
+SUBTYPE_PROBE_RESP = 5
+SUBTYPE_BEACON = 8
+SUBTYPE_DEAUTH = 12
+
+# Campos radiotap anteriores a dBm_AntSignal (bit 5): (alineación, tamaño)
+RADIOTAP_FIELDS = ((8, 8), (1, 1), (1, 1), (2, 4), (1, 2))
+RT_FLAGS_FCS = 0x10
+
+WPA_OUI = b"\x00\x50\xf2\x01"
+
+def format_mac(raw):
+    return raw.hex(":").upper()
+
+def freq_to_channel(freq):
+    if 2412 <= freq <= 2472:
+        return (freq - 2407) // 5
+    if freq == 2484:
+        return 14
+    if 5000 <= freq <= 5895:
+        return (freq - 5000) // 5
+    if 5955 <= freq <= 7115:
+        return (freq - 5950) // 5
+    return 0
+
+def parse_radiotap(mv, offset, caplen):
+    """Devuelve (longitud_cabecera, potencia_dbm|None, canal|0, tiene_fcs)."""
+    if caplen < 8:
+        return None
+    it_len = struct.unpack_from("<H", mv, offset + 2)[0]
+    if it_len > caplen:
+        return None
+    present = struct.unpack_from("<I", mv, offset + 4)[0]
+    pos = 8
+    word = present
+    while word & 0x80000000 and pos + 4 <= it_len:
+        word = struct.unpack_from("<I", mv, offset + pos)[0]
+        pos += 4
+
+    power = None
+    channel = 0
+    fcs = False
+    for bit, (align, size) in enumerate(RADIOTAP_FIELDS):
+        if not present & (1 << bit):
+            continue
+        pos = (pos + align - 1) & ~(align - 1)
+        if pos + size > it_len:
+            return it_len, None, 0, False
+        if bit == 1:
+            fcs = bool(mv[offset + pos] & RT_FLAGS_FCS)
+        elif bit == 3:
+            channel = freq_to_channel(struct.unpack_from("<H", mv, offset + pos)[0])
+        pos += size
+    if present & (1 << 5) and pos < it_len:
+        power = struct.unpack_from("<b", mv, offset + pos)[0]
+    return it_len, power, channel, fcs
+
+def parse_ies(mv, start, end):
+    """ESSID, canal DS y cifrado a partir de los tagged parameters."""
+    essid = None
+    channel = 0
+    rsn = wpa = False
+    pos = start
+    while pos + 2 <= end:
+        tag = mv[pos]
+        length = mv[pos + 1]
+        body = pos + 2
+        if body + length > end:
+            break
+        if tag == 0 and essid is None:
+            essid = bytes(mv[body:body + length]).rstrip(b"\x00").decode("utf-8", errors="ignore")
+        elif tag == 3 and length >= 1:
+            channel = mv[body]
+        elif tag == 48:
+            rsn = True
+        elif tag == 221 and length >= 4 and mv[body:body + 4] == WPA_OUI:
+            wpa = True
+        pos = body + length
+    return essid, channel, rsn, wpa
+
+
+class PcapCaptureEngine:
+    """
+    Lector incremental de pcap. poll() consume lo que haya disponible (sin
+    bloquear) y actualiza el modelo; build_aps_map() devuelve los AP con el
+    mismo formato que el parser CSV (listo para finalize_aps).
+    """
+
+    def __init__(self, path, ttl=0.0):
+        self.path = str(path)
+        self.ttl = ttl  # s sin tramas para olvidar un AP/estación (0 = nunca)
+        self.fd = None
+        self.is_fifo = False
+        self.buf = bytearray()
+        self.endian = None
+        self.ts_scale = 1e-6
+        self.linktype = None
+        self.frames = 0
+        self.bytes_read = 0
+        self.last_frame_ts = 0.0
+        self.aps = {}       # bssid(bytes) -> dict de estado
+        self.stations = {}  # mac(bytes) -> [bssid(bytes)|None, power, last_seen, probes(set)]
+        self.deauths = {}   # bssid(bytes) -> contador
+        self.last_sweep = 0.0
+        self.expired = 0
+
+    # ---------------- lectura ----------------
+    def open(self):
+        if self.fd is not None:
+            return True
+        try:
+            self.is_fifo = stat.S_ISFIFO(os.stat(self.path).st_mode)
+            flags = os.O_RDONLY | (os.O_NONBLOCK if self.is_fifo else 0)
+            self.fd = os.open(self.path, flags)
+            logger.info(f"[pcap] Leyendo {self.path} ({'FIFO' if self.is_fifo else 'fichero'})")
+            return True
+        except OSError:
+            return False
+
+    def read_available(self):
+        total = 0
+        while True:
+            if self.is_fifo:
+                ready, _, _ = select.select([self.fd], [], [], 0)
+                if not ready:
+                    break
+            try:
+                chunk = os.read(self.fd, 1 << 20)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            self.buf += chunk
+            total += len(chunk)
+        self.bytes_read += total
+        return total
+
+    def poll(self):
+        """Lee y procesa todo lo disponible. Devuelve el número de tramas nuevas."""
+        if not self.open():
+            return 0
+        if not self.read_available() and not self.buf:
+            return 0
+        return self.consume()
+
+    def consume(self):
+        processed = 0
+        consumed = 0
+        with memoryview(self.buf) as mv:
+            size = len(mv)
+            if self.endian is None:
+                if size < 24:
+                    return 0
+                fmt = PCAP_MAGIC.get(bytes(mv[0:4]))
+                if fmt is None:
+                    raise ValueError(f"{self.path}: no es un pcap (magic {bytes(mv[0:4]).hex()})")
+                self.endian, self.ts_scale = fmt
+                self.linktype = struct.unpack_from(self.endian + "I", mv, 20)[0] & 0x0FFFFFFF
+                if self.linktype not in (LINKTYPE_IEEE802_11, LINKTYPE_IEEE802_11_RADIOTAP):
+                    raise ValueError(f"{self.path}: linktype {self.linktype} no soportado (105/127)")
+                consumed = 24
+
+            rec = struct.Struct(self.endian + "IIII")
+            while consumed + 16 <= size:
+                ts_sec, ts_frac, incl_len, _orig = rec.unpack_from(mv, consumed)
+                start = consumed + 16
+                if start + incl_len > size:
+                    break
+                self.handle_frame(mv, start, incl_len, ts_sec + ts_frac * self.ts_scale)
+                consumed = start + incl_len
+                processed += 1
+        if consumed:
+            del self.buf[:consumed]
+        self.frames += processed
+        if self.ttl > 0 and self.last_frame_ts - self.last_sweep >= SWEEP_INTERVAL:
+            self.expire(self.last_frame_ts)
+        return processed
+
+    def expire(self, now):
+        """Olvida los APs y estaciones sin tramas en los últimos `ttl` s."""
+        self.last_sweep = now
+        if self.ttl <= 0:
+            return
+        for bssid in [b for b, ap in self.aps.items() if now - ap["last_seen"] > self.ttl]:
+            del self.aps[bssid]
+            self.deauths.pop(bssid, None)
+            self.expired += 1
+        for mac in [m for m, st in self.stations.items() if now - st[2] > self.ttl]:
+            del self.stations[mac]
+            self.expired += 1
+
+    # ---------------- decodificación ----------------
+    def handle_frame(self, mv, offset, caplen, ts):
+        power = None
+        rt_channel = 0
+        if self.linktype == LINKTYPE_IEEE802_11_RADIOTAP:
+            rt = parse_radiotap(mv, offset, caplen)
+            if rt is None:
+                return
+            it_len, power, rt_channel, fcs = rt
+            offset += it_len
+            caplen -= it_len + (4 if fcs else 0)
+        if caplen < 24:
+            return  # ACK/CTS/RTS y tramas truncadas
+        self.last_frame_ts = ts
+
+        fc0 = mv[offset]
+        fc1 = mv[offset + 1]
+        ftype = (fc0 >> 2) & 0x3
+        subtype = (fc0 >> 4) & 0xF
+        addr1 = bytes(mv[offset + 4:offset + 10])
+        addr2 = bytes(mv[offset + 10:offset + 16])
+        addr3 = bytes(mv[offset + 16:offset + 22])
+
+        if ftype == TYPE_MGMT:
+            if subtype in (SUBTYPE_BEACON, SUBTYPE_PROBE_RESP):
+                # cabecera 24 + fixed params 12 (timestamp, intervalo, capability)
+                if caplen < 36:
+                    return
+                capability = struct.unpack_from("<H", mv, offset + 34)[0]
+                essid, channel, rsn, wpa = parse_ies(mv, offset + 36, offset + caplen)
+                self.update_ap(addr3, essid, channel or rt_channel, capability, rsn, wpa,
+                               power, ts, beacon=(subtype == SUBTYPE_BEACON))
+            elif subtype == SUBTYPE_PROBE_REQ:
+                essid, _, _, _ = parse_ies(mv, offset + 24, offset + caplen)
+                self.update_station(addr2, None, power, ts, probe=essid)
+            elif subtype == SUBTYPE_DEAUTH:
+                self.deauths[addr3] = self.deauths.get(addr3, 0) + 1
+        elif ftype == TYPE_DATA:
+            to_ds = fc1 & 0x01
+            from_ds = fc1 & 0x02
+            if to_ds and from_ds:
+                return  # WDS: no asociamos estaciones
+            if to_ds:
+                bssid, sta, sta_power = addr1, addr2, power
+            elif from_ds:
+                bssid, sta, sta_power = addr2, addr1, None
+            else:
+                bssid, sta, sta_power = addr3, addr2, power
+            ap = self.aps.get(bssid)
+            if ap is not None:
+                ap["data"] += 1
+                ap["last_seen"] = ts
+            if not sta[0] & 0x01:  # ignorar broadcast/multicast
+                self.update_station(sta, bssid, sta_power, ts)
+
+    def update_ap(self, bssid, essid, channel, capability, rsn, wpa, power, ts, beacon):
+        ap = self.aps.get(bssid)
+        if ap is None:
+            ap = self.aps[bssid] = {"essid": "", "channel": "", "privacy": "", "power": -100,
+                                    "beacons": 0, "data": 0, "last_seen": ts}
+        if essid:
+            ap["essid"] = essid
+        if channel:
+            ap["channel"] = str(channel)
+        if rsn and wpa:
+            ap["privacy"] = "WPA2 WPA"
+        elif rsn:
+            ap["privacy"] = "WPA2"
+        elif wpa:
+            ap["privacy"] = "WPA"
+        elif capability & 0x0010:
+            ap["privacy"] = "WEP"
+        else:
+            ap["privacy"] = "OPN"
+        if power is not None:
+            ap["power"] = power
+        if beacon:
+            ap["beacons"] += 1
+        ap["last_seen"] = ts
+
+    def update_station(self, mac, bssid, power, ts, probe=None):
+        st = self.stations.get(mac)
+        if st is None:
+            st = self.stations[mac] = [None, -100, ts, set()]
+        if bssid is not None:
+            st[0] = bssid
+        if power is not None:
+            st[1] = power
+        st[2] = ts
+        if probe and len(st[3]) < MAX_PER_STATION:
+            st[3].add(probe)
+
+    # ---------------- modelo ----------------
+    def build_aps_map(self):
+        """
+        Mismo formato que parse_airodump_csv antes de finalize_aps. 'data'
+        cuenta tramas de datos del BSSID (el CSV de airodump no las expone).
+        """
+        aps_map = {}
+        by_raw = {}
+        for raw, ap in self.aps.items():
+            bssid = format_mac(raw)
+            obj = {
+                "bssid": bssid,
+                "essid": ap["essid"] if ap["essid"] else "Oculto",
+                "channel": ap["channel"],
+                "privacy": ap["privacy"],
+                "power": ap["power"],
+                "data": ap["data"],
+                "clients": [],
+                "clients_count_ap": 0,
+                "data_flag": "normal",
+                "possible_evil_twin": False
+            }
+            aps_map[bssid.lower()] = obj
+            by_raw[raw] = obj
+        for mac, (bssid, power, _last, _probes) in self.stations.items():
+            ap = by_raw.get(bssid)
+            if ap is not None:
+                ap["clients"].append({"mac": format_mac(mac), "power": power})
+        return aps_map
+
+    def station_rows(self):
+        """Todas las estaciones como (mac, power, bssid|None, probes), igual que el parser CSV."""
+        return [(format_mac(mac), power, format_mac(bssid) if bssid else None, ",".join(probes))
+                for mac, (bssid, power, _last, probes) in self.stations.items()]
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "frames": self.frames,
+            "bytes": self.bytes_read,
+            "aps": len(self.aps),
+            "stations": len(self.stations),
+            "deauths": {format_mac(b): n for b, n in self.deauths.items()},
+            "expired": self.expired,
+            "last_frame_ts": self.last_frame_ts,
+        }
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python3 pcap_stream.py captura.pcap")
+        sys.exit(1)
+    engine = PcapCaptureEngine(sys.argv[1])
+    t0 = time.perf_counter()
+    while engine.poll():
+        pass
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"stats": engine.stats(), "aps": list(engine.build_aps_map().values())},
+                     indent=2, ensure_ascii=False))
+    print(f"{engine.frames} tramas en {elapsed * 1000:.1f} ms", file=sys.stderr)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - probes.py
+Índice invertido de probe requests para detectar señuelos tipo karma.
+
+La sección de estaciones del CSV de airodump-ng trae en "Probed ESSIDs" las
+redes que cada estación ha buscado (lista acumulada desde que arrancó la
+captura). ProbeIndex mantiene las dos direcciones:
+
+  ESSID -> estaciones que lo buscan     probers(essid) en O(1)
+  estación -> ESSIDs buscados           essids_of(mac)
+
+y, aparte, cuándo apareció cada BSSID anunciado. Un AP de karma (hostapd-mana,
+WiFi Pineapple) contesta a los probes con el ESSID buscado, así que la señal
+es un BSSID nuevo que anuncia un ESSID que muchas estaciones están buscando:
+lure(essid, bssid, now) la da en O(1) para detect_evil_twin.
+
+Se actualiza por tick de forma incremental: si la cadena de probes de una
+estación no ha cambiado (lo normal) solo se refresca su last_seen, sin volver
+a partirla. Memoria acotada: como mucho `max_stations` estaciones con probes
+(se expulsan las menos recientes), `max_per_station` ESSIDs por estación y
+expiración por `ttl`; lo mismo para los BSSIDs (`max_bssids`). Los BSSIDs
+vistos durante los primeros `warmup` s son la línea base y no cuentan como
+nuevos: el primer CSV de airodump (o la primera lectura del pcap) solo trae
+los APs de los primeros canales del barrido.
+"""
+
+import heapq
+
+MAX_PER_STATION = 32  # ESSIDs por estación (airodump acumula sin límite)
+SWEEP_INTERVAL = 60.0  # s entre barridos de expiración
+
+
+def parse_probes(raw):
+    """'eduroam,Casa,,Free WiFi' -> ('eduroam', 'Casa', 'Free WiFi')"""
+    return tuple(dict.fromkeys(e.strip() for e in raw.split(",") if e.strip()))
+
+
+class ProbeIndex:
+    def __init__(self, max_stations=50000, max_per_station=MAX_PER_STATION, ttl=3600.0,
+                 max_bssids=100000, new_window=600.0, warmup=600.0):
+        self.max_stations = max_stations
+        self.max_per_station = max_per_station
+        self.ttl = ttl
+        self.max_bssids = max_bssids
+        self.new_window = new_window
+        self.warmup = warmup
+        self.by_station = {}  # mac -> [probes en crudo, tupla de ESSIDs, last_seen]
+        self.by_essid = {}  # essid -> set(macs)
+        self.bssids = {}  # bssid -> [first_seen (None = línea base), last_seen]
+        self.baseline_until = None  # fin del calentamiento (primera llamada a advertise + warmup)
+        self.last_sweep = 0.0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.by_station)
+
+    # ---------------- estaciones ----------------
+    def update(self, rows, now):
+        """Filas (mac, power, bssid, probes en crudo) del tick. Devuelve cuántas estaciones cambiaron."""
+        changed = 0
+        by_station = self.by_station
+        for row in rows:
+            raw = row[3]
+            if not raw:
+                continue
+            key = row[0].lower()
+            rec = by_station.get(key)
+            if rec is not None and rec[0] == raw:
+                rec[2] = now
+                continue
+            essids = parse_probes(raw)[:self.max_per_station]
+            if rec is None:
+                rec = by_station[key] = [raw, (), now]
+            self.link(key, rec[1], essids)
+            rec[0], rec[1], rec[2] = raw, essids, now
+            changed += 1
+        if len(by_station) > self.max_stations:
+            self.evict(len(by_station) - self.max_stations + self.max_stations // 10)
+        if now - self.last_sweep >= SWEEP_INTERVAL:
+            self.expire(now)
+        return changed
+
+    def link(self, mac, old, new):
+        by_essid = self.by_essid
+        for essid in old:
+            if essid not in new:
+                macs = by_essid.get(essid)
+                if macs is not None:
+                    macs.discard(mac)
+                    if not macs:
+                        del by_essid[essid]
+        for essid in new:
+            macs = by_essid.get(essid)
+            if macs is None:
+                by_essid[essid] = {mac}
+            else:
+                macs.add(mac)
+
+    def remove(self, mac):
+        rec = self.by_station.pop(mac, None)
+        if rec is not None:
+            self.link(mac, rec[1], ())
+
+    def evict(self, n):
+        """Expulsa las n estaciones vistas hace más tiempo."""
+        for mac in heapq.nsmallest(n, self.by_station, key=lambda m: self.by_station[m][2]):
+            self.remove(mac)
+        self.evicted += n
+
+    def expire(self, now):
+        self.last_sweep = now
+        if self.ttl <= 0:
+            return
+        for mac in [m for m, rec in self.by_station.items() if now - rec[2] > self.ttl]:
+            self.remove(mac)
+        for bssid in [b for b, rec in self.bssids.items() if now - rec[1] > self.ttl]:
+            del self.bssids[bssid]
+
+    def probers(self, essid):
+        macs = self.by_essid.get(essid)
+        return len(macs) if macs else 0
+
+    def essids_of(self, mac):
+        rec = self.by_station.get(mac.lower())
+        return list(rec[1]) if rec else []
+
+    def stations_probing(self, essid):
+        return sorted(self.by_essid.get(essid, ()))
+
+    def top(self, n=20):
+        """Los n ESSIDs más buscados: [(essid, estaciones)]."""
+        return heapq.nlargest(n, ((essid, len(macs)) for essid, macs in self.by_essid.items()),
+                              key=lambda item: item[1])
+
+    # ---------------- BSSIDs anunciados ----------------
+    def advertise(self, aps, now):
+        """Registra los BSSIDs del tick; los del calentamiento son la línea base."""
+        bssids = self.bssids
+        if self.baseline_until is None:
+            self.baseline_until = now + self.warmup
+        first = None if now < self.baseline_until else now
+        for ap in aps:
+            key = ap["bssid"].lower()
+            rec = bssids.get(key)
+            if rec is None:
+                bssids[key] = [first, now]
+            else:
+                rec[1] = now
+        if len(bssids) > self.max_bssids:
+            excess = len(bssids) - self.max_bssids + self.max_bssids // 10
+            for key in heapq.nsmallest(excess, bssids, key=lambda b: bssids[b][1]):
+                del bssids[key]
+
+    def is_new(self, bssid, now):
+        rec = self.bssids.get(bssid.lower())
+        return rec is not None and rec[0] is not None and now - rec[0] <= self.new_window
+
+    def lure(self, essid, bssid, now):
+        """Estaciones que buscan `essid` si `bssid` es nuevo (0 si no): la señal de karma."""
+        n = self.probers(essid)
+        return n if n and self.is_new(bssid, now) else 0
+
+    def stats(self):
+        return {
+            "stations": len(self.by_station),
+            "essids": len(self.by_essid),
+            "bssids": len(self.bssids),
+            "evicted": self.evicted,
+            "top": [{"essid": essid, "stations": n} for essid, n in self.top(5)],
+        }
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - query.py
+Consultas sobre el último snapshot para /scan: filtro, orden, paginación por
+cursor y proyección de campos.
+
+  ?channel=1,6  ?privacy=OPN,WEP  ?min_power=-70  ?bssid=AA:..,BB:..
+  ?essid=Corp*&essid=*guest*      (globs; se repite el parámetro, las ESSID pueden llevar comas)
+  ?flagged=1    ?min_severity=high
+  ?sort=-power  (power, channel, data, delta_data, clients, essid, bssid, privacy; "-" = descendente)
+  ?limit=100&cursor=<next_cursor>
+  ?fields=bssid,essid,power
+
+El filtro es el mismo que el de las suscripciones de Socket.IO. El cursor es de
+tipo keyset (valor de orden + BSSID del último AP devuelto) y no un offset: si
+el snapshot cambia entre dos páginas no se repiten ni se saltan los APs que
+sigan existiendo.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from operator import itemgetter
+
+from subscriptions import Filter
+
+MAX_LIMIT = 10000
+
+
+def channel_number(ap):
+    channel = str(ap.get("channel", "")).strip()
+    return int(channel) if channel.lstrip("-").isdigit() else -1
+
+
+# nombre -> (clave de orden, tipo del valor en el cursor)
+SORT_FIELDS = {
+    "power": (lambda ap: ap.get("power", -100), int),
+    "channel": (channel_number, int),
+    "data": (lambda ap: ap.get("data", 0), int),
+    "delta_data": (lambda ap: ap.get("delta_data", 0), int),
+    "clients": (lambda ap: ap.get("clients_count_ap", 0), int),
+    "essid": (lambda ap: str(ap.get("essid", "")).lower(), str),
+    "bssid": (lambda ap: ap["bssid"].lower(), str),
+    "privacy": (lambda ap: str(ap.get("privacy", "")).lower(), str),
+}
+
+
+def split_list(args, name):
+    return [v.strip() for raw in args.getlist(name) for v in raw.split(",") if v.strip()]
+
+
+def encode_cursor(sort, value, bssid):
+    raw = json.dumps([sort, value, bssid], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort, kind):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, bssid = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("cursor no válido")
+    if cursor_sort != sort:
+        raise ValueError("el cursor es de otra ordenación (sort)")
+    if not isinstance(value, kind) or isinstance(value, bool) or not isinstance(bssid, str):
+        raise ValueError("cursor no válido")
+    return value, bssid
+
+
+class ScanQuery:
+    """Parámetros de /scan ya validados (ValueError si no lo son)."""
+
+    def __init__(self, args):
+        spec = {}
+        for key, name in (("channels", "channel"), ("bssids", "bssid"), ("privacy", "privacy")):
+            values = split_list(args, name)
+            if values:
+                spec[key] = values
+        essid = [v for v in args.getlist("essid") if v]
+        if essid:
+            spec["essid"] = essid
+        if args.get("min_power"):
+            spec["min_power"] = args["min_power"]
+        if args.get("min_severity"):
+            spec["min_severity"] = args["min_severity"]
+        if args.get("flagged") in ("1", "true", "yes"):
+            spec["flagged"] = True
+        self.filter = Filter(spec) if spec else None
+
+        sort = args.get("sort", "")
+        self.descending = sort.startswith("-")
+        self.sort = sort.lstrip("-+") or None
+        if self.sort is not None and self.sort not in SORT_FIELDS:
+            raise ValueError(f"sort debe ser uno de {', '.join(SORT_FIELDS)}")
+
+        self.limit = None
+        if args.get("limit"):
+            try:
+                self.limit = int(args["limit"])
+            except ValueError:
+                raise ValueError("limit debe ser un entero")
+            if not 1 <= self.limit <= MAX_LIMIT:
+                raise ValueError(f"limit debe estar entre 1 y {MAX_LIMIT}")
+        if self.limit is not None and self.sort is None:
+            self.sort = "bssid"  # paginar exige un orden estable
+
+        self.cursor = None
+        cursor = args.get("cursor")
+        if cursor:
+            if self.limit is None:
+                raise ValueError("cursor requiere limit")
+            self.cursor = decode_cursor(cursor, self.sort_token, SORT_FIELDS[self.sort][1])
+
+        self.fields = tuple(dict.fromkeys(split_list(args, "fields"))) or None
+
+        canonical = [self.filter.key if self.filter else None, self.sort_token, self.limit,
+                     self.cursor, self.fields]
+        self.digest = hashlib.sha1(json.dumps(canonical).encode()).hexdigest()[:12]
+
+    @property
+    def sort_token(self):
+        if self.sort is None:
+            return None
+        return ("-" if self.descending else "") + self.sort
+
+    def etag(self, snap):
+        """Mismo snapshot y misma consulta -> misma respuesta."""
+        return f"{snap.seq}-{self.digest}"
+
+    def run(self, snap):
+        view = self.filter.narrow(snap) if self.filter else snap
+        aps = view.aps
+        next_cursor = None
+
+        if self.sort is not None:
+            key = SORT_FIELDS[self.sort][0]
+            keyed = sorted((((key(ap), ap["bssid"].lower()), ap) for ap in aps), key=itemgetter(0))
+            if self.descending:
+                keyed.reverse()
+            if self.cursor is not None:
+                after = self.cursor
+                keyed = [item for item in keyed if (item[0] < after if self.descending else item[0] > after)]
+            if self.limit is not None and len(keyed) > self.limit:
+                keyed = keyed[:self.limit]
+                (value, bssid), _ = keyed[-1]
+                next_cursor = encode_cursor(self.sort_token, value, bssid)
+            aps = [ap for _, ap in keyed]
+
+        if self.fields is not None:
+            aps = [{f: ap[f] for f in self.fields if f in ap} for ap in aps]
+
+        return {
+            "aps": aps,
+            "timestamp": snap.timestamp,
+            "total_networks": len(snap.aps),
+            "matched": len(view.aps),
+            "total_clients": view.total_clients,
+            "seq": snap.seq,
+            "alerts": view.alerts,
+            "next_cursor": next_cursor,
+        }
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - replay.py
+Reproduce una sesión grabada (directorio de snapshots CSV con marca de tiempo,
+o un .tar/.tar.gz/.zip con ellos) a 1x, Nx o a máxima velocidad. Sirve para
+reproducir incidentes, ajustar la detección offline y medir el throughput del
+pipeline sin root, sin interfaz en modo monitor y sin airodump-ng.
+
+Marca de tiempo de cada snapshot, por orden de preferencia:
+  - epoch en el nombre:      1700000000.250.csv, airodump_capture-1700000000.csv
+  - fecha en el nombre:      20240101-101500.csv, 20240101T101500.123.csv
+  - mtime del fichero / miembro del archivo
+"""
+
+import logging
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger("blackswan")
+
+EPOCH_RE = re.compile(r"(?<!\d)(\d{10}(?:\.\d+)?)(?!\d)")
+DATE_RE = re.compile(r"(\d{8})[-_T](\d{6})(\.\d+)?")
+
+def frame_timestamp(path, fallback=None):
+    name = Path(path).name
+    m = DATE_RE.search(name)
+    if m:
+        ts = datetime.strptime(m.group(1) + m.group(2), "%Y%m%d%H%M%S").timestamp()
+        return ts + (float(m.group(3)) if m.group(3) else 0.0)
+    m = EPOCH_RE.search(name)
+    if m:
+        return float(m.group(1))
+    if fallback is not None:
+        return fallback
+    return Path(path).stat().st_mtime
+
+def parse_speed(value):
+    """'max' -> 0 (sin esperas); '10' / '10x' -> 10.0"""
+    value = str(value).strip().lower()
+    if value in ("max", "0", ""):
+        return 0.0
+    speed = float(value[:-1] if value.endswith("x") else value)
+    if speed <= 0:
+        raise ValueError("REPLAY_SPEED debe ser > 0 o 'max'")
+    return speed
+
+
+class ReplaySource:
+    """Lista ordenada de (timestamp, ruta_csv) de una sesión grabada."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tmpdir = None
+        self.frames = self.load()
+
+    def load(self):
+        root = self.path
+        mtimes = {}
+        if self.path.is_file():
+            self.tmpdir = tempfile.mkdtemp(prefix="blackswan_replay_")
+            root = Path(self.tmpdir)
+            if zipfile.is_zipfile(self.path):
+                with zipfile.ZipFile(self.path) as zf:
+                    for info in zf.infolist():
+                        if info.filename.endswith(".csv") and not info.is_dir():
+                            target = root / Path(info.filename).name
+                            target.write_bytes(zf.read(info))
+                            mtimes[target.name] = datetime(*info.date_time).timestamp()
+            elif tarfile.is_tarfile(self.path):
+                with tarfile.open(self.path) as tf:
+                    for member in tf.getmembers():
+                        if member.isfile() and member.name.endswith(".csv"):
+                            target = root / Path(member.name).name
+                            target.write_bytes(tf.extractfile(member).read())
+                            mtimes[target.name] = float(member.mtime)
+            else:
+                raise ValueError(f"{self.path}: no es un directorio, .zip ni .tar")
+
+        frames = [(frame_timestamp(p, mtimes.get(p.name)), p) for p in root.glob("*.csv")]
+        frames.sort(key=lambda f: (f[0], f[1].name))
+        logger.info(f"[replay] {len(frames)} snapshots en {self.path}")
+        return frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def duration(self):
+        return self.frames[-1][0] - self.frames[0][0] if self.frames else 0.0
+
+    def close(self):
+        if self.tmpdir:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+            self.tmpdir = None
+
+
+def run_replay(source, speed, step, should_continue=lambda: True):
+    """
+    Llama a step(ts, ruta) por cada snapshot respetando los intervalos
+    originales divididos por `speed` (0 = máxima velocidad). Devuelve stats.
+    """
+    t0 = time.perf_counter()
+    first_ts = None
+    frames = 0
+    busy = 0.0
+    for ts, path in source:
+        if not should_continue():
+            break
+        if first_ts is None:
+            first_ts = ts
+        if speed:
+            target = t0 + (ts - first_ts) / speed
+            wait = target - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        else:
+            time.sleep(0)  # ceder el hub de eventlet entre snapshots
+        s0 = time.perf_counter()
+        step(ts, path)
+        busy += time.perf_counter() - s0
+        frames += 1
+
+    wall = time.perf_counter() - t0
+    return {
+        "frames": frames,
+        "wall_seconds": round(wall, 3),
+        "busy_seconds": round(busy, 3),
+        "session_seconds": round(source.duration(), 3),
+        "frames_per_second": round(frames / busy, 2) if busy else 0.0,
+        "speedup": round(source.duration() / wall, 2) if wall else 0.0,
+    }
@@ -0,0 +1,580 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - rules.py
+Reglas de detección declarativas: umbrales y pesos fuera del código.
+
+Un fichero de reglas (JSON, o YAML si está PyYAML; RULES_FILE) describe:
+
+  traffic    cascada de reglas por AP; la primera que se cumple da la alerta.
+             Variables: delta, baseline, has_baseline, samples, z, power, clients
+  evil_twin  indicadores con puntos sobre cada grupo de APs con el mismo ESSID
+             y niveles por puntuación mínima. Variables: aps, channels,
+             securities, power_range, clients, aps_with_clients, suspicious_name
+  params     constantes con nombre usables en las expresiones (spike_z,
+             suspicious_z llegan de TRAFFIC_SPIKE_Z / TRAFFIC_SUSPICIOUS_Z)
+
+Las condiciones son expresiones de Python restringidas (and/or/not,
+comparaciones, + - * /, abs/min/max, números) que se validan y compilan una
+vez al cargar a una función de las columnas que usan. Con NumPy cada regla se
+evalúa sobre todos los APs (o grupos) del tick de una vez: and/or/not pasan a
+logical_and/or/not y el resultado es una máscara; sin NumPy, la misma función
+se aplica fila a fila. Cada evaluación suma su coste y sus aciertos por regla.
+
+RuleEngine recarga el fichero cuando cambia (mtime/tamaño, un stat por tick).
+Si el fichero nuevo no es válido se mantienen las reglas anteriores; el estado
+de detección (baselines, cooldowns, incidentes) no depende de las reglas y no
+se toca.
+
+  python3 rules.py --dump > reglas.json        # reglas por defecto, para editar
+  python3 rules.py --check reglas.json          # validar antes de desplegar
+"""
+
+import argparse
+import ast
+import copy
+import json
+import logging
+import math
+import os
+import sys
+import time
+from functools import reduce
+
+try:
+    import numpy as np
+except ImportError:  # ruta escalar
+    np = None
+
+try:
+    import yaml
+except ImportError:  # solo JSON
+    yaml = None
+
+logger = logging.getLogger("blackswan")
+
+DETECTORS = ("mean", "ewma", "mad")
+SEVERITIES = ("low", "medium", "high", "critical")
+TRAFFIC_FEATURES = ("delta", "baseline", "has_baseline", "samples", "z", "power", "clients")
+GROUP_FEATURES = ("aps", "channels", "securities", "power_range", "clients", "aps_with_clients", "suspicious_name")
+FUNCTIONS = {"abs": (1, 1), "min": (2, None), "max": (2, None)}  # nombre -> (mín., máx. argumentos)
+DEFAULT_COOLDOWN = 60.0  # s entre alertas de tráfico del mismo AP
+DEFAULT_PARAMS = {"spike_z": 10.0, "suspicious_z": 5.0}  # main los sustituye por TRAFFIC_*_Z
+
+# Reglas por defecto: los umbrales y pesos que antes estaban fijos en main.py
+DEFAULT_RULES = {
+    "params": {},
+    "traffic": [
+        {"name": "critical", "when": "delta > 8000", "alert": "critical_traffic", "severity": "critical",
+         "cooldown": 0, "message": "🚨 CRÍTICO: {essid} - Tráfico EXTREMO: {delta} pkt/30s"},
+        {"name": "spike", "detectors": ["mean"], "when": "baseline > 20 and delta > baseline * 15 and delta > 500",
+         "alert": "traffic_spike", "severity": "high",
+         "message": "⚠️ SPIKE: {essid} - {delta} pkt (15x sobre normal: {baseline:.0f})"},
+        {"name": "spike_z", "detectors": ["ewma", "mad"], "when": "has_baseline and z > spike_z and delta > 500",
+         "alert": "traffic_spike", "severity": "high",
+         "message": "⚠️ SPIKE: {essid} - {delta} pkt (z={z:.1f} sobre normal: {baseline:.0f})"},
+        {"name": "high", "when": "delta > 2000", "alert": "high_traffic", "severity": "medium",
+         "message": "🔶 ALTO: {essid} - Tráfico elevado: {delta} pkt/30s"},
+        {"name": "suspicious", "detectors": ["mean"], "when": "baseline > 50 and delta > baseline * 5 and delta > 300",
+         "alert": "suspicious_traffic", "severity": "low",
+         "message": "🔸 SOSPECHOSO: {essid} - {delta} pkt (5x sobre normal)"},
+        {"name": "suspicious_z", "detectors": ["ewma", "mad"],
+         "when": "has_baseline and z > suspicious_z and delta > 300",
+         "alert": "suspicious_traffic", "severity": "low",
+         "message": "🔸 SOSPECHOSO: {essid} - {delta} pkt (z={z:.1f} sobre normal)"},
+    ],
+    "evil_twin": {
+        "suspicious_names": ["free wifi", "wifi gratis", "public wifi", "hotspot", "staff", "guest"],
+        "indicators": [
+            # Mismo canal: raro en bandas duales
+            {"name": "same_channel", "when": "channels < aps", "points": 3, "label": "Mismo canal"},
+            {"name": "security_mismatch", "when": "securities > 1", "points": 2, "label": "Seguridad diferente"},
+            # Más de 30 dBm de diferencia: inusual para el mismo AP
+            {"name": "power_range", "when": "power_range > 30", "points": 2,
+             "label": "Potencia muy diferente ({power_range} dBm)"},
+            # Un punto por cada AP con clientes
+            {"name": "clients", "when": "aps_with_clients > 1", "points": "aps_with_clients",
+             "label": "Múltiples APs con clientes ({aps_with_clients})"},
+            {"name": "suspicious_name", "when": "suspicious_name", "points": 1, "label": "Nombre sospechoso"},
+        ],
+        "levels": [
+            {"min_score": 5, "alert": "evil_twin_high", "severity": "critical", "confidence": "high",
+             "message": "🚨 EVIL TWIN CONFIRMADO: '{essid}' - {indicators}"},
+            {"min_score": 3, "alert": "evil_twin_suspicious", "severity": "medium", "confidence": "medium",
+             "message": "⚠️ POSIBLE EVIL TWIN: '{essid}' - {indicators}"},
+        ],
+    },
+}
+
+ALLOWED_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+                 ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Compare, ast.Lt, ast.LtE, ast.Gt,
+                 ast.GtE, ast.Eq, ast.NotEq, ast.Name, ast.Load, ast.Constant, ast.Call)
+
+
+# ---------------- expresiones ----------------
+def call(name, *args):
+    return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=list(args), keywords=[])
+
+
+def scalar_div(a, b):
+    """a / b sin ZeroDivisionError, como NumPy: ±inf o nan."""
+    if b:
+        return a / b
+    return math.copysign(math.inf, a) if a else math.nan
+
+
+class Vectorize(ast.NodeTransformer):
+    """and/or/not y comparaciones encadenadas → funciones elemento a elemento de NumPy."""
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        name = "_and" if isinstance(node.op, ast.And) else "_or"
+        return reduce(lambda a, b: call(name, a, b), node.values)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return call("_not", node.operand) if isinstance(node.op, ast.Not) else node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        left, parts = node.left, []
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        return reduce(lambda a, b: call("_and", a, b), parts)
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        name = "_" + node.func.id
+        return reduce(lambda a, b: call(name, a, b), node.args) if len(node.args) > 1 else call(name, *node.args)
+
+
+class Scalarize(ast.NodeTransformer):
+    """Solo la división: sin NumPy, x/0 no debe tumbar el tick."""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        return call("_div", node.left, node.right) if isinstance(node.op, ast.Div) else node
+
+
+VECTOR_ENV = {"_and": "logical_and", "_or": "logical_or", "_not": "logical_not",
+              "_abs": "abs", "_min": "minimum", "_max": "maximum"}
+
+
+class Expression:
+    """Expresión validada y compilada a una función de las columnas que usa."""
+
+    def __init__(self, text, features, params, vector, where):
+        if isinstance(text, bool) or isinstance(text, (int, float)):
+            text = repr(text)
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f"{where}: se esperaba una expresión")
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"{where}: expresión no válida '{text}': {e.msg}") from None
+
+        functions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+        used = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES):
+                raise ValueError(f"{where}: '{type(node).__name__}' no permitido en '{text}'")
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                    raise ValueError(f"{where}: llamada no permitida en '{text}' (solo {', '.join(FUNCTIONS)})")
+                low, high = FUNCTIONS[node.func.id]
+                if len(node.args) < low or (high is not None and len(node.args) > high):
+                    arity = "1 argumento" if high == 1 else f"{low} o más argumentos"
+                    raise ValueError(f"{where}: {node.func.id}() necesita {arity} en '{text}'")
+            elif isinstance(node, ast.Constant):
+                if not isinstance(node.value, (bool, int, float)):
+                    raise ValueError(f"{where}: solo se admiten constantes numéricas en '{text}'")
+            elif isinstance(node, ast.Name) and id(node) not in functions:
+                if node.id in features:
+                    used.add(node.id)
+                elif node.id not in params:
+                    raise ValueError(f"{where}: variable desconocida '{node.id}' en '{text}'")
+        self.args = tuple(sorted(used))
+
+        body = (Vectorize() if vector else Scalarize()).visit(tree).body
+        func = ast.Expression(body=ast.Lambda(
+            args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=a) for a in self.args], vararg=None,
+                               kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]),
+            body=body))
+        ast.fix_missing_locations(func)
+        env = dict(params, __builtins__={})
+        if vector:
+            env.update({name: getattr(np, attr) for name, attr in VECTOR_ENV.items()})
+        else:
+            env.update(_div=scalar_div, abs=abs, min=min, max=max)
+        self.fn = eval(compile(func, f"<regla {where}>", "eval"), env)
+        self.vector = vector
+        self.where = where
+
+    def mask(self, columns, n):
+        """Vector: máscara booleana de n filas (una constante se expande)."""
+        result = np.asarray(self.fn(*[columns[a] for a in self.args]), dtype=bool)
+        return result if result.shape == (n,) else np.broadcast_to(result, (n,)).copy()
+
+    def values(self, columns, n):
+        """Vector: valores numéricos de n filas."""
+        result = np.asarray(self.fn(*[columns[a] for a in self.args]), dtype=np.float64)
+        return result if result.shape == (n,) else np.broadcast_to(result, (n,)).copy()
+
+    def row(self, columns, i):
+        """Escalar: valor en la fila i."""
+        return self.fn(*[columns[a][i] for a in self.args])
+
+
+# ---------------- reglas ----------------
+def check_keys(spec, allowed, where):
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: se esperaba un objeto")
+    unknown = set(spec) - set(allowed)
+    if unknown:
+        raise ValueError(f"{where}: claves desconocidas {sorted(unknown)}")
+
+
+def check_format(template, sample, where):
+    try:
+        template.format(**sample)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"{where}: plantilla no válida '{template}': {e!r}") from None
+    return template
+
+
+def severity_of(spec, where):
+    severity = spec.get("severity", "medium")
+    if severity not in SEVERITIES:
+        raise ValueError(f"{where}: severidad '{severity}' no válida ({', '.join(SEVERITIES)})")
+    return severity
+
+
+class TrafficRule:
+    KEYS = ("name", "when", "alert", "severity", "cooldown", "message", "detectors", "enabled")
+
+    def __init__(self, spec, params, vector):
+        where = f"traffic/{spec.get('name', '?') if isinstance(spec, dict) else '?'}"
+        check_keys(spec, self.KEYS, where)
+        self.name = str(spec.get("name") or "")
+        if not self.name:
+            raise ValueError(f"{where}: falta 'name'")
+        self.alert = str(spec.get("alert") or self.name)
+        self.severity = severity_of(spec, where)
+        self.cooldown = float(spec.get("cooldown", DEFAULT_COOLDOWN))
+        if self.cooldown < 0:
+            raise ValueError(f"{where}: cooldown negativo")
+        self.detectors = tuple(spec.get("detectors", DETECTORS))
+        if not set(self.detectors) <= set(DETECTORS):
+            raise ValueError(f"{where}: detectores desconocidos {sorted(set(self.detectors) - set(DETECTORS))}")
+        self.enabled = bool(spec.get("enabled", True))
+        self.when = Expression(spec.get("when"), TRAFFIC_FEATURES, params, vector, where)
+        sample = dict.fromkeys(TRAFFIC_FEATURES, 0.0) | {"essid": "", "bssid": "", "delta": 0}
+        self.message = check_format(spec.get("message", f"{self.name}: {{essid}} - {{delta}} pkt"), sample, where)
+
+
+class Indicator:
+    KEYS = ("name", "when", "points", "label", "enabled")
+
+    def __init__(self, spec, params, vector):
+        where = f"evil_twin/{spec.get('name', '?') if isinstance(spec, dict) else '?'}"
+        check_keys(spec, self.KEYS, where)
+        self.name = str(spec.get("name") or "")
+        if not self.name:
+            raise ValueError(f"{where}: falta 'name'")
+        self.enabled = bool(spec.get("enabled", True))
+        self.when = Expression(spec.get("when"), GROUP_FEATURES, params, vector, where)
+        self.points = Expression(spec.get("points", 1), GROUP_FEATURES, params, vector, where + "/points")
+        self.label = check_format(str(spec.get("label", self.name)), dict.fromkeys(GROUP_FEATURES, 0), where)
+
+
+class Level:
+    KEYS = ("min_score", "alert", "severity", "confidence", "message")
+
+    def __init__(self, spec):
+        where = f"evil_twin/levels/{spec.get('alert', '?') if isinstance(spec, dict) else '?'}"
+        check_keys(spec, self.KEYS, where)
+        if "min_score" not in spec or "alert" not in spec:
+            raise ValueError(f"{where}: faltan 'min_score' o 'alert'")
+        self.min_score = float(spec["min_score"])
+        self.alert = str(spec["alert"])
+        self.severity = severity_of(spec, where)
+        self.confidence = str(spec.get("confidence", "medium"))
+        sample = dict.fromkeys(GROUP_FEATURES, 0) | {"essid": "", "indicators": "", "score": 0}
+        self.message = check_format(spec.get("message", f"{self.alert}: '{{essid}}' - {{indicators}}"),
+                                    sample, where)
+
+
+class RuleSet:
+    """
+    Reglas compiladas de un fichero para un detector de tráfico. classify()
+    y score_groups() reciben columnas (arrays de NumPy o listas, ver
+    column()) y registran coste y aciertos de cada regla en `counters`.
+    """
+
+    def __init__(self, spec, detector="mean", params=None, vector=None, counters=None, observe=None):
+        vector = np is not None if vector is None else vector
+        if vector and np is None:
+            raise ValueError("evaluación vectorial sin NumPy")
+        check_keys(spec, ("params", "traffic", "evil_twin"), "reglas")
+        merged = dict(DEFAULT_PARAMS, **(params or {}))
+        for name, value in (spec.get("params") or {}).items():
+            if not str(name).isidentifier() or name in TRAFFIC_FEATURES + GROUP_FEATURES + tuple(FUNCTIONS):
+                raise ValueError(f"params: nombre no válido '{name}'")
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"params: '{name}' debe ser numérico")
+            merged[name] = value
+        self.params = merged
+        self.detector = detector
+        self.vector = vector
+        self.counters = {} if counters is None else counters  # regla -> [evaluaciones, filas, aciertos, s]
+        self.observe = observe
+
+        rules = [TrafficRule(r, merged, vector) for r in spec.get("traffic") or ()]
+        names = [r.name for r in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("traffic: nombres de regla repetidos")
+        self.traffic = [r for r in rules if r.enabled and detector in r.detectors]
+        self.needs = {a for r in self.traffic for a in r.when.args}
+        cooldowns = [0.0] + [r.cooldown for r in self.traffic]  # índice = código (0 = sin alerta)
+        self.cooldowns = np.array(cooldowns) if vector else cooldowns
+
+        group = spec.get("evil_twin") or {}
+        check_keys(group, ("suspicious_names", "indicators", "levels"), "evil_twin")
+        self.suspicious_names = tuple(str(n).lower() for n in group.get("suspicious_names", ()))
+        indicators = [Indicator(i, merged, vector) for i in group.get("indicators") or ()]
+        if len({i.name for i in indicators}) != len(indicators):
+            raise ValueError("evil_twin: nombres de indicador repetidos")
+        self.indicators = [i for i in indicators if i.enabled]
+        self.levels = sorted((Level(lv) for lv in group.get("levels") or ()), key=lambda lv: -lv.min_score)
+        self.dry_run(rules, indicators)
+
+    def dry_run(self, rules, indicators):
+        """
+        Evalúa cada expresión (también las desactivadas) sobre dos filas de
+        prueba: un error de ejecución se rechaza al cargar, no en cada tick.
+        """
+        expressions = [(r.when, TRAFFIC_FEATURES) for r in rules]
+        expressions += [(e, GROUP_FEATURES) for i in indicators for e in (i.when, i.points)]
+        for expr, features in expressions:
+            columns = {name: self.column([0.0, 1.0]) for name in features}
+            try:
+                if self.vector:
+                    with np.errstate(all="ignore"):
+                        expr.mask(columns, 2)
+                        expr.values(columns, 2)
+                else:
+                    for i in (0, 1):
+                        float(expr.row(columns, i))
+            except Exception as e:
+                raise ValueError(f"{expr.where}: '{expr.text}' falla al evaluarse: {e}") from None
+
+    def names(self):
+        return [("traffic", r.name) for r in self.traffic] + [("evil_twin", i.name) for i in self.indicators]
+
+    def column(self, values):
+        return np.asarray(values) if self.vector else list(values)
+
+    def record(self, name, rows, matches, seconds):
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = [0, 0, 0, 0.0]
+        counter[0] += 1
+        counter[1] += rows
+        counter[2] += matches
+        counter[3] += seconds
+        if self.observe is not None:
+            self.observe(name, seconds, matches)
+
+    # ---------------- tráfico ----------------
+    def classify(self, columns, n):
+        """Código por AP: 1 + índice de la primera regla de self.traffic que se cumple, 0 si ninguna."""
+        if not self.vector:
+            return self.classify_rows(columns, n)
+        codes = np.zeros(n, dtype=np.intp)
+        undecided = np.ones(n, dtype=bool)
+        with np.errstate(all="ignore"):
+            for code, rule in enumerate(self.traffic, 1):
+                t0 = time.perf_counter()
+                hit = rule.when.mask(columns, n)
+                hit &= undecided
+                codes[hit] = code
+                undecided &= ~hit
+                self.record(rule.name, n, int(np.count_nonzero(hit)), time.perf_counter() - t0)
+        return codes
+
+    def classify_rows(self, columns, n):
+        codes = [0] * n
+        pending = range(n)
+        for code, rule in enumerate(self.traffic, 1):
+            t0 = time.perf_counter()
+            row = rule.when.row
+            hits = [i for i in pending if row(columns, i)]
+            for i in hits:
+                codes[i] = code
+            rows = len(pending)
+            if hits:
+                hit = set(hits)
+                pending = [i for i in pending if i not in hit]
+            self.record(rule.name, rows, len(hits), time.perf_counter() - t0)
+        return codes
+
+    # ---------------- grupos (evil twin) ----------------
+    def score_groups(self, columns, n):
+        """(puntuación por grupo, [aciertos de cada indicador por grupo])."""
+        hits = []
+        if self.vector:
+            scores = np.zeros(n)
+            with np.errstate(all="ignore"):
+                for ind in self.indicators:
+                    t0 = time.perf_counter()
+                    hit = ind.when.mask(columns, n)
+                    scores += np.where(hit, ind.points.values(columns, n), 0.0)
+                    hits.append(hit.tolist())
+                    self.record(ind.name, n, int(np.count_nonzero(hit)), time.perf_counter() - t0)
+            return scores.tolist(), hits
+        scores = [0] * n
+        for ind in self.indicators:
+            t0 = time.perf_counter()
+            hit = [bool(ind.when.row(columns, i)) for i in range(n)]
+            for i in range(n):
+                if hit[i]:
+                    scores[i] += ind.points.row(columns, i)
+            hits.append(hit)
+            self.record(ind.name, n, sum(hit), time.perf_counter() - t0)
+        return scores, hits
+
+    def level(self, score):
+        for level in self.levels:
+            if score >= level.min_score:
+                return level
+        return None
+
+
+def load_spec(path):
+    """Lee un fichero de reglas: YAML si la extensión lo es (requiere PyYAML), si no JSON."""
+    with open(path, encoding="utf-8") as f:
+        if str(path).endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ValueError("reglas en YAML sin PyYAML instalado (pip install pyyaml o usa JSON)")
+            try:
+                return yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                raise ValueError(f"YAML no válido: {e}") from None
+        return json.load(f)
+
+
+# ---------------- recarga en caliente ----------------
+class RuleEngine:
+    """RuleSet activo (`rules`), recarga del fichero si cambia y estadísticas por regla."""
+
+    def __init__(self, path="", detector="mean", params=None, vector=None, observe=None):
+        self.path = path
+        self.detector = detector
+        self.params = dict(params or {})
+        self.vector = vector
+        self.observe = observe
+        self.counters = {}
+        self.signature = ()  # (mtime, tamaño) del fichero leído; None si no existe
+        self.loaded_at = None
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self.rules = self.build(DEFAULT_RULES)
+        self.source = "builtin"
+        if path:
+            self.maybe_reload()
+
+    def build(self, spec):
+        return RuleSet(spec, self.detector, self.params, self.vector, self.counters, self.observe)
+
+    def stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def maybe_reload(self):
+        """Recarga si el fichero cambió. True si hay reglas nuevas activas."""
+        if not self.path:
+            return False
+        signature = self.stat()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        if signature is None:
+            self.fail(f"no existe {self.path}")
+            return False
+        try:
+            rules = self.build(load_spec(self.path))
+        except (OSError, ValueError) as e:
+            self.fail(str(e))
+            return False
+        self.rules = rules
+        self.source = self.path
+        self.loaded_at = time.time()
+        self.reloads += 1
+        self.last_error = None
+        # Solo se conservan contadores de reglas vigentes
+        current = {name for _, name in rules.names()}
+        for name in [n for n in self.counters if n not in current]:
+            del self.counters[name]
+        logger.info(f"[rules] 📐 Reglas cargadas de {self.path}: {len(rules.traffic)} de tráfico, "
+                    f"{len(rules.indicators)} indicadores de evil twin")
+        return True
+
+    def fail(self, error):
+        self.errors += 1
+        self.last_error = error
+        logger.error(f"[rules] ❌ Reglas no válidas, se mantienen las de {self.source}: {error}")
+
+    def stats(self):
+        rules = []
+        for kind, name in self.rules.names():
+            evaluations, rows, matches, seconds = self.counters.get(name, (0, 0, 0, 0.0))
+            rules.append({
+                "name": name,
+                "kind": kind,
+                "evaluations": evaluations,
+                "rows": rows,
+                "matches": matches,
+                "seconds": round(seconds, 6),
+                "ns_per_row": round(seconds * 1e9 / rows, 1) if rows else None,
+            })
+        return {
+            "source": self.source,
+            "detector": self.detector,
+            "vector": self.rules.vector,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "rules": rules,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reglas de detección de Black Swan")
+    parser.add_argument("--dump", action="store_true", help="imprime las reglas por defecto")
+    parser.add_argument("--yaml", action="store_true", help="con --dump, en YAML")
+    parser.add_argument("--check", metavar="FICHERO", help="valida un fichero de reglas")
+    parser.add_argument("--detector", default="mean", choices=DETECTORS)
+    args = parser.parse_args()
+    if args.check:
+        try:
+            ruleset = RuleSet(load_spec(args.check), args.detector)
+        except (OSError, ValueError) as e:
+            sys.exit(f"❌ {args.check}: {e}")
+        for kind, name in ruleset.names():
+            print(f"✅ {kind}/{name}")
+    else:
+        spec = copy.deepcopy(DEFAULT_RULES)
+        if args.yaml:
+            if yaml is None:
+                sys.exit("❌ PyYAML no instalado")
+            print(yaml.safe_dump(spec, allow_unicode=True, sort_keys=False), end="")
+        else:
+            print(json.dumps(spec, ensure_ascii=False, indent=2))
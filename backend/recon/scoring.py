@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - scoring.py
+Scoring de tráfico por lotes con NumPy: el estado de todos los APs vive en
+columnas (contador anterior, anillo de 8 muestras, EWMA, cooldown...) y cada
+tick se puntúan todos a la vez en lugar de llamar a una función por AP.
+
+Detectores (baseline y z que ven las reglas de tráfico de rules.py):
+  mean  media de las últimas 8 muestras (z = 0: las reglas usan múltiplos)
+  ewma  media y varianza exponenciales; z-score
+  mad   mediana y MAD de las 8 muestras; z-score robusto a picos previos
+
+measure() actualiza el estado y devuelve las columnas del tick; las reglas
+deciden el código de cada AP y fire() aplica el cooldown de cada regla.
+
+Expulsión TTL/LRU y checkpoint en JSON compatibles con ap_state.APStateStore.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+from ap_state import BASELINE_SIZE, STATE_VERSION
+
+DETECTORS = ("mean", "ewma", "mad")
+COLUMNS = ("last_data", "samples", "n_samples", "pos", "ewma_mean", "ewma_var",
+           "last_alert", "alert_count", "last_seen")
+
+
+def masked_median(values, valid, n):
+    """Mediana por fila de las n primeras posiciones válidas (n >= 1; 0 si n == 0)."""
+    big = np.iinfo(np.int64).max if values.dtype.kind == "i" else np.inf
+    ordered = np.sort(np.where(valid, values, big), axis=1)
+    rows = np.arange(len(values))
+    lo = np.maximum(n - 1, 0) // 2
+    median = (ordered[rows, lo] + ordered[rows, n // 2]) / 2.0
+    return np.where(n > 0, median, 0.0)
+
+
+class BatchScorer:
+    def __init__(self, ttl=3600.0, max_entries=0, detector="mean", ewma_alpha=0.3, capacity=1024):
+        if detector not in DETECTORS:
+            raise ValueError(f"detector desconocido: {detector}")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.detector = detector
+        self.ewma_alpha = ewma_alpha
+        self.evicted = 0
+        self.slots = {}  # bssid -> fila
+        self.keys = []  # fila -> bssid (None si está libre)
+        self.free = []
+        self.allocate(capacity)
+
+    # ---------------- columnas ----------------
+    def allocate(self, capacity):
+        self.last_data = np.full(capacity, -1, dtype=np.int64)
+        self.samples = np.zeros((capacity, BASELINE_SIZE), dtype=np.int64)
+        self.n_samples = np.zeros(capacity, dtype=np.int8)
+        self.pos = np.zeros(capacity, dtype=np.int8)
+        self.ewma_mean = np.zeros(capacity, dtype=np.float64)
+        self.ewma_var = np.zeros(capacity, dtype=np.float64)
+        self.last_alert = np.zeros(capacity, dtype=np.float64)
+        self.alert_count = np.zeros(capacity, dtype=np.int32)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.keys = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def grow(self):
+        old = len(self.keys)
+        new = old * 2
+        for name in COLUMNS:
+            col = getattr(self, name)
+            grown = np.zeros((new,) + col.shape[1:], dtype=col.dtype)
+            grown[:old] = col
+            setattr(self, name, grown)
+        self.last_data[old:] = -1
+        self.keys.extend([None] * (new - old))
+        self.free.extend(range(new - 1, old - 1, -1))
+
+    def slot(self, bssid, now):
+        row = self.slots.get(bssid)
+        if row is None:
+            if not self.free:
+                self.grow()
+            row = self.free.pop()
+            self.slots[bssid] = row
+            self.keys[row] = bssid
+            self.reset(row, now)
+        return row
+
+    def reset(self, row, now):
+        self.last_data[row] = -1
+        self.samples[row] = 0
+        self.n_samples[row] = 0
+        self.pos[row] = 0
+        self.ewma_mean[row] = 0.0
+        self.ewma_var[row] = 0.0
+        self.last_alert[row] = 0.0
+        self.alert_count[row] = 0
+        self.last_seen[row] = now
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, bssid):
+        return bssid in self.slots
+
+    # ---------------- scoring ----------------
+    def measure(self, bssids, counters, now):
+        """
+        Mide un tick. Devuelve las filas de los APs y sus columnas (alineadas
+        con `bssids`) para rules.RuleSet.classify(): delta, baseline,
+        has_baseline, samples (muestras previas) y z.
+        """
+        slot = self.slot
+        idx = np.fromiter((slot(b, now) for b in bssids), dtype=np.intp, count=len(bssids))
+        current = np.asarray(counters, dtype=np.int64)
+
+        # delta desde la lectura anterior (la primera lectura solo fija el contador)
+        last = self.last_data[idx]
+        delta = np.where(last >= 0, current - last, 0)
+        np.maximum(delta, 0, out=delta)
+        self.last_data[idx] = current
+        self.last_seen[idx] = now
+
+        # baseline con las muestras previas (antes de añadir la actual)
+        n = self.n_samples[idx].astype(np.int64)
+        has_base = n >= 3
+        samples = self.samples[idx]
+        z = np.zeros(len(idx))
+        if self.detector == "mean":
+            baseline = np.where(has_base, samples.sum(axis=1) / np.maximum(n, 1), 0.0)
+        else:
+            if self.detector == "ewma":
+                baseline = self.ewma_mean[idx]
+                spread = np.sqrt(self.ewma_var[idx])
+            else:
+                valid = np.arange(BASELINE_SIZE) < n[:, None]
+                baseline = masked_median(samples, valid, n)
+                spread = masked_median(np.abs(samples - baseline[:, None]), valid, n) / 0.6745
+            baseline = np.where(has_base, baseline, 0.0)
+            # con 3-8 muestras la dispersión puede salir casi 0: mínimo del 10% del baseline
+            spread = np.maximum(spread, np.maximum(0.1 * baseline, 1.0))
+            z = np.where(has_base, (delta - baseline) / spread, 0.0)
+
+        self.add_samples(idx, delta)
+        return idx, {"delta": delta, "baseline": baseline, "has_baseline": has_base, "samples": n, "z": z}
+
+    def fire(self, idx, codes, cooldowns, now):
+        """
+        Anti-spam: anula los códigos (0 = nada) de los APs que alertaron hace
+        menos que el cooldown de su regla (cooldowns[código]) y apunta el resto.
+        """
+        cooling = (codes > 0) & (now - self.last_alert[idx] < cooldowns[codes])
+        codes[cooling] = 0
+        fired = idx[codes != 0]
+        self.last_alert[fired] = now
+        self.alert_count[fired] += 1
+        return codes
+
+    def add_samples(self, idx, delta):
+        """Añade los deltas > 0 al anillo y a la EWMA de cada AP."""
+        positive = delta > 0
+        rows = idx[positive]
+        if not len(rows):
+            return
+        values = delta[positive]
+        pos = self.pos[rows].astype(np.intp)
+        self.samples[rows, pos] = values
+        self.pos[rows] = (pos + 1) % BASELINE_SIZE
+        first = self.n_samples[rows] == 0
+        self.n_samples[rows] = np.minimum(self.n_samples[rows] + 1, BASELINE_SIZE)
+
+        a = self.ewma_alpha
+        mean = self.ewma_mean[rows]
+        diff = values - mean
+        self.ewma_mean[rows] = np.where(first, values, mean + a * diff)
+        self.ewma_var[rows] = np.where(first, 0.0, (1 - a) * (self.ewma_var[rows] + a * diff * diff))
+
+    # ---------------- expulsión ----------------
+    def release(self, rows):
+        for row in rows:
+            del self.slots[self.keys[row]]
+            self.keys[row] = None
+            self.free.append(row)
+
+    def evict(self, now):
+        """Expulsa por TTL y por tamaño máximo (los menos vistos). Devuelve cuántos."""
+        if not self.slots:
+            return 0
+        active = np.fromiter(self.slots.values(), dtype=np.intp, count=len(self.slots))
+        removed = 0
+        if self.ttl > 0:
+            stale = active[self.last_seen[active] < now - self.ttl]
+            self.release(stale.tolist())
+            removed += len(stale)
+            active = active[self.last_seen[active] >= now - self.ttl]
+        excess = len(active) - self.max_entries
+        if self.max_entries > 0 and excess > 0:
+            oldest = active[np.argsort(self.last_seen[active], kind="stable")[:excess]]
+            self.release(oldest.tolist())
+            removed += excess
+        self.evicted += removed
+        return removed
+
+    def clear(self):
+        self.slots.clear()
+        self.allocate(len(self.keys))
+
+    def reset_counters(self, bssids=None, value=0):
+        """Como APStateStore.reset_counters (las filas libres siguen a -1)."""
+        if bssids is None:
+            counted = (self.last_data > value).nonzero()[0]
+        else:
+            rows = np.fromiter((self.slots[b] for b in bssids if b in self.slots), dtype=np.intp)
+            counted = rows[self.last_data[rows] > value]
+        self.last_data[counted] = value
+        return len(counted)
+
+    # ---------------- persistencia (formato de APStateStore) ----------------
+    def save(self, path, now):
+        path = str(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        rows = sorted(self.slots.items(), key=lambda item: self.last_seen[item[1]])
+        data = {
+            "version": STATE_VERSION,
+            "saved_at": now,
+            "aps": [
+                [bssid, int(self.last_data[r]), self.samples[r].tolist(), int(self.n_samples[r]),
+                 int(self.pos[r]), float(self.last_alert[r]), int(self.alert_count[r]),
+                 float(self.last_seen[r]), float(self.ewma_mean[r]), float(self.ewma_var[r])]
+                for bssid, r in rows
+            ],
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+        return len(rows)
+
+    def load(self, path, now, max_age):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"versión de estado {data.get('version')} no soportada")
+        loaded = stale = 0
+        for entry in data["aps"]:
+            bssid, last_data, samples, n_samples, pos, last_alert, alert_count, last_seen = entry[:8]
+            if len(samples) != BASELINE_SIZE:
+                raise ValueError("tamaño de baseline distinto")
+            if max_age > 0 and now - last_seen > max_age:
+                stale += 1
+                continue
+            row = self.slot(bssid, last_seen)
+            self.last_data[row] = last_data
+            self.samples[row] = samples
+            self.n_samples[row] = n_samples
+            self.pos[row] = pos
+            self.last_alert[row] = last_alert
+            self.alert_count[row] = alert_count
+            if len(entry) >= 10:
+                self.ewma_mean[row], self.ewma_var[row] = entry[8], entry[9]
+            else:
+                valid = samples[:n_samples]
+                self.ewma_mean[row] = sum(valid) / len(valid) if valid else 0.0
+            loaded += 1
+        return loaded, stale
+
+    # ---------------- memoria ----------------
+    def memory_bytes(self):
+        total = sum(getattr(self, name).nbytes for name in COLUMNS)
+        total += sys.getsizeof(self.slots) + sys.getsizeof(self.keys) + sys.getsizeof(self.free)
+        total += sum(map(sys.getsizeof, list(self.slots)))  # copia: el productor puede estar en otro hilo
+        return total
+
+    def stats(self):
+        return {
+            "entries": len(self.slots),
+            "capacity": len(self.keys),
+            "evicted": self.evicted,
+            "memory_bytes": self.memory_bytes(),
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+            "detector": self.detector,
+        }
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - sensors.py
+Varios sensores (radios locales o directorios de CSV sincronizados desde nodos
+remotos) fusionados por BSSID.
+
+Formato de SENSORS (separado por comas):
+  wlan1                   interfaz local (lanza su propio airodump-ng)
+  techo=iface:wlan2       interfaz local con nombre
+  norte=dir:/srv/norte    directorio con CSV de airodump (rsync, NFS...)
+  /srv/sur                directorio (nombre = último componente)
+
+Cada sensor se parsea por separado (en secuencia, en el hilo del productor:
+el coste del tick crece con el número de sensores) y merge_readings() combina
+las observaciones: por AP se guarda la potencia/canal/contador de cada sensor y los
+campos de nivel superior salen del sensor con mejor señal. Los contadores de
+datos de radios distintas no se suman (cuentan las mismas tramas): se toma el
+mayor para que el delta de tráfico siga siendo monótono.
+"""
+
+import logging
+import os
+import time
+from collections import namedtuple
+from pathlib import Path
+
+logger = logging.getLogger("blackswan")
+
+# Lectura de un sensor en un tick: APs y estaciones en el formato del parser
+SensorReading = namedtuple("SensorReading", ["sensor", "aps", "stations", "path"])
+
+
+def signal_rank(power):
+    """airodump pone -1 (o >= 0) cuando el driver no da potencia: cuenta como la peor."""
+    return power if power < -1 else -100
+
+
+class Sensor:
+    def __init__(self, name, interface=None, directory=None, prefix=None, pattern="*.csv"):
+        self.name = name
+        self.interface = interface
+        if interface:
+            # Cada radio escribe con su propio prefijo: <prefix>-NN.csv
+            self.directory = Path(prefix).parent
+            self.pattern = Path(prefix).name + "-*.csv"
+            self.prefix = prefix
+        else:
+            self.directory = Path(directory)
+            self.pattern = pattern
+            self.prefix = None
+        self.capture = None  # supervisor de su airodump-ng (capture.CaptureSupervisor), solo interfaces
+        self.path = None
+        self.mtime = 0.0
+        self.stale = False
+        self.aps = 0
+        self.stations = 0
+
+    @property
+    def kind(self):
+        return "iface" if self.interface else "dir"
+
+    def find_csv(self, max_age=0):
+        """CSV más reciente del sensor, o None si no hay o lleva más de max_age s sin cambiar."""
+        newest, newest_mtime = None, 0.0
+        try:
+            # con supervisor se conoce el fichero activo; un directorio hay que recorrerlo
+            candidates = self.directory.glob(self.pattern) if self.capture is None else [self.capture.active_path]
+            for p in filter(None, candidates):
+                try:
+                    mtime = p.stat().st_mtime
+                except OSError:
+                    continue
+                if mtime > newest_mtime:
+                    newest, newest_mtime = p, mtime
+        except OSError as e:
+            logger.debug(f"[sensors] {self.name}: {e}")
+        self.path, self.mtime = newest, newest_mtime
+
+        stale = newest is not None and max_age > 0 and time.time() - newest_mtime > max_age
+        if stale != self.stale:
+            self.stale = stale
+            if stale:
+                logger.warning(f"[sensors] ⚠️ {self.name}: sin datos nuevos desde hace "
+                               f"{time.time() - newest_mtime:.0f}s, se ignora")
+            else:
+                logger.info(f"[sensors] ✅ {self.name}: vuelve a recibir datos")
+        return None if stale else newest
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "source": self.interface or str(self.directory),
+            "path": str(self.path) if self.path else None,
+            "last_update": self.mtime or None,
+            "stale": self.stale,
+            "aps": self.aps,
+            "stations": self.stations,
+        }
+
+
+def parse_sensors(spec, csv_prefix):
+    """Convierte el valor de SENSORS en una lista de Sensor (nombres únicos)."""
+    sensors = []
+    for token in spec.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        name, _, value = token.rpartition("=")
+        kind, sep, target = value.partition(":")
+        if not sep:
+            kind, target = ("dir" if "/" in value else "iface"), value
+        if kind not in ("iface", "dir") or not target:
+            raise ValueError(f"sensor no válido: {token!r} (usa nombre=iface:wlan1 o nombre=dir:/ruta)")
+        if kind == "iface":
+            sensor = Sensor(name or target, interface=target, prefix=f"{csv_prefix}_{target}")
+        else:
+            sensor = Sensor(name or Path(target).name or target, directory=os.path.expanduser(target))
+        if any(s.name == sensor.name for s in sensors):
+            raise ValueError(f"sensor duplicado: {sensor.name}")
+        sensors.append(sensor)
+    return sensors
+
+
+def merge_readings(readings):
+    """
+    Fusiona las lecturas por BSSID. Devuelve (aps_map, stations) listo para
+    finalize_aps y update_station_index. Modifica en sitio los dicts de la
+    primera lectura que ve cada AP (las lecturas son de un solo uso).
+    """
+    aps_map = {}
+    best_station = {}  # mac -> (mac, power, bssid, probes) del sensor que mejor la oye
+    for reading in readings:
+        name = reading.sensor
+        for ap in reading.aps:
+            key = ap["bssid"].lower()
+            seen = {"power": ap["power"], "channel": ap["channel"], "data": ap["data"]}
+            merged = aps_map.get(key)
+            if merged is None:
+                ap["sensors"] = {name: seen}
+                ap["best_sensor"] = name
+                aps_map[key] = ap
+                continue
+
+            merged["sensors"][name] = seen
+            if signal_rank(ap["power"]) > signal_rank(merged["power"]):
+                merged["power"] = ap["power"]
+                merged["channel"] = ap["channel"]
+                merged["privacy"] = ap["privacy"]
+                merged["best_sensor"] = name
+                if ap["essid"] != "Oculto":
+                    merged["essid"] = ap["essid"]
+            elif merged["essid"] == "Oculto":
+                merged["essid"] = ap["essid"]
+            merged["data"] = max(merged["data"], ap["data"])
+
+            clients = {c["mac"].lower(): c for c in merged["clients"]}
+            for client in ap["clients"]:
+                prev = clients.get(client["mac"].lower())
+                if prev is None:
+                    merged["clients"].append(client)
+                elif signal_rank(client["power"]) > signal_rank(prev["power"]):
+                    prev["power"] = client["power"]
+
+        for row in reading.stations:
+            mac = row[0].lower()
+            prev = best_station.get(mac)
+            if prev is None:
+                best_station[mac] = row
+                continue
+            # asociación del sensor que mejor la oye; si ese no la ve asociada, la de otro
+            if signal_rank(row[1]) > signal_rank(prev[1]):
+                best, other = row, prev
+            else:
+                best, other = prev, row
+            bssid = best[2] or other[2]
+            # probes de todos los sensores (ProbeIndex quita los repetidos)
+            probes = best[3] if not other[3] or other[3] == best[3] else best[3] + "," + other[3]
+            best_station[mac] = (best[0], best[1], bssid, probes)
+
+    return aps_map, list(best_station.values())
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - subscriptions.py
+Suscripciones con filtro por cliente servidas mediante rooms de Socket.IO.
+
+Un cliente envía 'subscribe' con un filtro:
+  channels      ["1", "6", 11]           canales
+  bssids        ["AA:BB:..."]            BSSIDs concretos
+  essid         ["Corp*", "*guest*"]     patrones glob (sin distinguir mayúsculas)
+  min_power     -70                      potencia mínima (dBm)
+  privacy       ["OPN", "WEP"]           cifrado (cualquiera de los tokens)
+  flagged       true                     solo APs marcados (evil twin, tráfico, alertas)
+  min_severity  "high"                   low | medium | high | critical
+  alerts_only   true                     sin APs, solo alertas
+
+Los filtros se normalizan, así que clientes con el mismo filtro comparten una
+única Subscription (y una room): el payload filtrado y su delta se calculan una
+vez por filtro distinto y tick, no por cliente. Cada Subscription lleva su
+propia cadena seq/prev_seq y su propio estado de delta.
+
+Las alertas pasan si cumplen la severidad y, si el filtro restringe APs, si
+mencionan alguno de los APs que pasan el filtro (aunque con alerts_only no se
+envíen los APs).
+"""
+
+import fnmatch
+import hashlib
+import json
+import re
+
+ALL_ROOM = "all"  # clientes sin filtro: reciben el mundo completo
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+FILTER_KEYS = ("channels", "bssids", "essid", "min_power", "privacy", "flagged", "min_severity", "alerts_only")
+
+
+def is_flagged(ap):
+    return bool(ap.get("possible_evil_twin") or ap.get("data_flag", "normal") != "normal" or ap.get("alerts"))
+
+
+def as_list(value, name):
+    if value is None:
+        return []
+    if isinstance(value, (str, int)):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    raise ValueError(f"{name} debe ser una lista")
+
+
+class Filter:
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise ValueError("el filtro debe ser un objeto")
+        unknown = set(spec) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"campos de filtro desconocidos: {', '.join(sorted(unknown))}")
+
+        self.channels = frozenset(str(c).strip() for c in as_list(spec.get("channels"), "channels"))
+        self.bssids = frozenset(str(b).strip().lower() for b in as_list(spec.get("bssids"), "bssids"))
+        patterns = sorted({str(p) for p in as_list(spec.get("essid"), "essid") if str(p)})
+        self.essid_re = re.compile("|".join(fnmatch.translate(p) for p in patterns), re.IGNORECASE) if patterns else None
+        min_power = spec.get("min_power")
+        try:
+            self.min_power = int(min_power) if min_power is not None else None
+        except (TypeError, ValueError):
+            raise ValueError("min_power debe ser un entero (dBm)")
+        self.privacy = frozenset(str(p).strip().upper() for p in as_list(spec.get("privacy"), "privacy"))
+        self.flagged = bool(spec.get("flagged", False))
+        severity = spec.get("min_severity")
+        if severity is not None and severity not in SEVERITY_RANK:
+            raise ValueError(f"min_severity debe ser uno de {', '.join(SEVERITY_RANK)}")
+        self.min_rank = SEVERITY_RANK.get(severity, 0)
+        self.alerts_only = bool(spec.get("alerts_only", False))
+
+        # Forma canónica: mismo filtro escrito distinto -> misma room
+        self.spec = {
+            "channels": sorted(self.channels),
+            "bssids": sorted(self.bssids),
+            "essid": patterns,
+            "min_power": self.min_power,
+            "privacy": sorted(self.privacy),
+            "flagged": self.flagged,
+            "min_severity": severity,
+            "alerts_only": self.alerts_only,
+        }
+        self.key = json.dumps(self.spec, sort_keys=True)
+        self.room = "sub:" + hashlib.sha1(self.key.encode()).hexdigest()[:12]
+        self.filters_aps = bool(self.channels or self.bssids or self.essid_re or self.min_power is not None
+                                or self.privacy or self.flagged)
+
+    def match_ap(self, ap):
+        if self.channels and str(ap.get("channel", "")).strip() not in self.channels:
+            return False
+        if self.bssids and ap["bssid"].lower() not in self.bssids:
+            return False
+        if self.essid_re is not None and not self.essid_re.match(ap.get("essid", "")):
+            return False
+        if self.min_power is not None:
+            power = ap.get("power", -100)
+            # airodump usa -1 (o >= 0) para "sin dato": no cumple ningún mínimo
+            if power >= -1 or power < self.min_power:
+                return False
+        if self.privacy and self.privacy.isdisjoint(str(ap.get("privacy", "")).upper().split()):
+            return False
+        if self.flagged and not is_flagged(ap):
+            return False
+        return True
+
+    def match_alert(self, alert, visible):
+        if SEVERITY_RANK.get(alert.get("severity"), 0) < self.min_rank:
+            return False
+        if not self.filters_aps:
+            return True
+        bssids = alert.get("bssids") or ([alert["bssid"]] if alert.get("bssid") else [])
+        return any(b.lower() in visible for b in bssids)
+
+    def narrow(self, snap):
+        """Snapshot con solo lo que ve este filtro (mismo seq/timestamp)."""
+        aps = [ap for ap in snap.aps if self.match_ap(ap)] if self.filters_aps else list(snap.aps)
+        visible = {ap["bssid"].lower() for ap in aps} if self.filters_aps else None
+        alerts = [a for a in snap.alerts if self.match_alert(a, visible)]
+        if self.alerts_only:
+            aps = []
+        return snap._replace(
+            aps=tuple(aps),
+            alerts=tuple(alerts),
+            total_clients=sum(len(ap["clients"]) for ap in aps),
+        )
+
+
+class Subscription:
+    def __init__(self, flt):
+        self.filter = flt
+        self.members = set()  # sids
+        self.state = {}  # estado de delta propio (bssid -> AP emitido)
+        self.last_seq = 0
+
+
+class SubscriptionManager:
+    """
+    `diff(snap, state, prev_seq, cache)` es el cálculo de wifi_delta del
+    productor; `cache` son los cambios ya calculados para el stream completo.
+    No es thread-safe: se usa siempre desde el hilo del productor.
+    """
+
+    def __init__(self, diff):
+        self.diff = diff
+        self.subs = {}  # clave canónica -> Subscription
+        self.by_sid = {}
+
+    def __len__(self):
+        return len(self.subs)
+
+    def get(self, sid):
+        return self.by_sid.get(sid)
+
+    def subscribe(self, sid, spec, snap, cache=None):
+        """Alta (o cambio de filtro) de un cliente. Devuelve (sub, room anterior, snapshot base)."""
+        flt = Filter(spec)  # ValueError si no es válido
+        previous = self.unsubscribe(sid)
+        sub = self.subs.get(flt.key)
+        if sub is None:
+            sub = self.subs[flt.key] = Subscription(flt)
+            # la nueva cadena arranca en el snapshot actual, que es la base del cliente
+            _, sub.state = self.diff(flt.narrow(snap), {}, 0, cache)
+            sub.last_seq = snap.seq
+        sub.members.add(sid)
+        self.by_sid[sid] = sub
+        return sub, previous, flt.narrow(snap)
+
+    def unsubscribe(self, sid):
+        """Baja de un cliente. Devuelve la room que deja (o ALL_ROOM si no tenía filtro)."""
+        sub = self.by_sid.pop(sid, None)
+        if sub is None:
+            return ALL_ROOM
+        sub.members.discard(sid)
+        if not sub.members:
+            del self.subs[sub.filter.key]
+        return sub.filter.room
+
+    def tick(self, snap, cache=None):
+        """Deltas del tick por filtro distinto: [(room, delta)]."""
+        out = []
+        for sub in self.subs.values():
+            delta, sub.state = self.diff(sub.filter.narrow(snap), sub.state, sub.last_seq, cache)
+            delta["filter"] = sub.filter.spec
+            sub.last_seq = snap.seq
+            out.append((sub.filter.room, delta))
+        return out
+
+    def stats(self):
+        return {
+            "filters": len(self.subs),
+            "clients": len(self.by_sid),
+        }
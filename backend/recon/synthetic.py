@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - synthetic.py
+Generador de CSV sintéticos con el formato de airodump-ng para benchmarks y
+replays: número de APs y estaciones, proporción de ESSIDs duplicados y de
+redes ocultas configurables. Cada tick avanza los contadores como lo haría
+una captura real (y algunos APs tienen picos de tráfico).
+"""
+
+import random
+from pathlib import Path
+
+AP_HEADER = ("BSSID, First time seen, Last time seen, channel, Speed, Privacy, Cipher, "
+             "Authentication, Power, # beacons, # IV, LAN IP, ID-length, ESSID, Key")
+ST_HEADER = "Station MAC, First time seen, Last time seen, Power, # packets, BSSID, Probed ESSIDs"
+
+CHANNELS = (1, 6, 11, 36, 40, 44, 48, 149)
+PRIVACY = ("WPA2", "WPA2", "WPA2", "WPA3 WPA2", "WPA", "OPN", "WEP")
+SHARED_ESSIDS = ("eduroam", "guest", "Free WiFi", "Starbucks", "staff", "hotspot", "CORP")
+
+def mac_from_int(prefix, n):
+    return prefix + ":" + ":".join("%02X" % ((n >> s) & 0xFF) for s in (32, 24, 16, 8, 0))
+
+
+class SyntheticAirodump:
+    """
+    Escena sintética estable (mismos BSSIDs/estaciones en cada tick) cuyo
+    render(tick) produce el CSV que airodump-ng escribiría en ese momento.
+    """
+
+    def __init__(self, n_aps, n_stations, dup_essid_ratio=0.1, hidden_ratio=0.05,
+                 assoc_ratio=0.8, spike_ratio=0.01, seed=0):
+        rnd = random.Random(seed)
+        self.rnd = rnd
+        self.aps = []
+        for i in range(n_aps):
+            roll = rnd.random()
+            if roll < hidden_ratio:
+                essid = ""
+            elif roll < hidden_ratio + dup_essid_ratio:
+                essid = rnd.choice(SHARED_ESSIDS)
+            else:
+                essid = "NET-%06d" % i
+            self.aps.append({
+                "bssid": mac_from_int("AA", i),
+                "essid": essid,
+                "channel": rnd.choice(CHANNELS),
+                "privacy": rnd.choice(PRIVACY),
+                "power": -rnd.randint(20, 95),
+                "rate": rnd.randint(1, 60),  # paquetes por segundo "normales"
+                "spiky": rnd.random() < spike_ratio,
+                "iv": rnd.randint(0, 5000),
+            })
+        self.stations = []
+        for j in range(n_stations):
+            associated = bool(self.aps) and rnd.random() < assoc_ratio
+            self.stations.append({
+                "mac": mac_from_int("02", j),
+                "bssid": rnd.choice(self.aps)["bssid"] if associated else "(not associated) ",
+                "power": -rnd.randint(20, 95),
+                "packets": rnd.randint(1, 500),
+                "probes": rnd.choice(SHARED_ESSIDS) if rnd.random() < 0.3 else "",
+            })
+
+    def render(self, tick=0, interval=30, dwell=None):
+        """
+        CSV del tick `tick` (contadores acumulados a tick * interval segundos).
+        `dwell` (canal -> factor) simula una captura que salta de canal: solo se
+        oyen los APs de esos canales y sus contadores crecen según el factor.
+        """
+        elapsed = tick * interval
+        lines = ["", AP_HEADER]
+        heard = set()
+        for ap in self.aps:
+            factor = 1.0 if dwell is None else dwell.get(ap["channel"], 0.0)
+            if not factor:
+                continue
+            heard.add(ap["bssid"])
+            count = int(ap["rate"] * elapsed * factor)
+            if ap["spiky"]:
+                # contador acumulado: +20000 paquetes en cada tick múltiplo de 7 (pico)
+                count += 20000 * ((tick + 1) // 7)
+            essid = ap["essid"]
+            lines.append(
+                f"{ap['bssid']}, 2024-01-01 10:00:00, 2024-01-01 10:05:00, {ap['channel']}, 54, "
+                f"{ap['privacy']}, CCMP, PSK, {ap['power']}, {count}, {ap['iv']}, "
+                f"0.  0.  0.  0, {len(essid)}, {essid}, "
+            )
+        lines.append("")
+        lines.append(ST_HEADER)
+        for st in self.stations:
+            if dwell is not None and st["bssid"] not in heard and not st["bssid"].startswith("("):
+                continue
+            lines.append(
+                f"{st['mac']}, 2024-01-01 10:00:00, 2024-01-01 10:05:00, {st['power']}, "
+                f"{st['packets'] + tick}, {st['bssid']}, {st['probes']}"
+            )
+        lines.append("")
+        return "\r\n".join(lines)
+
+    def write(self, path, tick=0, interval=30, dwell=None):
+        Path(path).write_text(self.render(tick, interval, dwell), encoding="utf-8")
+        return Path(path)
+
+    def write_session(self, directory, ticks, interval=30, start=1700000000):
+        """Escribe una sesión replayable: <epoch>.csv por tick (ver replay.py)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        return [self.write(directory / f"{start + t * interval}.csv", t, interval) for t in range(ticks)]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Los módulos de backend/recon se importan por nombre (import journal), como en main.py."""
+
+import os
+import sys
+import tempfile
+from collections import deque
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# main.py lee la configuración al importarse: sin disco persistente ni hilo nativo
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="blackswan-tests-"))
+for key in ("HISTORY", "ALERT_JOURNAL", "PERSIST_STATE", "OFFLOAD"):
+    os.environ.setdefault(key, "0")
+os.environ.setdefault("QUIET", "1")
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """main con el estado de detección y de delta limpios (se restaura al acabar)."""
+    import main
+    from ap_state import APStateStore
+    from probes import ProbeIndex
+
+    store = (main.BatchScorer or APStateStore)()
+    for name, value in {
+        "ap_state": store,
+        "station_index": {},
+        "roaming_history": deque(maxlen=500),
+        "probe_index": ProbeIndex(),
+        "essid_groups": {},
+        "karma_bssids": set(),
+        "counter_generation": None,
+        "counter_sources": {},
+        "last_traffic_analysis": 0.0,
+        "current_snapshot": main.current_snapshot._replace(seq=0, aps=(), alerts=()),
+        "delta_state": {},
+        "delta_changes": {},
+        "delta_last_seq": 0,
+        "subscriptions": main.SubscriptionManager(main.diff_snapshot),
+        "virtual_time": 1700000000.0,
+        "sensors": [],
+    }.items():
+        monkeypatch.setattr(main, name, value)
+    return main
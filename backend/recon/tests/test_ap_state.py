@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from ap_state import APStateStore
+
+try:
+    from scoring import BatchScorer
+except ImportError:  # sin NumPy
+    BatchScorer = None
+
+STORES = [APStateStore] + ([BatchScorer] if BatchScorer is not None else [])
+
+
+def deltas(store, counters, now):
+    if isinstance(store, APStateStore):
+        out = []
+        for bssid, value in counters.items():
+            state = store.touch(bssid, now)
+            out.append(max(0, value - state.last_data) if state.last_data >= 0 else 0)
+            state.last_data = value
+        return out
+    _, columns = store.measure(list(counters), list(counters.values()), now)
+    return columns["delta"].tolist()
+
+
+@pytest.mark.parametrize("cls", STORES)
+def test_reset_all_counts_from_zero(cls):
+    store = cls()
+    deltas(store, {"a": 5000, "b": 7000}, 0)
+    assert store.reset_counters() == 2
+    assert deltas(store, {"a": 30, "b": 40}, 30) == [30, 40]
+
+
+@pytest.mark.parametrize("cls", STORES)
+def test_reset_selected_rebaselines_without_delta(cls):
+    store = cls()
+    deltas(store, {"a": 5000, "b": 7000}, 0)
+    # solo "a" venía del sensor relanzado; su contador fusionado sale ahora de otro sensor
+    assert store.reset_counters(["a", "missing"], -1) == 1
+    assert deltas(store, {"a": 4800, "b": 7100}, 30) == [0, 100]
+    assert deltas(store, {"a": 4900, "b": 7200}, 60) == [100, 100]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+ChannelScheduler con reloj falso contra la captura de fake_airodump.py: cada
+tick se escribe el CSV que daría el plan actual (solo se oyen los canales de
+la lista de salto) y se parsea como en el pipeline.
+"""
+
+import pytest
+
+from channels import ChannelPolicy, ChannelScheduler, parse_channels, time_shares, weighted_hops
+from fake_airodump import dwell_from_hops
+from synthetic import CHANNELS, SyntheticAirodump
+
+
+def scene(busy=None, extra=None, n=80, seed=0):
+    """3/4 de los APs en `busy` (y los de `extra`: canal -> nº), el resto repartido."""
+    s = SyntheticAirodump(n, 200, seed=seed)
+    placed = [busy] * (n * 3 // 4 if busy else 0)
+    for channel, count in (extra or {}).items():
+        placed += [channel] * count
+    for i, ap in enumerate(s.aps):
+        ap["channel"] = placed[i] if i < len(placed) else CHANNELS[i % len(CHANNELS)]
+    return s
+
+
+@pytest.fixture
+def capture(pipeline, tmp_path):
+    path = tmp_path / "fake-01.csv"
+
+    def run(s, plan, tick=1):
+        hops = ",".join(map(str, plan.hops))
+        s.write(path, tick=tick, interval=1, dwell=dwell_from_hops(hops, CHANNELS))
+        return pipeline.parse_airodump_csv(path)
+    return run
+
+
+def scheduler(**kwargs):
+    return ChannelScheduler(ChannelPolicy(CHANNELS, max_weight=4), **kwargs)
+
+
+def test_parse_channels_and_weighted_hops():
+    assert parse_channels("1-3, 6,6,11") == (1, 2, 3, 6, 11)
+    hops = weighted_hops({1: 1, 6: 3, 11: 1})
+    assert sorted(hops) == [1, 6, 6, 6, 11]
+    assert all(a != b for a, b in zip(hops, hops[1:]))  # el canal pesado no se agrupa
+
+
+def test_policy_weights_follow_activity_and_keep_the_floor():
+    policy = ChannelPolicy(CHANNELS, max_weight=4)
+    aps = [{"bssid": f"b{i}", "channel": 6, "clients_count_ap": 2} for i in range(30)]
+    plan = policy.plan(policy.score(aps, []))
+    assert plan.weights[6] == 4
+    assert all(plan.weights[c] == 1 for c in CHANNELS if c != 6)
+    assert policy.plan(dict.fromkeys(CHANNELS, 3.0)).weights == dict.fromkeys(CHANNELS, 1)  # 4,4,.. -> 1,1,..
+
+
+def test_busy_channel_gets_more_time_after_min_interval(capture):
+    sched = scheduler(min_interval=120)
+    plan = sched.start(0)
+    busy = scene(busy=6)
+    for now in (10, 60, 110):
+        assert sched.update(capture(busy, sched.current, now), [], now) is None
+    assert sched.skipped["rate_limited"] == 3
+    plan = sched.update(capture(busy, sched.current, 130), [], 130)
+    assert plan is not None and plan.weights[6] == 4
+    assert time_shares(plan)[6] > time_shares(sched.policy.plan(dict.fromkeys(CHANNELS, 0.0)))[6]
+    # Con el plan nuevo la captura oye más el canal 6, pero el reparto ya es ese: no se relanza
+    for now in (300, 500):
+        assert sched.update(capture(busy, sched.current, now), [], now) is None
+    assert len(sched.changes) == 1
+
+
+def test_small_changes_stay_below_the_threshold(capture):
+    sched = scheduler(min_interval=0, threshold=0.2)
+    sched.start(0)
+    assert sched.update(capture(scene(busy=6, n=100), sched.current, 1), [], 1) is not None
+    before = sched.current
+    # algo de actividad nueva en el 1: cambia un peso, pero poco tiempo de captura
+    shifted = scene(busy=6, extra={1: 20}, n=100)
+    for now in range(2, 8):
+        assert sched.update(capture(shifted, sched.current, now), [], now) is None
+    assert sched.current is before
+    assert sched.skipped["small"] > 0
+
+
+def test_hourly_cap(capture):
+    sched = scheduler(min_interval=10, max_per_hour=2, alpha=1.0)
+    sched.start(0)
+    scenes = [scene(busy=1), scene(busy=11)]
+    retunes = [now for i, now in enumerate(range(100, 1100, 100))
+               if sched.update(capture(scenes[i % 2], sched.current, now), [], now) is not None]
+    assert retunes == [100, 200]
+    assert sched.skipped["hourly_cap"] > 0
+    # el relanzamiento de t=100 sale de la ventana de una hora
+    assert sched.update(capture(scenes[0], sched.current, 3750), [], 3750) is not None
+
+
+def test_critical_alert_on_underweighted_channel_is_urgent(capture):
+    sched = scheduler(min_interval=120, urgent_interval=30)
+    sched.start(0)
+    busy = scene(busy=6)
+    assert sched.update(capture(busy, sched.current, 130), [], 130) is not None
+    aps = capture(busy, sched.current, 140)
+    target = next(ap for ap in aps if ap["channel"] == "11")
+    alert = {"type": "traffic_spike", "severity": "critical", "bssid": target["bssid"]}
+
+    assert sched.update(aps, [alert], 140) is None  # ni el intervalo urgente ha pasado
+    assert sched.skipped["rate_limited"] == 1
+    plan = sched.update(capture(busy, sched.current, 165), [alert], 165)
+    assert plan is not None and plan.weights[11] > 1
+
+    # Una alerta baja no acorta el intervalo
+    sched2 = scheduler(min_interval=120, urgent_interval=30)
+    sched2.start(0)
+    sched2.update(capture(busy, sched2.current, 130), [], 130)
+    low = dict(alert, severity="low")
+    assert sched2.update(capture(busy, sched2.current, 165), [low], 165) is None
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+wifi_delta: diff de snapshots publicados y cadena seq/prev_seq tal como la
+aplica el dashboard (App.jsx): un delta solo se aplica si su prev_seq es el
+seq que tiene el cliente; si no, hay hueco y pide request_resync.
+"""
+
+import copy
+
+from synthetic import CHANNELS, SyntheticAirodump
+
+
+def ap(bssid, power=-50, channel="6", **extra):
+    return dict({"bssid": bssid, "essid": "Cafe", "channel": channel, "power": power, "clients": []}, **extra)
+
+
+class Client:
+    """Réplica del estado del dashboard: snapshot base + deltas encadenados."""
+
+    def __init__(self, payload):
+        self.load(payload)
+
+    def load(self, payload):
+        self.seq = payload["seq"]
+        self.aps = {a["bssid"].lower(): dict(a) for a in payload["aps"]}
+
+    def apply(self, delta):
+        if delta["prev_seq"] != self.seq:
+            return False  # hueco: el dashboard pide request_resync
+        for bssid in delta["ap_removed"]:
+            self.aps.pop(bssid, None)
+        for a in delta["ap_added"]:
+            self.aps[a["bssid"].lower()] = dict(a)
+        for changes in delta["ap_updated"]:
+            self.aps[changes["bssid"].lower()].update(changes)
+        self.seq = delta["seq"]
+        return True
+
+    def world(self):
+        return {b: {k: v for k, v in a.items() if v is not None} for b, a in self.aps.items()}
+
+
+def world(aps):
+    return {a["bssid"].lower(): {k: v for k, v in a.items() if v is not None} for a in aps}
+
+
+def test_added_updated_removed(pipeline):
+    main = pipeline
+    first = [ap("AA:00:00:00:00:01"), ap("AA:00:00:00:00:02", data_flag="spike"), ap("AA:00:00:00:00:03")]
+    d1 = main.compute_delta(main.publish_snapshot("ok", first, []))
+    assert (d1["seq"], d1["prev_seq"]) == (1, 0)
+    assert d1["ap_added"] == first and d1["ap_updated"] == [] and d1["ap_removed"] == []
+
+    second = [ap("AA:00:00:00:00:01"),  # mismo contenido, dict nuevo
+              ap("AA:00:00:00:00:02", power=-40),  # cambia power y desaparece data_flag
+              ap("AA:00:00:00:00:04", channel="11")]
+    d2 = main.compute_delta(main.publish_snapshot("ok", second, []))
+    assert (d2["seq"], d2["prev_seq"]) == (2, 1)
+    assert d2["ap_added"] == [second[2]]
+    assert d2["ap_updated"] == [{"bssid": "AA:00:00:00:00:02", "power": -40, "data_flag": None}]
+    assert d2["ap_removed"] == ["aa:00:00:00:00:03"]
+    assert d2["total_networks"] == 3
+
+
+def test_equal_copies_are_not_updates(pipeline):
+    main = pipeline
+    aps = [ap(f"AA:00:00:00:00:{i:02x}", clients=[{"mac": "02:00:00:00:01:01", "power": -60}]) for i in range(5)]
+    main.compute_delta(main.publish_snapshot("ok", aps, []))
+    delta = main.compute_delta(main.publish_snapshot("ok", copy.deepcopy(aps), []))
+    assert delta["ap_added"] == delta["ap_updated"] == delta["ap_removed"] == []
+    # un cambio anidado (la potencia de un cliente) sí se emite, con la lista entera
+    moved = copy.deepcopy(aps)
+    moved[3]["clients"][0]["power"] = -70
+    delta = main.compute_delta(main.publish_snapshot("ok", moved, []))
+    assert delta["ap_updated"] == [{"bssid": moved[3]["bssid"], "clients": moved[3]["clients"]}]
+
+
+def synthetic_ticks(main, tmp_path, ticks):
+    """Snapshots del pipeline completo; en el tick 2 no se oye el canal 6 (bajas y altas)."""
+    scene = SyntheticAirodump(200, 400, spike_ratio=0.05, seed=5)
+    path = tmp_path / "capture-01.csv"
+    for tick in range(ticks):
+        dwell = {c: 1.0 for c in CHANNELS if c != 6} if tick == 2 else None
+        scene.write(path, tick, dwell=dwell)
+        main.virtual_time = 1700000000.0 + tick * main.TRAFFIC_WINDOW
+        yield main.build_snapshot(main.read_csv_capture(path))
+
+
+def test_seq_chain_and_resync_after_gap(pipeline, tmp_path):
+    main = pipeline
+    client = None
+    kinds = set()
+    for tick, snap in enumerate(synthetic_ticks(main, tmp_path, 6)):
+        delta = main.compute_delta(snap)
+        assert delta["prev_seq"] == snap.seq - 1  # se emite cada tick, aunque vaya vacío
+        kinds.update(k for k in ("ap_added", "ap_updated", "ap_removed") if delta[k])
+        if client is None:
+            client = Client(main.snapshot_payload(snap))  # conexión: wifi_data es la base
+            continue
+        if tick == 3:
+            continue  # delta perdido
+        if not client.apply(delta):
+            assert tick == 4 and client.seq == 3
+            client.load(main.snapshot_payload(main.get_snapshot()))  # request_resync
+        assert client.seq == snap.seq
+        assert client.world() == world(snap.aps)
+    assert kinds == {"ap_added", "ap_updated", "ap_removed"}
+
+
+def test_subscription_has_its_own_chain(pipeline, tmp_path):
+    main = pipeline
+    snaps = synthetic_ticks(main, tmp_path, 6)
+    for snap in snaps:
+        main.compute_delta(snap)
+        if snap.seq == 2:
+            break
+    sub, _, base = main.subscriptions.subscribe("sid1", {"channels": [1, 6]}, snap, main.delta_changes)
+    client = Client(main.snapshot_payload(base))
+    assert client.seq == 2
+
+    for snap in snaps:
+        main.compute_delta(snap)
+        prev_state = sub.state
+        [(room, delta)] = main.subscriptions.tick(snap, main.delta_changes)
+        assert room == sub.filter.room and delta["filter"] == sub.filter.spec
+        assert client.apply(delta)
+        narrowed = sub.filter.narrow(snap)
+        assert client.world() == world(narrowed.aps)
+        assert all(a["channel"] in ("1", "6") for a in narrowed.aps)
+        # reutilizar los cambios del stream completo no altera el resultado
+        fresh, _ = main.diff_snapshot(narrowed, prev_state, delta["prev_seq"])
+        assert {**fresh, "filter": delta["filter"]} == delta
+    assert client.seq == 6
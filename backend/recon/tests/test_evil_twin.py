@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+
+def ap(bssid, essid, channel="6", privacy="WPA2", power=-50, clients=0):
+    return {"bssid": bssid, "essid": essid, "channel": channel, "privacy": privacy, "power": power,
+            "clients": [{"mac": f"02:00:00:00:01:{i:02x}", "power": -60} for i in range(clients)],
+            "clients_count_ap": clients, "possible_evil_twin": False}
+
+
+def tick(corp_power=-30, corp_channel="11", with_twin=True):
+    aps = [ap("AA:00:00:00:00:01", "Corp", power=-70, clients=3),
+           ap("AA:00:00:00:00:03", "Cafe"),
+           ap("AA:00:00:00:00:04", "Oculto"), ap("AA:00:00:00:00:05", "Oculto")]
+    if with_twin:
+        aps.append(ap("AA:00:00:00:00:02", "Corp", channel=corp_channel, privacy="OPN", power=corp_power))
+    return aps
+
+
+@pytest.fixture
+def scored(pipeline, monkeypatch):
+    calls = []
+    score = pipeline.score_essid_groups
+
+    def spy(groups):
+        calls.append([essid for essid, _ in groups])
+        return score(groups)
+    monkeypatch.setattr(pipeline, "score_essid_groups", spy)
+    return calls
+
+
+def test_flags_and_alert_come_from_the_same_groups(pipeline, scored):
+    aps = tick()
+    alerts = pipeline.detect_evil_twin(aps, 0.0)
+    flagged = {a["bssid"] for a in aps if a["possible_evil_twin"]}
+    assert flagged == {"AA:00:00:00:00:01", "AA:00:00:00:00:02"}  # "Oculto" no es un ESSID
+    assert [a["essid"] for a in alerts] == ["Corp"]
+    assert scored == [["Corp"]]
+
+
+def test_unchanged_groups_reuse_their_alert(pipeline, scored):
+    first = pipeline.detect_evil_twin(tick(), 0.0)
+    again = pipeline.detect_evil_twin(tick(), 30.0)  # dicts nuevos, mismos valores
+    assert again == first and again[0] is first[0]
+    assert scored == [["Corp"]]
+
+    moved = pipeline.detect_evil_twin(tick(corp_channel="1"), 60.0)
+    assert scored == [["Corp"], ["Corp"]]
+    assert moved[0]["channels"] == ["6", "1"]
+
+
+def test_groups_are_forgotten_when_no_longer_duplicated(pipeline, scored):
+    pipeline.detect_evil_twin(tick(), 0.0)
+    assert set(pipeline.essid_groups) == {"Corp"}
+    assert pipeline.detect_evil_twin(tick(with_twin=False), 30.0) == []
+    assert pipeline.essid_groups == {}
+    pipeline.detect_evil_twin(tick(), 60.0)
+    assert scored == [["Corp"], ["Corp"]]  # vuelve: se puntúa de nuevo
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from history import HistoryStore
+
+T0 = 1699999200.0  # múltiplo de 60 y de 900
+WINDOW = 30
+AP, OTHER = "AA:00:00:00:00:01", "AA:00:00:00:00:02"
+
+
+def window(i):
+    """Ventana i: potencia -50/-60 alterna, delta 100*i y 0..2 clientes."""
+    return [{"bssid": AP, "power": -50 - 10 * (i % 2), "delta_data": 100 * i, "clients_count_ap": i % 3},
+            {"bssid": OTHER.lower(), "power": -80, "delta_data": 0}]
+
+
+@pytest.fixture
+def store(tmp_path):
+    # raw 10 min, 1m 1 h, 15m 1 día; flush_interval=0 escribe en cada ventana
+    s = HistoryStore(tmp_path / "history.db", retention=(600, 3600, 86400), flush_interval=0, max_points=100)
+    yield s
+    s.close()
+
+
+def record(store, windows, start=0):
+    for i in range(start, start + windows):
+        store.record(T0 + i * WINDOW, window(i))
+    return T0 + (start + windows - 1) * WINDOW
+
+
+def rows(store, table, bssid=AP):
+    return store.db.execute(f"SELECT ts, power, delta_data, delta_max, clients, n FROM {table} "
+                            "WHERE bssid = ? ORDER BY ts", (bssid.lower(),)).fetchall()
+
+
+def test_rollups(store):
+    latest = record(store, 360)  # 3 h
+    m1 = rows(store, "m1")
+    # el minuto sigue cerrado aunque raw ya no tenga sus muestras
+    assert (m1[-1][0], m1[-1][5]) == (latest - 30 - 60, 2)
+    m15 = rows(store, "m15")
+    assert [r[0] for r in m15] == [T0 + 900 * k for k in range(11)]  # el bucket en curso no se cierra
+    first = m15[0]
+    assert first == (T0, -55.0, 1450.0, 2900.0, 1.0, 30)  # medias ponderadas por n, máximo del delta
+    assert rows(store, "m15", OTHER)[0][1:] == (-80.0, 0.0, 0.0, 0.0, 30)
+
+
+def test_retention(store):
+    latest = record(store, 360)
+    for table, keep in (("raw", 600), ("m1", 3600)):
+        ts = [r[0] for r in rows(store, table)]
+        assert ts[0] >= latest - keep and ts[0] < latest - keep + 60
+    assert len(rows(store, "raw")) == 600 // WINDOW + 1
+    assert rows(store, "m15")[0][0] == T0  # dentro del día
+
+
+def test_query_picks_level_and_caps_points(store):
+    latest = record(store, 360)
+    recent = store.query(AP, latest - 300, latest, WINDOW)
+    assert recent["level"] == "raw" and len(recent["points"]) == 11
+    assert recent["points"][-1] == {"ts": latest, "power": -60.0 if 359 % 2 else -50.0, "delta_data": 35900.0,
+                                    "delta_max": 35900.0, "clients": 359 % 3, "samples": 1}
+    assert store.query(AP, latest - 1800, latest, 60)["level"] == "m1"
+
+    full = store.query(AP, T0, latest)
+    # solo 15m cubre el inicio; el paso mínimo sale de max_points (3 h / 99 -> 109 s)
+    assert (full["level"], full["step"]) == ("m15", 109)
+    assert [p["samples"] for p in full["points"]] == [30] * 11
+    assert len(store.query(AP, latest - 600, latest, 1)["points"]) <= store.max_points
+    assert store.query(AP.lower(), T0, T0 + 3600, 900)["points"] == store.query(AP, T0, T0 + 3600, 900)["points"]
+
+
+def test_reopen_continues_without_double_counting(store, tmp_path):
+    record(store, 120)
+    store.close()
+    reopened = HistoryStore(tmp_path / "history.db", retention=(600, 3600, 86400), flush_interval=0)
+    try:
+        assert reopened.latest_ts == T0 + 119 * WINDOW
+        latest = record(reopened, 120, start=120)
+        assert [r[5] for r in rows(reopened, "m15")] == [30] * 7
+        # check_same_thread=False: /history consulta desde el hilo del productor
+        result = {}
+        t = threading.Thread(target=lambda: result.update(reopened.query(AP, latest - 300, latest)))
+        t.start()
+        t.join()
+        assert result["points"]
+    finally:
+        reopened.close()
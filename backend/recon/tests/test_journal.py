@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from journal import AlertJournal
+
+
+def traffic(bssid, severity="high"):
+    return {"type": "traffic_spike", "bssid": bssid, "essid": "x", "severity": severity}
+
+
+def test_open_during_rotation_gets_its_own_seq(tmp_path):
+    journal = AlertJournal(tmp_path, segment_bytes=500, max_segments=100, reopen_after=10)
+    now = 1000.0
+    opened = []
+    # Incidentes que siguen abiertos (generan carry al rotar) y uno nuevo por tick
+    for i in range(12):
+        alerts = [traffic("aa:00")] + [traffic(f"bb:{j:02d}") for j in range(i + 1)]
+        for rec in journal.observe(alerts, now + i):
+            if rec["op"] == "open":
+                opened.append(rec)
+    assert len(journal.segments) > 1
+    for rec in opened:
+        assert rec["id"] == rec["seq"]
+        found = journal.read(rec["id"] - 1, limit=1)["records"][0]
+        assert found["op"] == "open" and found["key"] == rec["key"]
+
+
+def test_ack_after_close_finds_the_open_record(tmp_path):
+    journal = AlertJournal(tmp_path, segment_bytes=500, max_segments=100, reopen_after=10)
+    for i in range(8):
+        journal.observe([traffic("aa:00")] + [traffic(f"bb:{j:02d}") for j in range(i + 1)], 1000.0 + i)
+    rotated = [rec for rec in journal.read(0, limit=10000)["records"] if rec["op"] == "open"]
+    last = rotated[-1]
+    journal.observe([], 2000.0)  # todos cerrados
+    assert last["id"] not in journal.by_id
+    assert journal.ack(last["id"], 2001.0, by="ana")["id"] == last["id"]
+
+
+def test_recovery_keeps_ids(tmp_path):
+    journal = AlertJournal(tmp_path, segment_bytes=500)
+    for i in range(6):
+        journal.observe([traffic(f"bb:{j:02d}") for j in range(i + 1)], 1000.0 + i)
+    ids = {inc.key: inc.id for inc in journal.incidents.values()}
+    journal.close()
+    assert {inc.key: inc.id for inc in AlertJournal(tmp_path, segment_bytes=500).incidents.values()} == ids
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+fixtures/capture.pcap (radiotap, 10 tramas): beacons de 02:..:00:01 "Cafe"
+(canal 6, WPA2) en t=0 y t=300 y de 02:..:00:02 "Libre" (canal 11, abierta)
+en t=1; datos de 01:01 y 01:02 hacia Cafe (t=2..4, t=301); probes de 01:03
+a "eduroam" y "Casa" (t=5, t=6); un deauth de Libre (t=7).
+"""
+
+from pathlib import Path
+
+from pcap_stream import PcapCaptureEngine
+
+FIXTURE = Path(__file__).parent / "fixtures" / "capture.pcap"
+CAFE, LIBRE = "02:00:00:00:00:01", "02:00:00:00:00:02"
+STA1, STA2, STA3 = "02:00:00:00:01:01", "02:00:00:00:01:02", "02:00:00:00:01:03"
+
+
+def read(path, ttl=0.0):
+    engine = PcapCaptureEngine(path, ttl=ttl)
+    while engine.poll():
+        pass
+    engine.close()
+    return engine
+
+
+def test_aps_and_stations():
+    engine = read(FIXTURE)
+    aps = engine.build_aps_map()
+    assert set(aps) == {CAFE.lower(), LIBRE.lower()}
+
+    cafe = aps[CAFE.lower()]
+    assert (cafe["essid"], cafe["channel"], cafe["privacy"], cafe["power"]) == ("Cafe", "6", "WPA2", -41)
+    assert cafe["data"] == 4
+    assert cafe["clients"] == [{"mac": STA1, "power": -52}, {"mac": STA2, "power": -60}]
+
+    libre = aps[LIBRE.lower()]
+    assert (libre["essid"], libre["channel"], libre["privacy"], libre["power"]) == ("Libre", "11", "OPN", -70)
+    assert libre["clients"] == []
+
+    rows = {mac: (power, bssid, probes) for mac, power, bssid, probes in engine.station_rows()}
+    assert rows[STA1] == (-52, CAFE, "")
+    assert rows[STA3][:2] == (-82, None)
+    assert set(rows[STA3][2].split(",")) == {"eduroam", "Casa"}
+    assert engine.stats()["deauths"] == {LIBRE: 1}
+
+
+def test_incremental_reads_match_full_read(tmp_path):
+    data = FIXTURE.read_bytes()
+    path = tmp_path / "growing.pcap"
+    path.write_bytes(data[:300])  # corta a mitad de una trama
+    engine = PcapCaptureEngine(path)
+    first = engine.poll()
+    with open(path, "ab") as f:
+        f.write(data[300:])
+    rest = engine.poll()
+    engine.close()
+    assert first and first + rest == 10
+    assert engine.build_aps_map() == read(FIXTURE).build_aps_map()
+
+
+def test_ttl_forgets_silent_aps_and_stations():
+    engine = read(FIXTURE, ttl=120)
+    assert set(engine.build_aps_map()) == {CAFE.lower()}
+    assert [row[0] for row in engine.station_rows()] == [STA1]
+    assert engine.stats()["deauths"] == {}
+    assert engine.stats()["expired"] == 3
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from probes import ProbeIndex, parse_probes
+
+
+def ap(bssid):
+    return {"bssid": bssid}
+
+
+def probing(index, essid, n, now):
+    index.update([(f"02:00:00:00:01:{i:02x}", -60, None, essid) for i in range(n)], now)
+
+
+def test_parse_probes_dedups_and_skips_empty():
+    assert parse_probes("eduroam,Casa,,eduroam, Free WiFi ") == ("eduroam", "Casa", "Free WiFi")
+
+
+def test_bssids_found_during_warmup_are_baseline():
+    index = ProbeIndex(new_window=600, warmup=300)
+    probing(index, "eduroam", 5, 0.0)
+    index.advertise([ap("AA:00:00:00:00:01")], 0.0)
+    # El barrido de arranque encuentra más APs en los segundos siguientes
+    index.advertise([ap("AA:00:00:00:00:01"), ap("AA:00:00:00:00:02")], 20.0)
+    index.advertise([ap("aa:00:00:00:00:03")], 299.0)
+    for bssid in ("aa:00:00:00:00:01", "aa:00:00:00:00:02", "aa:00:00:00:00:03"):
+        assert not index.is_new(bssid, 310.0)
+        assert index.lure("eduroam", bssid, 310.0) == 0
+
+
+def test_bssid_after_warmup_is_new_for_the_window():
+    index = ProbeIndex(new_window=600, warmup=300)
+    probing(index, "eduroam", 5, 0.0)
+    index.advertise([ap("aa:00:00:00:00:01")], 0.0)
+    index.advertise([ap("aa:00:00:00:00:01"), ap("aa:00:00:00:00:66")], 400.0)
+    assert index.is_new("AA:00:00:00:00:66", 400.0)
+    assert index.lure("eduroam", "aa:00:00:00:00:66", 500.0) == 5
+    assert index.lure("Casa", "aa:00:00:00:00:66", 500.0) == 0  # nadie lo busca
+    assert not index.is_new("aa:00:00:00:00:66", 1001.0)
+
+
+def test_probe_changes_relink_the_inverted_index():
+    index = ProbeIndex()
+    index.update([("02:00:00:00:01:01", -60, None, "eduroam,Casa")], 0.0)
+    assert index.probers("Casa") == 1
+    assert index.update([("02:00:00:00:01:01", -60, None, "eduroam,Casa")], 1.0) == 0  # sin cambios
+    index.update([("02:00:00:00:01:01", -60, None, "eduroam")], 2.0)
+    assert index.probers("Casa") == 0 and "Casa" not in index.by_essid
+    assert index.essids_of("02:00:00:00:01:01") == ["eduroam"]
+
+
+def test_expire_and_evict_keep_both_directions_consistent():
+    index = ProbeIndex(max_stations=10, ttl=100)
+    probing(index, "eduroam", 10, 0.0)
+    index.update([("02:00:00:00:02:01", -60, None, "Casa")], 50.0)  # pasa del máximo: expulsa las más viejas
+    assert len(index) <= 10 and index.evicted
+    assert index.probers("eduroam") == len([m for m in index.by_station if m.startswith("02:00:00:00:01")])
+    index.expire(200.0)
+    assert len(index) == 0 and index.by_essid == {}
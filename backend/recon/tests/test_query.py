@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""/scan contra el snapshot publicado: paginación por cursor y ETag/304."""
+
+import pytest
+
+
+def ap(n, power=-50, channel="6"):
+    return {"bssid": f"AA:00:00:00:00:{n:02X}", "essid": f"NET-{n}", "channel": channel, "power": power,
+            "privacy": "WPA2", "clients": []}
+
+
+@pytest.fixture
+def client(pipeline):
+    return pipeline.app.test_client()
+
+
+def publish(main, aps):
+    return main.publish_snapshot("ok", aps, [])
+
+
+def pages(client, query, between=None):
+    """Todas las páginas de `query`; `between(i)` se llama tras la página i (el snapshot cambia)."""
+    seen, cursor, i = [], None, 0
+    while True:
+        response = client.get("/scan", query_string=dict(query, **({"cursor": cursor} if cursor else {})))
+        assert response.status_code == 200
+        body = response.get_json()
+        seen.append([a["bssid"][-2:] for a in body["aps"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return seen
+        if between:
+            between(i)
+        i += 1
+
+
+def test_cursor_pages_are_stable_while_the_snapshot_changes(pipeline, client):
+    main = pipeline
+    publish(main, [ap(n) for n in range(2, 20, 2)])  # 02, 04, .. 12 (hex)
+
+    def churn(i):
+        if i == 0:
+            # antes del cursor entra uno nuevo y sale uno ya servido; después sale 0E y entra 0F
+            publish(main, [ap(n) for n in [1] + list(range(4, 20, 2)) + [15] if n != 14])
+
+    seen = pages(client, {"limit": 3}, churn)
+    assert seen == [["02", "04", "06"], ["08", "0A", "0C"], ["0F", "10", "12"]]
+    flat = sum(seen, [])
+    assert len(flat) == len(set(flat))  # ni repetidos ni saltados entre los que siguen
+
+
+def test_descending_sort_breaks_ties_by_bssid(pipeline, client):
+    main = pipeline
+    publish(main, [ap(n, power=-40 if n % 2 else -60) for n in range(1, 8)])
+    assert pages(client, {"limit": 2, "sort": "-power", "fields": "bssid,power"}) == [
+        ["07", "05"], ["03", "01"], ["06", "04"], ["02"]]
+    body = client.get("/scan?limit=2&sort=power&fields=bssid").get_json()
+    assert body["aps"] == [{"bssid": "AA:00:00:00:00:02"}, {"bssid": "AA:00:00:00:00:04"}]
+    other = client.get("/scan", query_string={"limit": 2, "sort": "-power", "cursor": body["next_cursor"]})
+    assert other.status_code == 400  # cursor de otra ordenación
+
+
+def test_etag_and_not_modified(pipeline, client):
+    main = pipeline
+    snap = publish(main, [ap(n, channel=str(n % 3 * 5 + 1)) for n in range(1, 10)])
+    first = client.get("/scan?channel=1,6")
+    etag = first.headers["ETag"].strip('"')
+    assert first.status_code == 200 and etag.startswith(f"{snap.seq}-")
+
+    again = client.get("/scan?channel=6,1", headers={"If-None-Match": f'"{etag}"'})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"].strip('"') == etag  # misma consulta normalizada
+
+    other = client.get("/scan?channel=1", headers={"If-None-Match": f'"{etag}"'})
+    assert other.status_code == 200 and other.headers["ETag"].strip('"') != etag
+
+    publish(main, [ap(n) for n in range(1, 4)])
+    fresh = client.get("/scan?channel=1,6", headers={"If-None-Match": f'"{etag}"'})
+    assert fresh.status_code == 200 and fresh.get_json()["seq"] == snap.seq + 1
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import rules
+from rules import DEFAULT_RULES, RuleEngine, RuleSet
+
+VECTOR = [False] + ([True] if rules.np is not None else [])
+
+
+def traffic(when):
+    return {"traffic": [{"name": "x", "when": when}]}
+
+
+@pytest.mark.parametrize("vector", VECTOR)
+@pytest.mark.parametrize("when", ["min(delta) > 0", "max(z) > 1", "abs(delta, z) > 1", "abs() > 0"])
+def test_rejects_wrong_arity(when, vector):
+    with pytest.raises(ValueError, match="necesita"):
+        RuleSet(traffic(when), vector=vector)
+
+
+@pytest.mark.parametrize("vector", VECTOR)
+def test_accepts_valid_calls(vector):
+    ruleset = RuleSet(traffic("min(delta, z, baseline) > 0 or abs(z) > max(1, samples)"), vector=vector)
+    columns = {name: ruleset.column([0.0, 5.0]) for name in ("delta", "z", "baseline", "samples")}
+    assert list(ruleset.classify(columns, 2)) == [0, 1]
+
+
+@pytest.mark.parametrize("vector", VECTOR)
+def test_default_rules_load(vector):
+    for detector in rules.DETECTORS:
+        assert RuleSet(DEFAULT_RULES, detector, vector=vector).traffic
+
+
+def test_invalid_reload_keeps_previous_rules(tmp_path):
+    path = tmp_path / "reglas.json"
+    path.write_text(json.dumps(traffic("delta > 10")))
+    engine = RuleEngine(str(path))
+    assert [r.name for r in engine.rules.traffic] == ["x"]
+    path.write_text(json.dumps(traffic("min(delta) > 0 ")))
+    assert not engine.maybe_reload()
+    assert engine.errors == 1 and [r.when.text for r in engine.rules.traffic] == ["delta > 10"]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from sensors import parse_sensors
+from synthetic import AP_HEADER, ST_HEADER
+
+AP = "AA:00:00:00:00:01"
+OTHER = "AA:00:00:00:00:02"
+
+
+def write_csv(directory, aps, stations=()):
+    """CSV de airodump con filas (bssid, essid, canal, potencia, contador)."""
+    lines = ["", AP_HEADER]
+    for bssid, essid, channel, power, data in aps:
+        lines.append(f"{bssid}, 2024-01-01 10:00:00, 2024-01-01 10:05:00, {channel}, 54, WPA2, CCMP, PSK, "
+                     f"{power}, {data}, 0, 0.  0.  0.  0, {len(essid)}, {essid}, ")
+    lines += ["", ST_HEADER]
+    for mac, power, bssid in stations:
+        lines.append(f"{mac}, 2024-01-01 10:00:00, 2024-01-01 10:05:00, {power}, 10, {bssid}, ")
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "capture-01.csv").write_text("\r\n".join(lines + [""]), encoding="utf-8")
+
+
+def use_sensors(main, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "sensors", parse_sensors(f"a=dir:{tmp_path / 'a'},b=dir:{tmp_path / 'b'}", "/tmp/x"))
+
+
+def test_merge_two_fixture_dirs(pipeline, monkeypatch, tmp_path):
+    main = pipeline
+    use_sensors(main, monkeypatch, tmp_path)
+    write_csv(tmp_path / "a", [(AP, "Cafe", 6, -40, 500), (OTHER, "Solo A", 1, -70, 10)],
+              [("02:00:00:00:01:01", -50, AP)])
+    write_csv(tmp_path / "b", [(AP, "Cafe", 11, -80, 900)], [("02:00:00:00:01:01", -45, "(not associated)")])
+
+    aps, source, stations = main.read_sensors()
+    assert source == "sensors:a,b"
+    merged = {ap["bssid"]: ap for ap in aps}
+    cafe = merged[AP]
+    assert (cafe["power"], cafe["channel"], cafe["best_sensor"]) == (-40, "6", "a")
+    assert cafe["data"] == 900  # máximo entre sensores, no la suma
+    assert cafe["sensors"] == {"a": {"power": -40, "channel": "6", "data": 500},
+                               "b": {"power": -80, "channel": "11", "data": 900}}
+    assert merged[OTHER]["sensors"].keys() == {"a"}
+    # b oye mejor a la estación pero no la ve asociada: se queda la asociación de a
+    assert [(row[1], row[2]) for row in stations] == [(-45, AP)]
+
+
+def test_counter_source_change_rebaselines(pipeline, monkeypatch, tmp_path):
+    main = pipeline
+    use_sensors(main, monkeypatch, tmp_path)
+    alerts = []
+
+    def window(t, a=None, b=None):
+        for name, data in (("a", a), ("b", b)):
+            csv = tmp_path / name / "capture-01.csv"
+            if data is None:
+                csv.unlink(missing_ok=True)  # el sensor deja de aportar datos
+            else:
+                write_csv(tmp_path / name, [(AP, "Cafe", 6, -40 if name == "a" else -60, data)])
+        main.virtual_time = 1700000000.0 + t * main.TRAFFIC_WINDOW
+        snap = main.build_snapshot(main.read_sensors())
+        alerts.extend(al for al in snap.alerts if al.get("bssid", "").upper() == AP)
+        return snap.aps[0]
+
+    # a cuenta más tramas que b: el contador fusionado es el de a (+100 por ventana)
+    for t in range(8):
+        window(t, a=10000 + 100 * t, b=4000 + 100 * t)
+    assert main.counter_sources[AP.lower()] == "a"
+
+    # a deja de aportar: el máximo pasa a b (el contador baja), y luego vuelve
+    window(8, b=4800)
+    assert main.counter_sources[AP.lower()] == "b"
+    ap = window(9, a=10900, b=4900)
+    assert main.counter_sources[AP.lower()] == "a"
+    assert ap["delta_data"] == 0  # sin el rebase serían ~6100 paquetes de golpe
+
+    ap = window(10, a=11000, b=5000)
+    assert ap["delta_data"] == 100
+    assert alerts == []
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from subscriptions import ALL_ROOM, Filter, SubscriptionManager
+
+
+def ap(n, channel="6", power=-50, essid="Cafe", privacy="WPA2", **extra):
+    return dict({"bssid": f"AA:00:00:00:00:{n:02X}", "essid": essid, "channel": channel, "power": power,
+                 "privacy": privacy, "clients": [{"mac": f"02:00:00:00:01:{n:02x}", "power": -60}]}, **extra)
+
+
+APS = [ap(1), ap(2, channel="1", power=-80), ap(3, channel="11", essid="CorpNet", privacy="OPN"),
+       ap(4, power=-1), ap(5, channel="1", essid="corp-guest", possible_evil_twin=True)]
+ALERTS = [{"type": "evil_twin", "severity": "high", "bssids": [APS[4]["bssid"], APS[0]["bssid"]]},
+          {"type": "traffic_spike", "severity": "low", "bssid": APS[2]["bssid"]},
+          {"type": "deauth_flood", "severity": "critical"}]
+
+
+@pytest.fixture
+def snap(pipeline):
+    return pipeline.publish_snapshot("ok", APS, ALERTS)
+
+
+def bssids(view):
+    return [a["bssid"][-2:] for a in view.aps]
+
+
+def test_same_filter_written_differently_shares_room():
+    a = Filter({"channels": [6, "1"], "essid": ["Corp*"], "privacy": ["opn"]})
+    b = Filter({"privacy": "OPN", "channels": ["1", " 6", 6], "essid": "Corp*"})
+    assert a.key == b.key and a.room == b.room
+    assert a.room != Filter({"channels": [6]}).room
+    for bad in ({"channel": [6]}, {"min_power": "fuerte"}, {"min_severity": "urgent"}, {"bssids": {"x": 1}}, []):
+        with pytest.raises(ValueError):
+            Filter(bad)
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ({}, ["01", "02", "03", "04", "05"]),
+    ({"channels": [1]}, ["02", "05"]),
+    ({"min_power": -60}, ["01", "03", "05"]),  # -1 es "sin dato"
+    ({"essid": ["corp*"]}, ["03", "05"]),
+    ({"privacy": ["OPN", "WEP"]}, ["03"]),
+    ({"flagged": True}, ["05"]),
+    ({"channels": [1, 11], "essid": ["*guest*"]}, ["05"]),
+])
+def test_narrow_aps(snap, spec, expected):
+    view = Filter(spec).narrow(snap)
+    assert bssids(view) == expected
+    assert view.seq == snap.seq and view.total_clients == len(expected)
+
+
+def test_narrow_alerts(snap):
+    types = lambda view: [a["type"] for a in view.alerts]  # noqa: E731
+    assert types(Filter({}).narrow(snap)) == ["evil_twin", "traffic_spike", "deauth_flood"]
+    assert types(Filter({"min_severity": "high"}).narrow(snap)) == ["evil_twin", "deauth_flood"]
+    # si el filtro restringe APs, solo las alertas que mencionan alguno visible
+    assert types(Filter({"channels": [11]}).narrow(snap)) == ["traffic_spike"]
+    assert types(Filter({"bssids": [APS[0]["bssid"].lower()]}).narrow(snap)) == ["evil_twin"]
+    only = Filter({"flagged": True, "alerts_only": True}).narrow(snap)
+    assert only.aps == () and types(only) == ["evil_twin"] and only.total_clients == 0
+
+
+def test_rooms_are_shared_and_overlapping_filters_each_get_a_delta(pipeline, snap):
+    subs = SubscriptionManager(pipeline.diff_snapshot)
+    one, previous, base = subs.subscribe("sid1", {"channels": [6]}, snap)
+    assert previous == ALL_ROOM and bssids(base) == ["01", "04"]
+    two, _, _ = subs.subscribe("sid2", {"channels": ["6"]}, snap)
+    assert two is one and one.members == {"sid1", "sid2"}
+    strong, _, _ = subs.subscribe("sid3", {"min_power": -60}, snap)
+    assert subs.stats() == {"filters": 2, "clients": 3}
+
+    moved = [dict(a, power=-45) if a["bssid"] == APS[0]["bssid"] else a for a in APS]
+    out = dict(subs.tick(pipeline.publish_snapshot("ok", moved, ALERTS)))
+    assert set(out) == {one.filter.room, strong.filter.room}  # una por filtro, no por cliente
+    # AP 01 está en los dos filtros: cada room recibe su cambio, con su propia cadena
+    for room in out:
+        assert out[room]["ap_updated"] == [{"bssid": APS[0]["bssid"], "power": -45}]
+        assert (out[room]["seq"], out[room]["prev_seq"]) == (snap.seq + 1, snap.seq)
+
+    # cambiar de filtro deja la room anterior; el último miembro la borra
+    _, previous, _ = subs.subscribe("sid1", {"min_power": -60}, snap)
+    assert previous == one.filter.room and strong.members == {"sid1", "sid3"}
+    assert subs.unsubscribe("sid2") == one.filter.room
+    assert subs.stats() == {"filters": 1, "clients": 2}
+    assert subs.unsubscribe("sid2") == ALL_ROOM
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+pytest.importorskip("msgpack")
+
+import wire  # noqa: E402
+from synthetic import SyntheticAirodump  # noqa: E402
+
+BINARY = [enc for enc in wire.ENCODINGS if enc != "json"]
+
+
+def roundtrip(payload, encoding):
+    assert wire.unpack(wire.encode(payload, encoding)) == json.loads(json.dumps(payload))
+
+
+EDGE_CASES = [
+    {"rows": [{}, {}, {}]},
+    {"rows": [{}, {"a": 1}]},
+    {"rows": [{"a": 1, "b": "x"}, {"b": "y", "c": None}, {"a": None}]},
+    {"rows": [{"a": None, "b": None}]},
+    {"aps": [{"bssid": "AA", "clients": []}, {"bssid": "BB", "clients": [{"mac": "02", "power": -40}]},
+             {"bssid": "CC"}]},
+    {"aps": [{"clients": [{}]}, {"clients": [{}, {}]}]},
+    {"mixed": [{"a": 1}, 2, "x", None, [{}]], "empty": [], "nested": {"1": [{"k": [1, "2", None]}]}},
+    {"alerts": ({"type": "evil_twin", "bssids": ["AA", "BB"]}, {"type": "karma", "bssids": None})},
+    {1: "clave no str", "floats": [{"v": 1.5}, {"v": 2}], "flags": [{"ok": True}, {"ok": False}]},
+]
+
+
+@pytest.mark.parametrize("encoding", BINARY)
+@pytest.mark.parametrize("payload", EDGE_CASES)
+def test_edge_cases_roundtrip(payload, encoding):
+    roundtrip(payload, encoding)
+
+
+@pytest.mark.parametrize("encoding", BINARY)
+def test_snapshot_and_delta_roundtrip(pipeline, encoding, tmp_path):
+    main = pipeline
+    scene = SyntheticAirodump(300, 900, dup_essid_ratio=0.2, hidden_ratio=0.1, spike_ratio=0.05, seed=3)
+    path = tmp_path / "capture-01.csv"
+    for tick in range(4):
+        scene.write(path, tick)
+        main.virtual_time = 1700000000.0 + tick * main.TRAFFIC_WINDOW
+        snap = main.build_snapshot(main.read_csv_capture(path))
+        delta = main.compute_delta(snap)
+        roundtrip(main.snapshot_payload(snap), encoding)
+        roundtrip(delta, encoding)
+    assert snap.alerts and delta["ap_updated"]
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - watcher.py
+Vigila el directorio de captura y despierta al scanner solo cuando airodump-ng
+escribe. Usa inotify (Linux, vía ctypes) y cae a polling por mtime si inotify
+no está disponible (otros SO, sistemas de ficheros de red, etc).
+
+Con eventlet.monkey_patch() activo, select.select es cooperativo, así que
+wait() no bloquea el hub.
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+logger = logging.getLogger("blackswan")
+
+# Máscaras de inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class CaptureWatcher:
+    """
+    wait() devuelve True cuando hubo cambios en ficheros que casan con `pattern`,
+    tras `debounce` segundos sin escrituras y respetando `min_interval` entre
+    disparos. Devuelve False si vence `timeout` sin cambios.
+
+    `extra` añade más pares (directorio, patrón) a vigilar (varios sensores).
+    """
+
+    def __init__(self, directory, pattern, debounce=0.25, min_interval=1.0,
+                 poll_interval=1.0, mode="auto", extra=()):
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.targets = [(self.directory, pattern)] + [(Path(d), p) for d, p in extra]
+        self.patterns = {}  # wd de inotify -> patrón
+        self.debounce = max(0.0, debounce)
+        self.min_interval = max(0.0, min_interval)
+        self.poll_interval = max(0.05, poll_interval)
+        self.last_fire = 0.0
+        self.fd = None
+        self.poll_state = None
+
+        if mode in ("auto", "inotify"):
+            self.fd = self.init_inotify()
+            if self.fd is None and mode == "inotify":
+                logger.warning("[watch] inotify no disponible, usando polling")
+        self.mode = "inotify" if self.fd is not None else "poll"
+        if self.mode == "poll":
+            self.poll_state = self.scan_state()
+        watched = ", ".join(f"{d}/{p}" for d, p in self.targets)
+        logger.info(f"[watch] Vigilando {watched} ({self.mode}, "
+                    f"debounce={self.debounce}s, min_interval={self.min_interval}s)")
+
+    # ---------------- inotify ----------------
+    def init_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            for directory, pattern in self.targets:
+                wd = libc.inotify_add_watch(fd, str(directory).encode(), WATCH_MASK)
+                if wd < 0:
+                    os.close(fd)
+                    return None
+                # dos sensores en el mismo directorio comparten wd
+                self.patterns.setdefault(wd, []).append(pattern)
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def read_events(self):
+        """Lee los eventos pendientes; True si alguno afecta a un fichero vigilado."""
+        relevant = False
+        # Solo se lee si hay datos: el os.read de eventlet espera en vez de fallar con EAGAIN
+        while self.wait_readable(0):
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            if not buf:
+                return relevant
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(buf):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(buf, offset)
+                offset += EVENT_HEADER.size
+                name = buf[offset:offset + length].split(b"\0", 1)[0].decode(errors="ignore")
+                offset += length
+                if mask & IN_Q_OVERFLOW or any(fnmatch.fnmatch(name, p) for p in self.patterns.get(wd, ())):
+                    relevant = True
+        return relevant
+
+    def wait_readable(self, timeout):
+        if timeout is not None and timeout <= 0:
+            timeout = 0
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(ready)
+
+    def wait_change_inotify(self, deadline):
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            if self.wait_readable(remaining) and self.read_events():
+                return True
+
+    def settle_inotify(self):
+        # Debounce: esperar a que airodump termine la ráfaga de escritura,
+        # con tope para que un escritor continuo no nos deje esperando siempre
+        limit = time.monotonic() + self.debounce * 4
+        while self.debounce and time.monotonic() < limit and self.wait_readable(self.debounce):
+            self.read_events()
+
+    # ---------------- polling ----------------
+    def scan_state(self):
+        state = {}
+        for directory, pattern in self.targets:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if fnmatch.fnmatch(entry.name, pattern):
+                            try:
+                                st = entry.stat()
+                                state[entry.path] = (st.st_mtime_ns, st.st_size)
+                            except OSError:
+                                pass
+            except OSError:
+                pass
+        return state
+
+    def wait_change_poll(self, deadline):
+        while True:
+            state = self.scan_state()
+            if state != self.poll_state:
+                self.poll_state = state
+                return True
+            sleep_for = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                sleep_for = min(sleep_for, remaining)
+            time.sleep(sleep_for)
+
+    def settle_poll(self):
+        limit = time.monotonic() + self.debounce * 4
+        while self.debounce and time.monotonic() < limit:
+            time.sleep(self.debounce)
+            state = self.scan_state()
+            if state == self.poll_state:
+                return
+            self.poll_state = state
+
+    # ---------------- API ----------------
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.mode == "inotify":
+            changed = self.wait_change_inotify(deadline)
+            if changed:
+                self.settle_inotify()
+        else:
+            changed = self.wait_change_poll(deadline)
+            if changed:
+                self.settle_poll()
+        if not changed:
+            return False
+
+        # Intervalo mínimo entre análisis: los cambios durante la espera se absorben
+        gap = self.min_interval - (time.monotonic() - self.last_fire)
+        if gap > 0:
+            time.sleep(gap)
+            if self.mode == "inotify":
+                self.read_events()
+            else:
+                self.poll_state = self.scan_state()
+        self.last_fire = time.monotonic()
+        return True
+
+    def wait_for_file(self, find, timeout):
+        """Espera a que `find()` devuelva un fichero (p.ej. el primer CSV) o vence timeout."""
+        deadline = time.monotonic() + timeout
+        found = find()
+        while found is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.wait(timeout=remaining)
+            found = find()
+        return found
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Black Swan - wire.py
+Serialización de los payloads de Socket.IO fuera del hub.
+
+PreEncoded guarda el JSON de un payload ya calculado (en el hilo del
+productor). dumps() trocea la serialización en una llamada a json.dumps por
+elemento de cada lista: el codificador en C no suelta el GIL, y serializar
+20k APs de una vez bloquearía el hub cientos de ms aunque corra en otro hilo.
+
+WireJSON es el módulo json que usa el servidor Socket.IO: al codificar un
+paquete [evento, PreEncoded] pega el texto ya hecho en lugar de volver a
+recorrer y serializar miles de APs en el hub. El resultado es byte a byte el
+mismo que con json.dumps. En los mensajes de la cola entre procesos
+(fanout.py) el texto viaja tal cual y el web worker lo pega igual.
+
+pack()/unpack() son la codificación binaria opcional (negociada por cliente,
+JSON sigue siendo la de por defecto):
+
+  byte 0   versión (BINARY_VERSION)
+  byte 1   flags (FLAG_ZLIB: el resto va comprimido con zlib)
+  resto    MessagePack: tabla de strings y a continuación el cuerpo
+
+Las listas de dicts (aps, ap_added, clients de cada AP, alertas...) van por
+columnas como ExtType(EXT_TABLE, [n, claves, columnas]): los nombres de campo
+se envían una vez por tabla y no una vez por AP. Las columnas de strings
+(bssid, essid, privacy, mac...) van como índices a la tabla de strings del
+payload, y una columna de listas de dicts se aplana en una sola subtabla más
+las longitudes. Un campo ausente en una fila es ExtType(EXT_MISSING). El
+resultado de unpack() es igual al de json.loads sobre el JSON del mismo
+payload (claves no-string convertidas igual que en JSON).
+"""
+
+import json
+import zlib
+from operator import itemgetter
+
+try:
+    import msgpack
+except ImportError:  # sin msgpack solo hay JSON
+    msgpack = None
+
+SEPARATORS = (",", ":")
+
+BINARY_VERSION = 1
+FLAG_ZLIB = 1
+ZLIB_LEVEL = 3  # el grueso del ahorro ya lo dan columnas + interning
+EXT_MISSING, EXT_TABLE = 0, 1
+COL_PLAIN, COL_STRINGS, COL_TABLES = 0, 1, 2
+ENCODINGS = ("json", "msgpack", "msgpack-zlib") if msgpack is not None else ("json",)
+QUEUE_TEXT = "blackswan_text"  # campo con el payload ya serializado en los mensajes de la cola
+
+
+def encode_key(key):
+    return json.dumps(key if isinstance(key, str) else json.dumps(key))
+
+
+def dumps(obj, sort_keys=False):
+    """Igual que json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys), por trozos."""
+    if isinstance(obj, dict):
+        items = sorted(obj.items()) if sort_keys else obj.items()
+        return "{" + ",".join([encode_key(k) + ":" + dumps(v, sort_keys) for k, v in items]) + "}"
+    if isinstance(obj, (list, tuple)):
+        return "[" + ",".join([json.dumps(item, separators=SEPARATORS, sort_keys=sort_keys)
+                               for item in obj]) + "]"
+    return json.dumps(obj, separators=SEPARATORS, sort_keys=sort_keys)
+
+
+class PreEncoded:
+    __slots__ = ("text",)
+
+    def __init__(self, payload):
+        self.text = dumps(payload)
+
+    def __len__(self):
+        return len(self.text)
+
+    @classmethod
+    def from_text(cls, text):
+        obj = cls.__new__(cls)
+        obj.text = text
+        return obj
+
+
+class WireJSON:
+    @staticmethod
+    def dumps(obj, **kwargs):
+        if isinstance(obj, list) and obj and isinstance(obj[-1], PreEncoded):
+            head = json.dumps(obj[:-1], **kwargs)  # '["evento"]'
+            return head[:-1] + ("," if len(obj) > 1 else "") + obj[-1].text + "]"
+        if isinstance(obj, dict) and obj.get("method") == "emit":
+            data = obj.get("data")
+            if isinstance(data, list) and len(data) == 1 and isinstance(data[0], PreEncoded):
+                # Mensaje de la cola (message_queue): el payload viaja como string y los
+                # web workers lo reenvían sin volver a parsearlo ni serializarlo
+                return json.dumps(dict(obj, data=[], **{QUEUE_TEXT: data[0].text}), **kwargs)
+        return json.dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        obj = json.loads(s, **kwargs)
+        if isinstance(obj, dict) and QUEUE_TEXT in obj:
+            obj["data"] = [PreEncoded.from_text(obj.pop(QUEUE_TEXT))]
+        return obj
+
+
+# ---------------- codificación binaria ----------------
+class Missing:
+    __slots__ = ()
+
+
+MISSING = Missing()
+MISSING_EXT = msgpack.ExtType(EXT_MISSING, b"") if msgpack is not None else None
+
+
+def json_key(key):
+    return key if isinstance(key, str) else json.dumps(key)
+
+
+def is_table(value):
+    return isinstance(value, (list, tuple)) and bool(value) and all(isinstance(v, dict) for v in value)
+
+
+SCALARS = frozenset((int, float, bool, type(None), Missing))
+SEQUENCES = frozenset((list, tuple, Missing))
+
+
+class Packer:
+    """Convierte un payload en la estructura columnar; acumula la tabla de strings."""
+
+    def __init__(self):
+        self.index = {}  # string -> posición (el orden de inserción es la tabla)
+
+    @property
+    def strings(self):
+        return list(self.index)
+
+    def value(self, obj):
+        if isinstance(obj, dict):
+            return {json_key(k): self.value(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            if is_table(obj):
+                return self.table(obj)
+            return [self.value(v) for v in obj]
+        return obj
+
+    def table(self, rows):
+        if not any(rows):
+            return [{} for _ in rows]  # sin claves no hay columnas
+        names = dict.fromkeys(rows[0])
+        if set().union(*rows) == names.keys() and set(map(len, rows)) == {len(names)}:
+            # Caso habitual (todas las filas con las mismas claves): trasponer en C
+            if len(names) == 1:
+                values = [[row[k] for row in rows] for k in names]
+            else:
+                values = map(list, zip(*map(itemgetter(*names), rows)))
+        else:
+            for row in rows:
+                names.update(dict.fromkeys(row))
+            values = ([row.get(k, MISSING) for row in rows] for k in names)
+        columns = [self.column(v) for v in values]
+        return msgpack.ExtType(EXT_TABLE, msgpack.packb([len(rows), [json_key(k) for k in names], columns]))
+
+    def column(self, values):
+        # Se clasifica por tipos exactos (en C) para no recorrer en Python columnas de escalares
+        types = set(map(type, values))
+        if types <= {str, Missing}:
+            index = self.index
+            return [COL_STRINGS, [-1 if v is MISSING else index.setdefault(v, len(index)) for v in values]]
+        if types <= SCALARS:
+            if Missing in types:
+                values = [MISSING_EXT if v is MISSING else v for v in values]
+            return [COL_PLAIN, values]
+        if types <= SEQUENCES:
+            present = [v for v in values if v is not MISSING]
+            nonempty = [v for v in present if v]
+            if not nonempty:
+                return [COL_PLAIN, [MISSING_EXT if v is MISSING else [] for v in values]]
+            flat = [row for v in nonempty for row in v]
+            if set(map(type, flat)) == {dict}:
+                lengths = [-1 if v is MISSING else len(v) for v in values]
+                return [COL_TABLES, [lengths, self.table(flat)]]
+        return [COL_PLAIN, [MISSING_EXT if v is MISSING else self.value(v) for v in values]]
+
+
+def pack(payload, compress=False):
+    """Payload → bytes en el formato binario (ver cabecera del módulo)."""
+    packer = Packer()
+    body = msgpack.packb(packer.value(payload))
+    data = msgpack.packb(packer.strings) + body
+    flags = 0
+    if compress:
+        data = zlib.compress(data, ZLIB_LEVEL)
+        flags |= FLAG_ZLIB
+    return bytes((BINARY_VERSION, flags)) + data
+
+
+def unpack(blob):
+    """Inverso de pack(): devuelve lo mismo que json.loads del JSON del payload."""
+    if len(blob) < 2 or blob[0] != BINARY_VERSION:
+        raise ValueError("formato binario desconocido")
+    data = zlib.decompress(blob[2:]) if blob[1] & FLAG_ZLIB else bytes(blob[2:])
+
+    header = msgpack.Unpacker(raw=False)
+    header.feed(data)
+    strings = header.unpack()
+    offset = header.tell()
+
+    def ext_hook(code, raw):
+        if code == EXT_MISSING:
+            return MISSING
+        if code == EXT_TABLE:
+            return unpack_table(msgpack.unpackb(raw, raw=False, ext_hook=ext_hook, strict_map_key=False))
+        return msgpack.ExtType(code, raw)
+
+    def unpack_table(table):
+        n, names, columns = table
+        rows = [{} for _ in range(n)]
+        for name, (kind, values) in zip(names, columns):
+            if kind == COL_STRINGS:
+                values = [MISSING if i < 0 else strings[i] for i in values]
+            elif kind == COL_TABLES:
+                lengths, flat = values
+                values, pos = [], 0
+                for length in lengths:
+                    if length < 0:
+                        values.append(MISSING)
+                    else:
+                        values.append(flat[pos:pos + length])
+                        pos += length
+            for row, v in zip(rows, values):
+                if v is not MISSING:
+                    row[name] = v
+        return rows
+
+    return msgpack.unpackb(data[offset:], raw=False, ext_hook=ext_hook, strict_map_key=False)
+
+
+def encode(payload, encoding):
+    """Payload listo para emit() en la codificación del cliente."""
+    if encoding == "json":
+        return PreEncoded(payload)
+    return pack(payload, compress=encoding == "msgpack-zlib")
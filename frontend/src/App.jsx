@@ -23,6 +23,8 @@ function App() {
   const simulationRef = useRef(null);
   const alertNodesRef = useRef(new Set());
   const fixedNodesRef = useRef(new Set()); // Para trackear nodos fijados
+  const seqRef = useRef(null); // Último seq aplicado (snapshot o delta)
+  const dataRef = useRef(null); // Estado actual para aplicar deltas
 
   // Colores según potencia
   const getPowerColor = (power) => {
@@ -78,6 +80,37 @@ function App() {
     });
   };
 
+  // Aplica un estado completo (snapshot o resultado de aplicar un delta)
+  const applyData = (newData) => {
+    dataRef.current = newData;
+    setData(newData);
+    setConnectionStats((prev) => ({
+      messages: prev.messages + 1,
+      networks: newData.aps?.length || 0,
+      clients: newData.total_clients || 0,
+      connectedClients: prev.connectedClients,
+      lastUpdate: new Date().toLocaleTimeString(),
+    }));
+
+    // Procesar alertas después de actualizar el estado
+    if (newData.alerts && newData.alerts.length > 0) {
+      const alertBssids = newData.alerts
+        .filter(alert => alert.bssid)
+        .map(alert => alert.bssid);
+
+      console.log("🚨 BSSIDs con alertas:", alertBssids);
+
+      // Pequeño delay para asegurar que los nodos estén renderizados
+      setTimeout(() => {
+        animateAlerts(alertBssids);
+      }, 500);
+    } else {
+      // Si no hay alertas, detener animaciones
+      const svg = d3.select(svgRef.current);
+      svg.selectAll(".node.alert").classed("alert", false);
+    }
+  };
+
   // ---------------- SOCKET.IO ----------------
   useEffect(() => {
     const connectSocket = () => {
@@ -94,41 +127,51 @@ function App() {
         socket.on("connect", () => {
           console.log("✅ Conectado al servidor");
           setConnectionStatus("Conectado");
+          seqRef.current = null;
           socket.emit("request_data");
         });
 
+        // Snapshot completo: al conectar y tras un resync
         socket.on("wifi_data", (newData) => {
-          console.log("📡 wifi_data recibido:");
+          console.log("📡 wifi_data recibido (seq " + newData.seq + "):");
           console.log("🔹 APs:", newData.aps?.length || 0);
           console.log("🔹 Clientes:", newData.total_clients || 0);
           console.log("🔹 Alertas:", newData.alerts?.length || 0);
 
-          setData(newData);
-          setConnectionStats((prev) => ({
-            messages: prev.messages + 1,
-            networks: newData.aps?.length || 0,
-            clients: newData.total_clients || 0,
-            connectedClients: prev.connectedClients,
-            lastUpdate: new Date().toLocaleTimeString(),
-          }));
+          seqRef.current = newData.seq;
+          applyData(newData);
+        });
 
-          // Procesar alertas después de actualizar el estado
-          if (newData.alerts && newData.alerts.length > 0) {
-            const alertBssids = newData.alerts
-              .filter(alert => alert.bssid)
-              .map(alert => alert.bssid);
-            
-            console.log("🚨 BSSIDs con alertas:", alertBssids);
-            
-            // Pequeño delay para asegurar que los nodos estén renderizados
-            setTimeout(() => {
-              animateAlerts(alertBssids);
-            }, 500);
-          } else {
-            // Si no hay alertas, detener animaciones
-            const svg = d3.select(svgRef.current);
-            svg.selectAll(".node.alert").classed("alert", false);
+        // Delta incremental: ap_added / ap_updated / ap_removed
+        socket.on("wifi_delta", (delta) => {
+          if (seqRef.current === null || delta.seq <= seqRef.current) return;
+          if (delta.prev_seq !== seqRef.current) {
+            console.log(`🔄 Hueco en deltas (${seqRef.current} → ${delta.prev_seq}), pidiendo resync`);
+            socket.emit("request_resync", { seq: seqRef.current });
+            seqRef.current = null; // ignorar deltas hasta recibir el snapshot
+            return;
           }
+          seqRef.current = delta.seq;
+
+          const apsMap = new Map((dataRef.current?.aps || []).map(ap => [ap.bssid.toLowerCase(), ap]));
+          (delta.ap_removed || []).forEach(bssid => apsMap.delete(bssid));
+          (delta.ap_added || []).forEach(ap => apsMap.set(ap.bssid.toLowerCase(), ap));
+          (delta.ap_updated || []).forEach(changes => {
+            const key = changes.bssid.toLowerCase();
+            apsMap.set(key, { ...(apsMap.get(key) || {}), ...changes });
+          });
+          const aps = Array.from(apsMap.values()).sort((a, b) => (b.power ?? -100) - (a.power ?? -100));
+
+          applyData({
+            aps,
+            seq: delta.seq,
+            timestamp: delta.timestamp,
+            status: delta.status,
+            total_networks: delta.total_networks,
+            total_clients: delta.total_clients,
+            ws_clients_connected: delta.ws_clients_connected,
+            alerts: delta.alerts || [],
+          });
         });
 
         socket.on("status", (status) => {